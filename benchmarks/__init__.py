@@ -0,0 +1,2 @@
+"""Datashark Linux Processors Benchmarks
+"""
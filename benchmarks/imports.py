@@ -0,0 +1,79 @@
+"""Benchmark worker startup cost of enumerating linux processors
+
+Usage:
+
+    python -m benchmarks.imports [--repeat N]
+
+Each measurement runs in a fresh interpreter. eager imports every
+processor module as loading all entry points does, lazy reads the
+metadata manifest and only imports the processor a job needs.
+"""
+import sys
+from json import loads
+from asyncio import run
+from argparse import ArgumentParser
+from statistics import median
+from subprocess import PIPE
+from asyncio.subprocess import create_subprocess_exec
+
+BASELINE = """
+from time import perf_counter
+start = perf_counter()
+import datashark_processors_linux
+print(perf_counter() - start)
+"""
+EAGER = """
+from time import perf_counter
+from importlib import import_module
+start = perf_counter()
+from datashark_processors_linux.manifest import ENTRY_POINTS
+for entry_point in ENTRY_POINTS.values():
+    module, _, attribute = entry_point.partition(':')
+    getattr(import_module(module), attribute)
+print(perf_counter() - start)
+"""
+LAZY = """
+from time import perf_counter
+start = perf_counter()
+from datashark_processors_linux.manifest import processors, load_processor
+processors()
+print(perf_counter() - start)
+"""
+LAZY_JOB = LAZY.replace(
+    'processors()\n', "processors()\nload_processor('linux_binwalk')\n"
+)
+CASES = {
+    'package': BASELINE,
+    'eager': EAGER,
+    'lazy': LAZY,
+    'lazy_job': LAZY_JOB,
+}
+
+
+async def measure(code: str, repeat: int) -> float:
+    """Median time to run code in a fresh interpreter"""
+    timings = []
+    for _ in range(repeat):
+        proc = await create_subprocess_exec(
+            sys.executable, '-c', code, stdout=PIPE
+        )
+        stdout, _ = await proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"benchmark exited with {proc.returncode}")
+        timings.append(loads(stdout))
+    return median(timings)
+
+
+async def main():
+    """Benchmark entrypoint"""
+    parser = ArgumentParser(description="Benchmark processor enumeration")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    for name, code in CASES.items():
+        elapsed = await measure(code, args.repeat)
+        print(f"{name:<10} {elapsed * 1000:8.2f}ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run(main()))
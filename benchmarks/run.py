@@ -0,0 +1,373 @@
+"""Benchmark linux processors on synthetic evidence
+
+Usage:
+
+    python -m benchmarks.run [--size MB] [--repeat N] [--real CONFIG]
+                             [--baseline FILE] [--save-baseline]
+
+Stub binaries from benchmarks/stubs are used unless --real is given with
+a datashark configuration file pointing to real tools. Each case reports
+latency (whole processor run), tool time (span of subprocess wall times)
+and overhead (latency minus tool time) which measures the wrapper layer.
+Overheads are compared to a baseline saved by --save-baseline, the run
+fails when there is no baseline. --real requires the benchmarks extra.
+"""
+import sys
+from json import dumps, loads
+from time import perf_counter
+from asyncio import run
+from pathlib import Path
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from statistics import median
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+from datashark_core.model.api import ProcessorArgument
+from datashark_processors_linux.psort import PSortProcessor
+from datashark_processors_linux.tskape import TSKAPEProcessor
+from datashark_processors_linux.binwalk import BinwalkProcessor
+from datashark_processors_linux.foremost import ForemostProcessor
+from datashark_processors_linux.log2timeline import Log2TimelineProcessor
+from datashark_processors_linux.pipeline import PlasoPipelineProcessor
+from datashark_processors_linux.merge import PlasoMergeProcessor
+from datashark_processors_linux.columnar import parquet_available
+from .synthetic import raw_image, file_tree, filesystem_image, log_tree
+
+HERE = Path(__file__).resolve().parent
+STUBS = HERE / 'stubs'
+TOOLS = ['psort', 'tskape', 'binwalk', 'foremost', 'log2timeline']
+
+
+class BenchmarkConfig:
+    """Minimal configuration exposing dotted keys of a nested dict"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self._config = config
+
+    def get(self, key: str, default: Any = None, type=None):
+        value = self._config
+        for part in key.split('.'):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        if value is not None and type is not None:
+            value = type(value)
+        return value
+
+
+class Case(NamedTuple):
+    """Benchmark case"""
+
+    name: str
+    processor: type
+    arguments: Callable[[Path], Dict[str, Any]]
+    input_size: int
+    # builds inputs produced by other tools, run once before measuring
+    setup: Optional[Callable[[BenchmarkConfig], Awaitable[None]]] = None
+    # reason why the case cannot run in this environment
+    skip: Optional[str] = None
+
+
+def build_arguments(
+    processor: type, values: Dict[str, Any]
+) -> Dict[str, ProcessorArgument]:
+    """Build processor arguments from declared defaults and values"""
+    arguments = {}
+    for spec in processor.ARGUMENTS:
+        value = values.get(spec['name'], spec.get('value'))
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        arguments[spec['name']] = ProcessorArgument(
+            name=spec['name'],
+            kind=spec['kind'],
+            value=str(value),
+            required=spec['required'],
+        )
+    return arguments
+
+
+def prepare(workdir: Path, size: int, real: bool) -> List[Case]:
+    """Generate synthetic evidence and benchmark cases"""
+    image = workdir / 'image.raw'
+    raw_image(image, size, max(4, size >> 20))
+    tree = workdir / 'tree'
+    file_tree(tree, 2000)
+    fs_image = workdir / 'fs.ext4'
+    fs_source = tree
+    if real and filesystem_image(tree, fs_image, 64 << 20):
+        fs_source = fs_image
+    patterns = workdir / 'patterns.txt'
+    patterns.write_text('\\.exe$\n/dir1/sub2/\n')
+    logs = workdir / 'logs'
+    log_tree(logs, 7, max(100, size >> 14))
+    storage = workdir / 'storage.plaso'
+    logs_size = sum(path.stat().st_size for path in logs.rglob('syslog.*'))
+    # exported by psort cases, distinct from the log2timeline case output
+    export_storage = workdir / 'export.plaso'
+
+    async def extract(config: BenchmarkConfig):
+        """Extract the storage file of export cases"""
+        if export_storage.exists():
+            return
+        await Log2TimelineProcessor(config)._run(
+            build_arguments(
+                Log2TimelineProcessor,
+                {'source': logs, 'storage_file': export_storage},
+            )
+        )
+
+    return [
+        Case(
+            'binwalk',
+            BinwalkProcessor,
+            lambda run_dir: {'filepath': image, 'log': run_dir / 'log'},
+            size,
+        ),
+        Case(
+            'binwalk_sharded',
+            BinwalkProcessor,
+            lambda run_dir: {
+                'filepath': image,
+                'log': run_dir / 'log',
+                'shards': 4,
+            },
+            size,
+        ),
+        Case(
+            'binwalk_stream',
+            BinwalkProcessor,
+            lambda run_dir: {
+                'filepath': image,
+                'log': run_dir / 'log',
+                'stream': True,
+            },
+            size,
+        ),
+        Case(
+            'foremost',
+            ForemostProcessor,
+            lambda run_dir: {
+                'filepath': image,
+                'output_dir': run_dir / 'out',
+            },
+            size,
+        ),
+        Case(
+            'foremost_chunked',
+            ForemostProcessor,
+            lambda run_dir: {
+                'filepath': image,
+                'output_dir': run_dir / 'out',
+                'chunk_size': max(1 << 20, size // 4),
+                'overlap': 65536,
+            },
+            size,
+        ),
+        Case(
+            'tskape',
+            TSKAPEProcessor,
+            lambda run_dir: {
+                'filepath': fs_source,
+                'pattern_file': patterns,
+                'log': run_dir / 'log',
+            },
+            0,
+        ),
+        Case(
+            'log2timeline',
+            Log2TimelineProcessor,
+            lambda run_dir: {'source': logs, 'storage_file': storage},
+            logs_size,
+        ),
+        Case(
+            'psort',
+            PSortProcessor,
+            lambda run_dir: {
+                'storage_file': export_storage,
+                'output_file': run_dir / 'timeline.csv',
+            },
+            logs_size,
+            extract,
+        ),
+        Case(
+            'psort_sharded',
+            PSortProcessor,
+            lambda run_dir: {
+                'storage_file': export_storage,
+                'output_file': run_dir / 'timeline.csv',
+                'shards': 4,
+                'start': '2020-01-01T00:00:00+00:00',
+                'end': '2020-01-09T00:00:00+00:00',
+            },
+            logs_size,
+            extract,
+        ),
+        Case(
+            'psort_parquet',
+            PSortProcessor,
+            lambda run_dir: {
+                'storage_file': export_storage,
+                'output_file': run_dir / 'timeline.parquet',
+                'output_format': 'parquet',
+            },
+            logs_size,
+            extract,
+            None if parquet_available() else "pyarrow is not installed",
+        ),
+        Case(
+            'plaso_pipeline',
+            PlasoPipelineProcessor,
+            lambda run_dir: {
+                'source': logs,
+                'storage_file': run_dir / 'storage.plaso',
+                'output_formats': 'l2tcsv,json_line',
+                'output_directory': run_dir / 'out',
+            },
+            logs_size,
+        ),
+        Case(
+            'plaso_merge',
+            PlasoMergeProcessor,
+            lambda run_dir: {
+                'storage_file': export_storage,
+                'output_file': run_dir / 'timeline.jsonl',
+            },
+            logs_size,
+            extract,
+        ),
+    ]
+
+
+async def measure(
+    case: Case, config: BenchmarkConfig, workdir: Path, repeat: int
+) -> Dict[str, float]:
+    """Run a case repeat times and return median measurements"""
+    latencies, tool_times = [], []
+    if case.setup:
+        await case.setup(config)
+    for index in range(repeat):
+        run_dir = workdir / 'runs' / f'{case.name}-{index}'
+        run_dir.mkdir(parents=True)
+        values = case.arguments(run_dir)
+        if case.processor is Log2TimelineProcessor:
+            values['storage_file'].unlink(missing_ok=True)
+        processor = case.processor(config)
+        start = perf_counter()
+        await processor._run(build_arguments(case.processor, values))
+        latencies.append(perf_counter() - start)
+        metrics = processor.metrics
+        tool_times.append(
+            max(m.started + m.wall_time for m in metrics)
+            - min(m.started for m in metrics)
+            if metrics
+            else 0.0
+        )
+    latency = median(latencies)
+    tool_time = median(tool_times)
+    return {
+        'latency': latency,
+        'tool_time': tool_time,
+        'overhead': max(0.0, latency - tool_time),
+        'throughput': case.input_size / latency / 1000000,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    slack: float,
+) -> List[str]:
+    """List cases which overhead regressed compared to baseline"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            print(f"{name} is not part of the baseline", file=sys.stderr)
+            continue
+        limit = reference['overhead'] * (1 + tolerance) + slack
+        if result['overhead'] > limit:
+            regressions.append(
+                f"{name}: overhead {result['overhead']:.4f}s > {limit:.4f}s"
+            )
+    return regressions
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = ArgumentParser(description="Benchmark linux processors")
+    parser.add_argument('--size', type=int, default=64, help="image MB")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cases', nargs='*', help="cases to run")
+    parser.add_argument('--real', type=Path, help="datashark config file")
+    parser.add_argument(
+        '--baseline', type=Path, default=HERE / 'baseline.json'
+    )
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--slack', type=float, default=0.005, help="seconds")
+    return parser.parse_args()
+
+
+async def main():
+    """Benchmark entrypoint"""
+    args = parse_args()
+    with TemporaryDirectory(prefix='datashark-bench-') as tmpdir:
+        workdir = Path(tmpdir)
+        if args.real:
+            # only needed with real tools, see benchmarks extra
+            # pylint: disable=import-outside-toplevel
+            from yaml import safe_load
+
+            config = safe_load(args.real.read_text())
+        else:
+            config = {
+                'datashark': {
+                    'processors': {
+                        tool: {'bin': str(STUBS / tool)} for tool in TOOLS
+                    }
+                }
+            }
+        config['datashark'].setdefault('agent', {})['workdir'] = str(
+            workdir / 'workdir'
+        )
+        config = BenchmarkConfig(config)
+        cases = prepare(workdir, args.size << 20, bool(args.real))
+        if args.cases:
+            cases = [case for case in cases if case.name in args.cases]
+        results = {}
+        for case in cases:
+            if case.skip:
+                print(f"{case.name:<20} skipped, {case.skip}")
+                continue
+            results[case.name] = await measure(
+                case, config, workdir, args.repeat
+            )
+            result = results[case.name]
+            print(
+                f"{case.name:<20} latency {result['latency']:8.4f}s "
+                f"tool {result['tool_time']:8.4f}s "
+                f"overhead {result['overhead']:8.4f}s "
+                f"{result['throughput']:10.2f} MB/s"
+            )
+    if args.save_baseline:
+        args.baseline.write_text(dumps(results, indent=2))
+        return 0
+    if not args.baseline.is_file():
+        print(
+            f"no baseline at {args.baseline}, "
+            "create one with --save-baseline",
+            file=sys.stderr,
+        )
+        return 2
+    regressions = compare(
+        results, loads(args.baseline.read_text()), args.tolerance, args.slack
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run(main()))
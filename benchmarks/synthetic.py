@@ -0,0 +1,100 @@
+"""Synthetic evidence generators
+"""
+from random import Random
+from shutil import which
+from typing import Dict, List, NamedTuple
+from pathlib import Path
+from subprocess import DEVNULL, run
+from datetime import datetime, timedelta
+
+JPEG = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00' + b'\x42' * 4000 + b'\xff\xd9'
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\x0dIHDR' + b'\x43' * 2000
+ZIP = b'PK\x03\x04' + b'\x44' * 3000
+SIGNATURES = {'jpeg': JPEG, 'png': PNG, 'zip': ZIP}
+
+
+class Signature(NamedTuple):
+    """Signature embedded in a synthetic raw image"""
+
+    kind: str
+    offset: int
+
+
+def raw_image(filepath: Path, size: int, count: int, seed: int = 0):
+    """Write a sparse raw image embedding count known signatures
+
+    Returns embedded signatures sorted by offset.
+    """
+    rng = Random(seed)
+    kinds = sorted(SIGNATURES)
+    slot = size // max(1, count)
+    signatures = []
+    with filepath.open('wb') as fobj:
+        fobj.truncate(size)
+        for index in range(count):
+            kind = kinds[index % len(kinds)]
+            data = SIGNATURES[kind]
+            if slot <= len(data):
+                break
+            # sector aligned so that foremost quick mode finds them too
+            shift = rng.randrange(slot - len(data)) // 512 * 512
+            offset = index * slot + shift
+            fobj.seek(offset)
+            fobj.write(data)
+            signatures.append(Signature(kind, offset))
+    return signatures
+
+
+def file_tree(directory: Path, count: int, seed: int = 0) -> List[Path]:
+    """Create a tree of small files with known paths"""
+    rng = Random(seed)
+    paths = []
+    for index in range(count):
+        path = (
+            directory
+            / f'dir{index % 10}'
+            / f'sub{rng.randrange(5)}'
+            / f'file{index:05d}.{("txt", "log", "exe")[index % 3]}'
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f'content of file {index}\n')
+        paths.append(path.relative_to(directory))
+    return paths
+
+
+def filesystem_image(directory: Path, filepath: Path, size: int) -> bool:
+    """Build an ext4 image from directory if mkfs.ext4 is available"""
+    mkfs = which('mkfs.ext4')
+    if mkfs is None:
+        return False
+    with filepath.open('wb') as fobj:
+        fobj.truncate(size)
+    completed = run(
+        [mkfs, '-q', '-F', '-d', str(directory), str(filepath)],
+        stdout=DEVNULL,
+        stderr=DEVNULL,
+        check=False,
+    )
+    return completed.returncode == 0
+
+
+def log_tree(
+    directory: Path, files: int, lines: int, seed: int = 0
+) -> Dict[str, int]:
+    """Create syslog-like files, returns the number of lines per file"""
+    rng = Random(seed)
+    start = datetime(2020, 1, 1)
+    counts = {}
+    for index in range(files):
+        path = directory / 'var' / 'log' / f'syslog.{index}'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        timestamp = start + timedelta(days=index)
+        with path.open('w') as fobj:
+            for line in range(lines):
+                timestamp += timedelta(seconds=rng.randrange(1, 120))
+                fobj.write(
+                    f'{timestamp.isoformat()} host{index % 3} '
+                    f'proc[{rng.randrange(1000)}]: message {line}\n'
+                )
+        counts[str(path.relative_to(directory))] = lines
+    return counts
@@ -0,0 +1,189 @@
+"""Datashark Linux Processors Batch Submission
+"""
+from os import cpu_count
+from json import dumps, loads
+from time import monotonic
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+from pathlib import Path
+from functools import partial
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.model.api import Kind, ProcessorArgument
+from .interface import LOG_DIRECTORY
+from .helper import get_value, make_argument, override, discard
+from .parallel import bounded_gather
+
+LOGGER = LOGGING_MANAGER.get_logger('linux_batch')
+RESULTS_FILENAME = 'results.jsonl'
+BATCH_ARGUMENTS = [
+    {
+        'name': 'manifest',
+        'kind': Kind.PATH,
+        'required': True,
+        'description': """
+            File listing inputs to process, one per line. A line is either a path or a JSON object giving the
+            input and other arguments of the item, for example: {"filepath": "/evidence/disk.raw", "quick": true}
+        """,
+    },
+    {
+        'name': 'output_root',
+        'kind': Kind.PATH,
+        'required': True,
+        'description': """
+            Outputs and tool logs of an item are written to <output_root>/<input name>, the status, error and
+            duration of every item are written to <output_root>/results.jsonl
+        """,
+    },
+    {
+        'name': 'batch_workers',
+        'kind': Kind.INT,
+        'required': False,
+        'description': """
+            Maximum number of items processed concurrently, defaults to the number of cores. Subprocesses are
+            still bounded by the scheduler
+        """,
+    },
+]
+
+
+class BatchResult(NamedTuple):
+    """Outcome of a batch item"""
+
+    name: str
+    input: str
+    status: str
+    error: Optional[str]
+    wall_time: float
+    outputs: Dict[str, str]
+
+
+def batch_arguments(
+    arguments: List[Dict[str, Any]], input_name: str, outputs: List[str]
+) -> List[Dict[str, Any]]:
+    """Arguments of a batch processor derived from processor arguments"""
+    return [
+        spec
+        for spec in arguments
+        if spec['name'] != input_name and spec['name'] not in outputs
+    ] + BATCH_ARGUMENTS
+
+
+def unique_name(name: str, names: Set[str]) -> str:
+    """Name suffixed with a counter if it is one of names already"""
+    candidate, index = name, 1
+    while candidate in names:
+        candidate = f'{name}-{index}'
+        index += 1
+    return candidate
+
+
+def read_batch_manifest(manifest: Path, input_name: str) -> List[Dict]:
+    """Read items of a batch manifest, skipping blank and comment lines"""
+    items = []
+    for line in manifest.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        item = loads(line) if line.startswith('{') else {input_name: line}
+        if input_name not in item:
+            raise ValueError(f"batch item without {input_name}: {line}")
+        items.append(item)
+    return items
+
+
+class BatchMixin:
+    """Run a processor on many inputs listed in a manifest
+
+    Items are processed concurrently in the same run, each one through
+    the result cache and checkpoints like a single run. A failed item is
+    reported in the results file without stopping other items.
+    """
+
+    BATCH_INPUT: str = 'filepath'
+    # output arguments of an item and their path in the item directory
+    BATCH_OUTPUTS: Dict[str, str] = {}
+
+    def _item_arguments(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        item: Dict[str, Any],
+        item_dir: Path,
+    ) -> Dict[str, ProcessorArgument]:
+        kinds = {spec['name']: spec['kind'] for spec in self.ARGUMENTS}
+        kinds[self.BATCH_INPUT] = Kind.PATH
+        return override(
+            discard(arguments, *(spec['name'] for spec in BATCH_ARGUMENTS)),
+            *(
+                make_argument(name, Kind.PATH, item_dir / filename)
+                for name, filename in self.BATCH_OUTPUTS.items()
+            ),
+            *(
+                make_argument(name, kinds[name], value)
+                for name, value in item.items()
+                if name in kinds
+            ),
+        )
+
+    async def _run_item(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        item: Dict[str, Any],
+        item_dir: Path,
+    ) -> BatchResult:
+        """Process an item, failures are returned instead of raised"""
+        item_arguments = self._item_arguments(arguments, item, item_dir)
+        item_dir.mkdir(parents=True, exist_ok=True)
+        # tasks run in a copy of the context, see _process
+        LOG_DIRECTORY.set(item_dir)
+        start = monotonic()
+        status, error = 'ok', None
+        try:
+            await self._run_cached(item_arguments)
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.error("%s failed: %s", item[self.BATCH_INPUT], exc)
+            status, error = 'failed', str(exc)
+        return BatchResult(
+            name=item_dir.name,
+            input=str(item[self.BATCH_INPUT]),
+            status=status,
+            error=error,
+            wall_time=monotonic() - start,
+            outputs={
+                name: str(item_dir / filename)
+                for name, filename in self.BATCH_OUTPUTS.items()
+            },
+        )
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Process items of the manifest, or a single item"""
+        if get_value(arguments, 'manifest') is None:
+            await super()._process(arguments)
+            return
+        items = read_batch_manifest(
+            Path(get_value(arguments, 'manifest')), self.BATCH_INPUT
+        )
+        output_root = Path(get_value(arguments, 'output_root'))
+        names: List[str] = []
+        taken: Set[str] = set()
+        for item in items:
+            name = unique_name(Path(item[self.BATCH_INPUT]).name, taken)
+            taken.add(name)
+            names.append(name)
+        start = monotonic()
+        results = await bounded_gather(
+            [
+                partial(self._run_item, arguments, item, output_root / name)
+                for item, name in zip(items, names)
+            ],
+            get_value(arguments, 'batch_workers') or cpu_count() or 1,
+        )
+        with (output_root / RESULTS_FILENAME).open('w') as fobj:
+            for result in results:
+                fobj.write(dumps(result._asdict()) + '\n')
+        failed = [result for result in results if result.status != 'ok']
+        LOGGER.info(
+            "%s processed %d items in %.3fs, %d failed",
+            self.NAME,
+            len(results),
+            monotonic() - start,
+            len(failed),
+        )
@@ -1,21 +1,109 @@
 """Datashark Binwalk Processor
 """
-from typing import Dict
+from os import cpu_count
+from re import compile as re_compile
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+from asyncio import CancelledError, ensure_future, get_running_loop
+from shutil import rmtree
+from pathlib import Path
+from functools import partial
 from asyncio.subprocess import PIPE, DEVNULL
 from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
-from datashark_core.processor import ProcessorInterface
+from datashark_core.processor import ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .interface import LinuxProcessorInterface
+from .batch import BatchMixin, batch_arguments
+from .scheduler import ResourceProfile
+from .helper import get_value, make_argument, override, input_size
+from .prescan import prescan, clip_ranges
+from .content_store import deduplicate
+from .parallel import Window, split_windows, split_ranges, bounded_gather
 
 NAME = 'linux_binwalk'
+BATCH_NAME = 'linux_binwalk_batch'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
+LOG_LINE_PATTERN = re_compile(r'^(\d+)\s+0x[0-9A-Fa-f]+\s+(.*)$')
+CSV_LINE_PATTERN = re_compile(r'^(\d+),0x[0-9A-Fa-f]+,(.*)$')
+EXTRACTED_NAME_PATTERN = re_compile(r'^([0-9A-Fa-f]+)(?:\.|$)')
+OPTIONS = [
+    # optional
+    ('extract', '-e'),
+    ('directory', '-C'),
+    ('size_limit', '-j'),
+    ('count_limit', '-n'),
+    ('length', '-l'),
+    ('offset', '-o'),
+    ('base', '-O'),
+    ('block', '-K'),
+    ('swap', '-g'),
+    ('csv', '-c'),
+    ('log', '-f'),
+    # positional
+    ('filepath', None),
+]
+# binwalk prints results to stdout when streaming, log is written by us
+STREAM_OPTIONS = [
+    option for option in OPTIONS if option[0] not in ('csv', 'log')
+]
 
 
-class BinwalkProcessor(ProcessorInterface, metaclass=ProcessorMeta):
+class SignatureHit(NamedTuple):
+    """Signature found by binwalk"""
+
+    offset: int
+    description: str
+
+
+def parse_log_line(line: str, csv: bool) -> Optional[SignatureHit]:
+    """Parse a binwalk log line, None if line is not a signature hit"""
+    pattern = CSV_LINE_PATTERN if csv else LOG_LINE_PATTERN
+    match = pattern.match(line.rstrip('\r\n'))
+    if not match:
+        return None
+    return SignatureHit(int(match.group(1)), match.group(2).rstrip())
+
+
+def extracted_offset(relative: Path) -> Optional[int]:
+    """Offset of a file extracted by binwalk, None for nested files
+
+    binwalk names files extracted to _<input>.extracted after their
+    hexadecimal offset in the input.
+    """
+    parts = relative.parts
+    if parts and parts[0].startswith('shard-'):
+        parts = parts[1:]
+    if len(parts) != 2 or not parts[0].endswith('.extracted'):
+        return None
+    match = EXTRACTED_NAME_PATTERN.match(parts[1])
+    if not match:
+        return None
+    return int(match.group(1), 16)
+
+
+def format_log_header(csv: bool) -> str:
+    """Format binwalk log header"""
+    if csv:
+        return 'DECIMAL,HEXADECIMAL,DESCRIPTION\n'
+    return f"{'DECIMAL':<14}{'HEXADECIMAL':<16}DESCRIPTION\n{'-' * 80}\n"
+
+
+def format_log_line(hit: SignatureHit, csv: bool) -> str:
+    """Format a signature hit as a binwalk log line"""
+    if csv:
+        return f'{hit.offset},0x{hit.offset:X},{hit.description}\n'
+    return f"{hit.offset:<14}{'0x%X' % hit.offset:<16}{hit.description}\n"
+
+
+class BinwalkProcessor(LinuxProcessorInterface, metaclass=ProcessorMeta):
     """Run binwalk on given filepath"""
 
     NAME = NAME
     SYSTEM = System.LINUX
+    BIN_KEY = 'datashark.processors.binwalk.bin'
+    INPUTS = ['filepath']
+    OUTPUTS = ['log', 'directory']
+    RESOURCE_PROFILE = ResourceProfile.IO_BOUND
     ARGUMENTS = [
         {
             'name': 'extract',
@@ -91,35 +179,303 @@ class BinwalkProcessor(ProcessorInterface, metaclass=ProcessorMeta):
             'required': True,
             'description': "File to process",
         },
+        {
+            'name': 'stream',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Read results from binwalk output while it is running and append them to log as they are found,
+                shards are ignored in this mode
+            """,
+        },
+        {
+            'name': 'shards',
+            'kind': Kind.INT,
+            'value': '1',
+            'required': False,
+            'description': """
+                Split the scanned region in this many windows scanned by concurrent binwalk processes,
+                results are merged in log
+            """,
+        },
+        {
+            'name': 'overlap',
+            'kind': Kind.INT,
+            'value': '1048576',
+            'required': False,
+            'description': """
+                Number of bytes each window scans past its end to catch signatures spanning two windows
+            """,
+        },
+        {
+            'name': 'max_workers',
+            'kind': Kind.INT,
+            'required': False,
+            'description': """
+                Maximum number of concurrent binwalk processes when shards is greater than 1,
+                defaults to the number of cores
+            """,
+        },
+        {
+            'name': 'prescan',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Skip regions filled with a single byte value, windows are dispatched over populated ranges only,
+                ignored in stream mode
+            """,
+        },
+        {
+            'name': 'dedup',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Hash extracted files concurrently, move them to the content store and replace them with hard links,
+                extracted files are listed with their hash, size and offset in <directory>/content.jsonl
+            """,
+        },
     ]
     DESCRIPTION = """
     Run binwalk on given filepath
     """
 
-    async def _run(self, arguments: Dict[str, ProcessorArgument]):
-        """Process a file using binwalk"""
+    def _progress_total(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> Optional[int]:
+        """Number of bytes scanned by binwalk"""
+        length = get_value(arguments, 'length')
+        if length:
+            return length
+        offset = get_value(arguments, 'offset', 0)
+        if not offset:
+            return None
+        return input_size(Path(get_value(arguments, 'filepath'))) - offset
+
+    async def _scan(self, arguments: Dict[str, ProcessorArgument]):
+        """Run a single binwalk process"""
         # invoke subprocess
         proc = await self._start_subprocess(
-            'datashark.processors.binwalk.bin',
+            self.BIN_KEY,
             ['-q'],
+            OPTIONS,
+            arguments,
+            stdout=DEVNULL,
+            stderr=PIPE,
+        )
+        try:
+            await self._handle_communicating_process(proc)
+        except CancelledError:
+            if proc.returncode is None:
+                proc.kill()
+            raise
+
+    async def _scan_window(
+        self, arguments: Dict[str, ProcessorArgument], window: Window
+    ) -> List[SignatureHit]:
+        """Scan a window and return the hits it owns"""
+        csv = get_value(arguments, 'csv', False)
+        base = get_value(arguments, 'base', 0)
+        logpath = Path(get_value(arguments, 'log'))
+        shard_log = logpath.with_name(
+            f'{logpath.name}.shard-{window.index:04d}'
+        )
+        checkpoint = self.checkpoint
+        unit = str(shard_log)
+        if checkpoint and checkpoint.done(unit):
+            return [SignatureHit(*hit) for hit in checkpoint.result(unit)]
+        overrides = [
+            make_argument('offset', Kind.INT, window.offset),
+            make_argument('length', Kind.INT, window.scan_length),
+            make_argument('log', Kind.PATH, shard_log),
+        ]
+        if get_value(arguments, 'extract', False):
+            # concurrent extractions must not share a directory
+            directory = Path(get_value(arguments, 'directory', Path.cwd()))
+            shard_dir = directory / f'shard-{window.index:04d}'
+            if checkpoint:
+                # extracted by an interrupted run
+                rmtree(shard_dir, ignore_errors=True)
+            shard_dir.mkdir(parents=True, exist_ok=True)
+            overrides.append(make_argument('directory', Kind.PATH, shard_dir))
+        try:
+            await self._scan(override(arguments, *overrides))
+            hits = []
+            with shard_log.open('r', errors='replace') as fobj:
+                for line in fobj:
+                    hit = parse_log_line(line, csv)
+                    # printed offsets include base address
+                    if hit and window.owns(hit.offset - base):
+                        hits.append(hit)
+            if checkpoint:
+                checkpoint.complete(unit, hits)
+            return hits
+        finally:
+            shard_log.unlink(missing_ok=True)
+
+    async def _windows(
+        self, arguments: Dict[str, ProcessorArgument], shards: int
+    ) -> List[Window]:
+        """Split the scanned region, or its populated ranges, in windows"""
+        filepath = Path(get_value(arguments, 'filepath'))
+        start = get_value(arguments, 'offset', 0)
+        length = get_value(arguments, 'length')
+        if not length:
+            length = input_size(filepath) - start
+        overlap = get_value(arguments, 'overlap', 0)
+        if not get_value(arguments, 'prescan', False):
+            return split_windows(start, length, shards, overlap)
+        ranges = clip_ranges(
+            await get_running_loop().run_in_executor(
+                None, prescan, self.config, filepath
+            ),
+            start,
+            start + length,
+        )
+        populated = sum(size for _, size in ranges)
+        return split_ranges(
+            ranges, -(-populated // shards), overlap, start + length
+        )
+
+    async def _scan_sharded(
+        self, arguments: Dict[str, ProcessorArgument], shards: int
+    ):
+        """Scan windows of the input concurrently and merge their logs"""
+        filepath = Path(get_value(arguments, 'filepath'))
+        windows = await self._windows(arguments, shards)
+        LOGGER.info(
+            "scanning %s using %d windows of %d bytes",
+            filepath,
+            len(windows),
+            windows[0].length if windows else 0,
+        )
+        results = await bounded_gather(
             [
-                # optional
-                ('extract', '-e'),
-                ('directory', '-C'),
-                ('size_limit', '-j'),
-                ('count_limit', '-n'),
-                ('length', '-l'),
-                ('offset', '-o'),
-                ('base', '-O'),
-                ('block', '-K'),
-                ('swap', '-g'),
-                ('csv', '-c'),
-                ('log', '-f'),
-                # positional
-                ('filepath', None),
+                partial(self._scan_window, arguments, window)
+                for window in windows
             ],
+            get_value(arguments, 'max_workers') or cpu_count() or 1,
+        )
+        hits = sorted({hit for result in results for hit in result})
+        csv = get_value(arguments, 'csv', False)
+        logpath = Path(get_value(arguments, 'log'))
+        with logpath.open('w') as fobj:
+            fobj.write(format_log_header(csv))
+            for hit in hits:
+                fobj.write(format_log_line(hit, csv))
+
+    async def stream(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> AsyncIterator[SignatureHit]:
+        """Yield signature hits as soon as binwalk reports them"""
+        proc = await self._start_subprocess(
+            self.BIN_KEY,
+            [],
+            STREAM_OPTIONS,
             arguments,
-            stdout=DEVNULL,
+            stdout=PIPE,
             stderr=PIPE,
         )
-        await self._handle_communicating_process(proc)
+        # drain stderr concurrently to prevent binwalk from blocking on it
+        stderr = ensure_future(proc.stderr.read())
+        try:
+            async for line in proc.stdout:
+                hit = parse_log_line(line.decode(errors='replace'), False)
+                if hit:
+                    yield hit
+            message = await stderr
+            await proc.wait()
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            stderr.cancel()
+        if proc.returncode != 0:
+            raise ProcessorError(
+                f"binwalk exited with code {proc.returncode}: "
+                f"{message.decode(errors='replace').strip()}"
+            )
+
+    async def _scan_streamed(self, arguments: Dict[str, ProcessorArgument]):
+        """Append hits to log as they are streamed"""
+        csv = get_value(arguments, 'csv', False)
+        logpath = Path(get_value(arguments, 'log'))
+        with logpath.open('w') as fobj:
+            fobj.write(format_log_header(csv))
+            async for hit in self.stream(arguments):
+                fobj.write(format_log_line(hit, csv))
+                fobj.flush()
+
+    def _outputs(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> Dict[str, Path]:
+        """Log and extraction directories of the scanned file
+
+        Extraction without directory writes to the working directory and
+        extraction of prescanned windows cannot be predicted, neither is
+        cacheable.
+        """
+        outputs = {}
+        if get_value(arguments, 'log'):
+            outputs['log'] = Path(get_value(arguments, 'log'))
+        if not get_value(arguments, 'extract', False):
+            return outputs
+        directory = get_value(arguments, 'directory')
+        if not directory or get_value(arguments, 'prescan', False):
+            return {}
+        directory = Path(directory)
+        extracted = f"_{Path(get_value(arguments, 'filepath')).name}.extracted"
+        shards = get_value(arguments, 'shards', 1)
+        if shards > 1 and not get_value(arguments, 'stream', False):
+            for index in range(shards):
+                outputs[f'extracted_{index:04d}'] = (
+                    directory / f'shard-{index:04d}' / extracted
+                )
+        else:
+            outputs['extracted'] = directory / extracted
+        return outputs
+
+    async def _deduplicate(self, arguments: Dict[str, ProcessorArgument]):
+        """Move extracted files to the content store"""
+        directory = Path(get_value(arguments, 'directory', Path.cwd()))
+        await deduplicate(
+            self.config,
+            directory,
+            'binwalk',
+            extracted_offset,
+            # directory may hold unrelated files, e.g. the working directory
+            lambda relative: any(
+                part.endswith('.extracted') for part in relative.parts
+            ),
+            get_value(arguments, 'max_workers'),
+        )
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Process a file using binwalk"""
+        shards = get_value(arguments, 'shards', 1)
+        if get_value(arguments, 'stream', False):
+            await self._scan_streamed(arguments)
+        elif shards > 1 or get_value(arguments, 'prescan', False):
+            await self._scan_sharded(arguments, shards)
+        else:
+            await self._scan(arguments)
+        if get_value(arguments, 'extract', False) and get_value(
+            arguments, 'dedup', False
+        ):
+            await self._deduplicate(arguments)
+
+
+class BinwalkBatchProcessor(BatchMixin, BinwalkProcessor):
+    """Run binwalk on many filepaths"""
+
+    NAME = BATCH_NAME
+    BATCH_INPUT = 'filepath'
+    BATCH_OUTPUTS = {'log': 'binwalk.log', 'directory': 'extracted'}
+    ARGUMENTS = batch_arguments(
+        BinwalkProcessor.ARGUMENTS, BATCH_INPUT, list(BATCH_OUTPUTS)
+    )
+    DESCRIPTION = """
+    Run binwalk on many filepaths listed in a manifest
+    """
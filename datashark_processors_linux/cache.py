@@ -0,0 +1,204 @@
+"""Datashark Linux Processors Result Cache
+"""
+from os import getpid, stat
+from json import dumps, loads
+from time import time
+from fcntl import LOCK_EX, flock, ioctl
+from shutil import copy2, rmtree
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from hashlib import blake2b
+from pathlib import Path
+from contextlib import contextmanager
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.filesystem import prepend_workdir
+from .helper import config_value, input_size
+
+LOGGER = LOGGING_MANAGER.get_logger('linux_cache')
+FICLONE = 0x40049409
+SAMPLE_COUNT = 16
+SAMPLE_SIZE = 65536
+
+
+def sampled_hash(filepath: Path, size: int, digest=None) -> str:
+    """Hash of evenly spaced blocks of a file, whole file if it is small"""
+    digest = digest or blake2b(digest_size=16)
+    step = max(SAMPLE_SIZE, size // SAMPLE_COUNT)
+    offsets = list(range(0, size, step))[:SAMPLE_COUNT]
+    offsets.append(max(0, size - SAMPLE_SIZE))
+    with filepath.open('rb') as fobj:
+        for offset in offsets:
+            fobj.seek(offset)
+            digest.update(fobj.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def fingerprint(filepath: Path) -> str:
+    """Fast fingerprint of a file based on size, mtime and sampled blocks"""
+    size = input_size(filepath)
+    digest = blake2b(digest_size=16)
+    digest.update(f'{size}:{stat(filepath).st_mtime_ns}'.encode())
+    return sampled_hash(filepath, size, digest)
+
+
+def _clone(src: Path, dst: Path):
+    """Reflink src to dst, fallback to copy"""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    try:
+        with src.open('rb') as fsrc, dst.open('wb') as fdst:
+            ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return
+    except OSError:
+        dst.unlink(missing_ok=True)
+    copy2(src, dst)
+
+
+def _clone_tree(src: Path, dst: Path) -> int:
+    """Clone a file or a directory tree, return the number of bytes
+
+    Outputs and cache entries never share inodes as processors and users
+    may later modify outputs in place.
+    """
+    if src.is_file():
+        _clone(src, dst)
+        return src.stat().st_size
+    size = 0
+    for path in src.rglob('*'):
+        if path.is_file():
+            _clone(path, dst / path.relative_to(src))
+            size += path.stat().st_size
+    return size
+
+
+class ResultCache:
+    """Content-addressed cache of processor outputs with LRU eviction"""
+
+    def __init__(self, directory: Path, max_size: int):
+        self._directory = directory
+        self._max_size = max_size
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config) -> Optional['ResultCache']:
+        """Build cache from configuration, None if cache is disabled"""
+        if not config_value(config, 'datashark.processors.cache.enabled'):
+            return None
+        directory = config_value(
+            config, 'datashark.processors.cache.directory'
+        )
+        return cls(
+            Path(directory) if directory else prepend_workdir(config, 'cache'),
+            int(
+                config_value(
+                    config, 'datashark.processors.cache.max_size', 1 << 40
+                )
+            ),
+        )
+
+    @property
+    def directory(self) -> Path:
+        """Cache directory"""
+        return self._directory
+
+    @contextmanager
+    def _index(self) -> Iterator[Dict[str, Any]]:
+        """Lock, load and save the cache index"""
+        with (self._directory / '.lock').open('w') as lock:
+            flock(lock, LOCK_EX)
+            filepath = self._directory / 'index.json'
+            index = {'entries': {}, 'hits': 0, 'misses': 0}
+            if filepath.is_file():
+                index = loads(filepath.read_text())
+            yield index
+            tmp = filepath.with_name(f'index.json.{getpid()}')
+            tmp.write_text(dumps(index))
+            tmp.replace(filepath)
+
+    @contextmanager
+    def _entry_lock(self, key: str) -> Iterator[None]:
+        """Lock an entry while its files are read or replaced"""
+        locks = self._directory / '.locks'
+        locks.mkdir(exist_ok=True)
+        with (locks / key).open('w') as lock:
+            flock(lock, LOCK_EX)
+            yield
+
+    @staticmethod
+    def key(
+        name: str,
+        inputs: List[Path],
+        arguments: List[Tuple[str, str]],
+        binary: Path,
+    ) -> str:
+        """Build cache key of a processor run"""
+        digest = blake2b(digest_size=20)
+        digest.update(name.encode())
+        # binary size and mtime change whenever the tool is upgraded
+        version = stat(binary)
+        digest.update(
+            f'{binary}:{version.st_size}:{version.st_mtime_ns}'.encode()
+        )
+        for filepath in inputs:
+            digest.update(fingerprint(filepath).encode())
+        for argument in sorted(arguments):
+            digest.update(dumps(argument).encode())
+        return digest.hexdigest()
+
+    def restore(self, key: str, outputs: Dict[str, Path]) -> bool:
+        """Restore outputs from cache, return False on cache miss"""
+        entry_dir = self._directory / key
+        # other entries remain usable while this one is copied
+        with self._entry_lock(key):
+            restored = entry_dir.is_dir()
+            if restored:
+                for name, target in outputs.items():
+                    source = entry_dir / name
+                    if source.exists():
+                        _clone_tree(source, target)
+        with self._index() as index:
+            entry = index['entries'].get(key)
+            if entry is None or not restored:
+                index['misses'] += 1
+                return False
+            entry['last_access'] = time()
+            index['hits'] += 1
+        return True
+
+    def store(self, key: str, outputs: Dict[str, Path]):
+        """Store outputs in cache and evict least recently used entries"""
+        entry_dir = self._directory / key
+        tmp_dir = self._directory / f'{key}.{getpid()}.tmp'
+        rmtree(tmp_dir, ignore_errors=True)
+        size = 0
+        for name, source in outputs.items():
+            if source.exists():
+                size += _clone_tree(source, tmp_dir / name)
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        with self._index() as index, self._entry_lock(key):
+            rmtree(entry_dir, ignore_errors=True)
+            tmp_dir.rename(entry_dir)
+            entries = index['entries']
+            entries[key] = {'size': size, 'last_access': time()}
+            total = sum(entry['size'] for entry in entries.values())
+            for evicted in sorted(
+                entries, key=lambda item: entries[item]['last_access']
+            ):
+                if total <= self._max_size or evicted == key:
+                    break
+                total -= entries.pop(evicted)['size']
+                with self._entry_lock(evicted):
+                    rmtree(self._directory / evicted, ignore_errors=True)
+                LOGGER.info("evicted cache entry %s", evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Cache hit and miss counters, entry count and size"""
+        with self._index() as index:
+            return {
+                'hits': index['hits'],
+                'misses': index['misses'],
+                'entries': len(index['entries']),
+                'size': sum(
+                    entry['size'] for entry in index['entries'].values()
+                ),
+            }
@@ -0,0 +1,204 @@
+"""Datashark Linux Processors Carved Files Index
+"""
+from re import compile as re_compile
+from json import dumps, loads
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+from sqlite3 import connect
+from pathlib import Path
+
+SIZE_PATTERN = re_compile(r'^(\d+(?:\.\d+)?)\s*([KMGT]?)B$')
+SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+EXPORT_FORMATS = {'jsonl', 'sqlite'}
+
+
+class CarvedFile(NamedTuple):
+    """File carved at offset of the input"""
+
+    type: str
+    offset: int
+    size: int
+    name: str
+
+    @property
+    def path(self) -> str:
+        """Path of the carved file relative to the output directory"""
+        return f'{self.type}/{self.name}'
+
+
+def parse_size(size: str) -> int:
+    """Convert a size such as "12 KB" to bytes, -1 if it is not a size"""
+    match = SIZE_PATTERN.match(size.strip())
+    if not match:
+        return -1
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+class CarveIndex:
+    """Carved files sorted by offset, stored in arrays
+
+    An entry takes 26 bytes plus the length of its name so that
+    audits listing millions of files fit in memory.
+    """
+
+    def __init__(
+        self,
+        types: List[str],
+        type_ids: array,
+        offsets: array,
+        sizes: array,
+        names: bytes,
+        name_ends: array,
+    ):
+        self._types = types
+        self._type_ids = type_ids
+        self._offsets = offsets
+        self._sizes = sizes
+        self._names = names
+        self._name_ends = name_ends
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def types(self) -> List[str]:
+        """Types of carved files"""
+        return list(self._types)
+
+    @classmethod
+    def build(cls, entries: Iterable) -> 'CarveIndex':
+        """Index audit entries in a single pass"""
+        types: Dict[str, int] = {}
+        type_ids, offsets, sizes = array('H'), array('Q'), array('q')
+        names, name_ends = bytearray(), array('Q')
+        for entry in entries:
+            name = entry.name
+            file_type = name.rpartition('.')[2] if '.' in name else ''
+            type_ids.append(types.setdefault(file_type, len(types)))
+            offsets.append(entry.offset)
+            sizes.append(parse_size(entry.size))
+            names.extend(name.encode())
+            name_ends.append(len(names))
+        index = cls(list(types), type_ids, offsets, sizes, names, name_ends)
+        if any(
+            offsets[position - 1] > offsets[position]
+            for position in range(1, len(offsets))
+        ):
+            index = index._sorted()
+        return index
+
+    def _sorted(self) -> 'CarveIndex':
+        order = sorted(range(len(self)), key=self._offsets.__getitem__)
+        names, name_ends = bytearray(), array('Q')
+        for position in order:
+            names.extend(self._name(position).encode())
+            name_ends.append(len(names))
+        return CarveIndex(
+            self._types,
+            array('H', (self._type_ids[position] for position in order)),
+            array('Q', (self._offsets[position] for position in order)),
+            array('q', (self._sizes[position] for position in order)),
+            names,
+            name_ends,
+        )
+
+    def _name(self, position: int) -> str:
+        start = self._name_ends[position - 1] if position else 0
+        return self._names[start : self._name_ends[position]].decode()
+
+    def _entry(self, position: int) -> CarvedFile:
+        return CarvedFile(
+            self._types[self._type_ids[position]],
+            self._offsets[position],
+            self._sizes[position],
+            self._name(position),
+        )
+
+    def query(
+        self,
+        types: Optional[Iterable[str]] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> Iterator[CarvedFile]:
+        """Carved files of given types starting in [start, end)"""
+        first = 0 if start is None else bisect_left(self._offsets, start)
+        last = len(self) if end is None else bisect_left(self._offsets, end)
+        type_ids = None
+        if types is not None:
+            types = set(types)
+            type_ids = {
+                type_id
+                for type_id, file_type in enumerate(self._types)
+                if file_type in types
+            }
+        for position in range(first, last):
+            if type_ids is None or self._type_ids[position] in type_ids:
+                yield self._entry(position)
+
+    def save(self, filepath: Path):
+        """Write index to a file"""
+        header = {
+            'types': self._types,
+            'count': len(self),
+            'names': len(self._names),
+        }
+        with filepath.open('wb') as fobj:
+            fobj.write(dumps(header).encode() + b'\n')
+            for values in (
+                self._type_ids,
+                self._offsets,
+                self._sizes,
+                self._name_ends,
+            ):
+                values.tofile(fobj)
+            fobj.write(self._names)
+
+    @classmethod
+    def load(cls, filepath: Path) -> 'CarveIndex':
+        """Read index written by save"""
+        with filepath.open('rb') as fobj:
+            header = loads(fobj.readline())
+            arrays = []
+            for typecode in ('H', 'Q', 'q', 'Q'):
+                values = array(typecode)
+                values.fromfile(fobj, header['count'])
+                arrays.append(values)
+            names = fobj.read(header['names'])
+        type_ids, offsets, sizes, name_ends = arrays
+        return cls(header['types'], type_ids, offsets, sizes, names, name_ends)
+
+    def to_jsonl(self, filepath: Path, **query):
+        """Export carved files matching query as JSON lines"""
+        with filepath.open('w') as fobj:
+            for carved in self.query(**query):
+                fobj.write(
+                    dumps(dict(carved._asdict(), path=carved.path)) + '\n'
+                )
+
+    def to_sqlite(self, filepath: Path, **query):
+        """Export carved files matching query to a SQLite database"""
+        filepath.unlink(missing_ok=True)
+        connection = connect(str(filepath))
+        try:
+            with connection:
+                connection.execute(
+                    'CREATE TABLE carved ('
+                    'type TEXT, offset INTEGER, size INTEGER, name TEXT, '
+                    'path TEXT)'
+                )
+                connection.executemany(
+                    'INSERT INTO carved VALUES (?, ?, ?, ?, ?)',
+                    (
+                        carved + (carved.path,)
+                        for carved in self.query(**query)
+                    ),
+                )
+                connection.execute(
+                    'CREATE INDEX carved_type ON carved (type, offset)'
+                )
+                connection.execute(
+                    'CREATE INDEX carved_offset ON carved (offset)'
+                )
+        finally:
+            connection.close()
@@ -0,0 +1,95 @@
+"""Datashark Linux Processors Checkpoints
+"""
+from os import getpid
+from json import dumps, loads
+from typing import Any, Dict, List, Optional
+from hashlib import blake2b
+from pathlib import Path
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.filesystem import prepend_workdir
+from datashark_core.model.api import ProcessorArgument
+from .cache import fingerprint
+from .helper import config_value
+
+LOGGER = LOGGING_MANAGER.get_logger('linux_checkpoint')
+
+
+class Checkpoint:
+    """Units of work completed by a run, kept until the run succeeds
+
+    A run resubmitted with the same arguments and inputs after a failure
+    finds the checkpoint of the failed run and skips completed units.
+    Units are identified by the path of the partial output they produce
+    and may record a result needed to finish the run.
+    """
+
+    def __init__(self, filepath: Path):
+        self._filepath = filepath
+        self._completed: Dict[str, Any] = {}
+        if filepath.is_file():
+            self._completed = loads(filepath.read_text())['completed']
+            LOGGER.info(
+                "resuming from %s, %d units completed",
+                filepath,
+                len(self._completed),
+            )
+
+    @staticmethod
+    def key(
+        name: str,
+        inputs: List[Path],
+        arguments: Dict[str, ProcessorArgument],
+    ) -> str:
+        """Build checkpoint key of a processor run"""
+        digest = blake2b(digest_size=20)
+        digest.update(name.encode())
+        # directories cannot be fingerprinted cheaply
+        for filepath in inputs:
+            if filepath.is_file():
+                digest.update(fingerprint(filepath).encode())
+        for item in sorted(
+            (name, str(argument.value)) for name, argument in arguments.items()
+        ):
+            digest.update(dumps(item).encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def from_config(
+        cls,
+        config,
+        name: str,
+        inputs: List[Path],
+        arguments: Dict[str, ProcessorArgument],
+    ) -> Optional['Checkpoint']:
+        """Checkpoint of a run, None if checkpoints are disabled"""
+        if not config_value(config, 'datashark.processors.checkpoint.enabled'):
+            return None
+        directory = config_value(
+            config, 'datashark.processors.checkpoint.directory'
+        )
+        directory = (
+            Path(directory)
+            if directory
+            else prepend_workdir(config, 'checkpoints')
+        )
+        directory.mkdir(parents=True, exist_ok=True)
+        return cls(directory / f'{cls.key(name, inputs, arguments)}.json')
+
+    def done(self, unit: str) -> bool:
+        """Determine if unit is completed"""
+        return unit in self._completed
+
+    def result(self, unit: str) -> Any:
+        """Result recorded for a completed unit"""
+        return self._completed.get(unit)
+
+    def complete(self, unit: str, result: Any = None):
+        """Record a completed unit"""
+        self._completed[unit] = result
+        tmp = self._filepath.with_name(f'{self._filepath.name}.{getpid()}')
+        tmp.write_text(dumps({'completed': self._completed}))
+        tmp.replace(self._filepath)
+
+    def clear(self):
+        """Remove checkpoint once the run succeeded"""
+        self._filepath.unlink(missing_ok=True)
@@ -0,0 +1,113 @@
+"""Datashark Linux Processors Columnar Timeline Export
+"""
+from json import dumps, loads
+from typing import Any, Dict, Iterable, List
+from pathlib import Path
+from importlib import import_module
+from importlib.util import find_spec
+
+PARQUET_FORMAT = 'parquet'
+ROW_GROUP_SIZE = 65536
+DAY = 86400 * 1000000
+# repeated values stored once per row group
+DICTIONARY_COLUMNS = [
+    'timestamp_desc',
+    'data_type',
+    'parser',
+    'display_name',
+    'filename',
+    'hostname',
+    'username',
+]
+STRING_COLUMNS = ['message', 'inode', 'tag']
+# other event attributes are kept as a JSON object
+EXTRA_COLUMN = 'extra'
+IGNORED_ATTRIBUTES = {'__container_type__', '__type__', 'timestamp'}
+
+
+def parquet_available() -> bool:
+    """Determine if pyarrow is installed"""
+    # optional dependency, see parquet extra
+    return find_spec('pyarrow') is not None
+
+
+def _schema(pyarrow):
+    dictionary = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return pyarrow.schema(
+        [pyarrow.field('timestamp', pyarrow.timestamp('us', tz='UTC'))]
+        + [pyarrow.field(name, dictionary) for name in DICTIONARY_COLUMNS]
+        + [pyarrow.field(name, pyarrow.string()) for name in STRING_COLUMNS]
+        + [pyarrow.field(EXTRA_COLUMN, pyarrow.string())]
+    )
+
+
+def _text(value: Any):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return dumps(value, sort_keys=True)
+    return str(value)
+
+
+def _append(columns: Dict[str, List[Any]], event: Dict[str, Any]):
+    columns['timestamp'].append(int(event['timestamp']))
+    for name in DICTIONARY_COLUMNS + STRING_COLUMNS:
+        columns[name].append(_text(event.pop(name, None)))
+    extra = {
+        key: value
+        for key, value in event.items()
+        if key not in IGNORED_ATTRIBUTES
+    }
+    columns[EXTRA_COLUMN].append(dumps(extra, sort_keys=True))
+
+
+def json_lines_to_parquet(
+    lines: Iterable[str], output: Path, row_group_size: int = ROW_GROUP_SIZE
+) -> int:
+    """Convert psort json_line events to Parquet, return number of events
+
+    A row group never spans two days (UTC) and holds at most
+    row_group_size events which bounds memory usage. Events exported by
+    psort are sorted so that queries on a time range only read the row
+    groups covering it.
+    """
+    # pyarrow is slow to import, it is imported on first conversion
+    pyarrow = import_module('pyarrow')
+    parquet = import_module('pyarrow.parquet')
+    schema = _schema(pyarrow)
+    columns = {name: [] for name in schema.names}
+    count = 0
+    day = None
+
+    def _flush():
+        if columns['timestamp']:
+            writer.write_table(
+                pyarrow.Table.from_pydict(columns, schema=schema),
+                row_group_size=row_group_size,
+            )
+            for values in columns.values():
+                values.clear()
+
+    with parquet.ParquetWriter(
+        str(output),
+        schema,
+        compression='zstd',
+        use_dictionary=DICTIONARY_COLUMNS,
+    ) as writer:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                event = loads(line)
+                timestamp = int(event['timestamp'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if day != timestamp // DAY or (
+                len(columns['timestamp']) >= row_group_size
+            ):
+                _flush()
+                day = timestamp // DAY
+            _append(columns, event)
+            count += 1
+        _flush()
+    return count
@@ -0,0 +1,206 @@
+"""Datashark Linux Processors Content-addressed Store
+"""
+from os import cpu_count, getpid, link, stat, walk
+from json import dumps
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+from asyncio import Queue, get_running_loop
+from hashlib import sha256
+from collections import Counter
+from pathlib import Path
+from functools import partial
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.filesystem import prepend_workdir
+from .helper import config_value
+from .parallel import bounded_gather
+
+LOGGER = LOGGING_MANAGER.get_logger('linux_content_store')
+MANIFEST_FILENAME = 'content.jsonl'
+READ_SIZE = 1 << 20
+
+
+class StoredFile(NamedTuple):
+    """Carved file moved to the content store"""
+
+    path: str
+    sha256: str
+    size: int
+    offset: Optional[int]
+    carver: str
+    duplicate: bool
+    stored: Optional[str]
+
+
+def file_digest(filepath: Path) -> str:
+    """SHA-256 of a file"""
+    digest = sha256()
+    with filepath.open('rb') as fobj:
+        for block in iter(partial(fobj.read, READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentStore:
+    """Files stored once under their SHA-256, linked from their location
+
+    Files are hard linked so the store must be on the filesystem of the
+    directories it deduplicates.
+    """
+
+    def __init__(self, directory: Path):
+        self._directory = directory
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config) -> 'ContentStore':
+        """Build store from configuration"""
+        directory = config_value(
+            config, 'datashark.processors.content_store.directory'
+        )
+        return cls(
+            Path(directory)
+            if directory
+            else prepend_workdir(config, 'content-store')
+        )
+
+    @property
+    def directory(self) -> Path:
+        """Store directory"""
+        return self._directory
+
+    def path(self, digest: str) -> Path:
+        """Path of stored content"""
+        return self._directory / digest[:2] / digest
+
+    def links_to(self, directory: Path) -> bool:
+        """Determine if files of directory can be linked to the store"""
+        return stat(directory).st_dev == stat(self._directory).st_dev
+
+    def add(self, filepath: Path) -> Tuple[str, bool]:
+        """Store a file, return its digest and if content was stored already
+
+        A file which content is stored already is replaced with a link to
+        the stored content.
+        """
+        digest = file_digest(filepath)
+        stored = self.path(digest)
+        stored.parent.mkdir(exist_ok=True)
+        try:
+            link(filepath, stored)
+            return digest, False
+        except FileExistsError:
+            pass
+        if not stored.samefile(filepath):
+            tmp = filepath.with_name(f'.{filepath.name}.{getpid()}')
+            link(stored, tmp)
+            tmp.replace(filepath)
+        return digest, True
+
+
+def _carved_files(
+    directory: Path, select: Optional[Callable[[Path], bool]]
+) -> Iterator[Path]:
+    for root, dirnames, filenames in walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(root) / filename
+            if (
+                path.is_file()
+                and not path.is_symlink()
+                and path.name != MANIFEST_FILENAME
+                and (select is None or select(path.relative_to(directory)))
+            ):
+                yield path
+
+
+def _store(
+    store: Optional[ContentStore],
+    directory: Path,
+    filepath: Path,
+    carver: str,
+    offset: Callable[[Path], Optional[int]],
+) -> StoredFile:
+    relative = filepath.relative_to(directory)
+    if store:
+        digest, duplicate = store.add(filepath)
+        stored = str(store.path(digest))
+    else:
+        digest, duplicate, stored = file_digest(filepath), False, None
+    return StoredFile(
+        path=str(relative),
+        sha256=digest,
+        size=filepath.stat().st_size,
+        offset=offset(relative),
+        carver=carver,
+        duplicate=duplicate,
+        stored=stored,
+    )
+
+
+async def deduplicate(
+    config,
+    directory: Path,
+    carver: str,
+    offset: Callable[[Path], Optional[int]],
+    select: Optional[Callable[[Path], bool]] = None,
+    max_workers: Optional[int] = None,
+):
+    """Hash carved files of directory concurrently and store them
+
+    offset maps the path of a carved file relative to directory to its
+    offset in the carved input, select filters carved files using the
+    same relative path. Carved files are streamed to a fixed number of
+    workers and listed as they are stored in a manifest written to
+    <directory>/content.jsonl.
+    """
+    store = ContentStore.from_config(config)
+    if not store.links_to(directory):
+        LOGGER.warning(
+            "%s and content store %s are on different filesystems, files "
+            "are hashed but not deduplicated",
+            directory,
+            store.directory,
+        )
+        store = None
+    loop = get_running_loop()
+    workers = max_workers or cpu_count() or 1
+    # memory does not grow with the number of carved files
+    queue = Queue(workers * 2)
+    counts = Counter()
+
+    async def _walk():
+        filepaths = _carved_files(directory, select)
+        while True:
+            filepath = await loop.run_in_executor(None, next, filepaths, None)
+            if filepath is None:
+                break
+            await queue.put(filepath)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def _worker(fobj):
+        while True:
+            filepath = await queue.get()
+            if filepath is None:
+                return
+            stored_file = await loop.run_in_executor(
+                None, _store, store, directory, filepath, carver, offset
+            )
+            fobj.write(dumps(stored_file._asdict()) + '\n')
+            counts['files'] += 1
+            if stored_file.duplicate:
+                counts['duplicates'] += 1
+                counts['duplicate_bytes'] += stored_file.size
+
+    manifest = directory / MANIFEST_FILENAME
+    with manifest.open('w') as fobj:
+        await bounded_gather(
+            [_walk] + [partial(_worker, fobj) for _ in range(workers)],
+            workers + 1,
+        )
+    LOGGER.info(
+        "%d files carved by %s, %d duplicates (%d bytes)",
+        counts['files'],
+        carver,
+        counts['duplicates'],
+        counts['duplicate_bytes'],
+    )
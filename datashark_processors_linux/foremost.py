@@ -1,21 +1,110 @@
 """Datashark Foremost Processor
 """
-from typing import Dict
+from os import cpu_count
+from re import compile as re_compile
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+from shutil import rmtree
+from asyncio import CancelledError, get_running_loop
+from pathlib import Path
+from functools import partial
+from collections import Counter
 from asyncio.subprocess import PIPE, DEVNULL
 from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
-from datashark_core.processor import ProcessorInterface
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .interface import INPUT_LENGTH, LinuxProcessorInterface
+from .batch import BatchMixin, batch_arguments
+from .scheduler import ResourceProfile
+from .helper import (
+    get_value,
+    make_argument,
+    override,
+    input_size,
+    copy_range,
+)
+from .prescan import prescan, clip_ranges
+from .content_store import deduplicate
+from .carve_index import EXPORT_FORMATS, CarveIndex
+from .parallel import Window, split_windows, split_ranges, bounded_gather
 
 NAME = 'linux_foremost'
+BATCH_NAME = 'linux_foremost_batch'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
+BLOCK_SIZE = 512
+AUDIT_FILENAME = 'audit.txt'
+INDEX_FILENAME = 'audit.idx'
+# files written next to carved files
+INDEX_FILENAMES = {
+    AUDIT_FILENAME,
+    INDEX_FILENAME,
+    'audit.jsonl',
+    'audit.sqlite',
+}
+AUDIT_LINE_PATTERN = re_compile(
+    r'^(\d+):\s+(\S+)\s+(\d+(?:\.\d+)?\s*[KMGT]?B)\s+(\d+)(?:\s+(.*))?$'
+)
+CARVED_NAME_PATTERN = re_compile(r'^(\d+)(.*)$')
 
 
-class ForemostProcessor(ProcessorInterface, metaclass=ProcessorMeta):
+class AuditEntry(NamedTuple):
+    """File carved by foremost as reported in audit file"""
+
+    name: str
+    size: str
+    offset: int
+    comment: str
+
+
+def parse_audit_line(line: str) -> Optional[AuditEntry]:
+    """Parse a foremost audit line, None if line is not a carved file"""
+    match = AUDIT_LINE_PATTERN.match(line.strip())
+    if not match:
+        return None
+    return AuditEntry(
+        match.group(2),
+        match.group(3),
+        int(match.group(4)),
+        (match.group(5) or '').strip(),
+    )
+
+
+def read_audit(audit: Path) -> Iterator[AuditEntry]:
+    """Stream carved files of a foremost audit file"""
+    with audit.open('r', errors='replace') as fobj:
+        for line in fobj:
+            entry = parse_audit_line(line)
+            if entry:
+                yield entry
+
+
+def relocate_name(name: str, offset: int) -> str:
+    """Rename a carved file found in a chunk starting at offset
+
+    Foremost names carved files after their block offset in the input.
+    """
+    match = CARVED_NAME_PATTERN.match(name)
+    if not match:
+        return name
+    block = int(match.group(1)) + offset // BLOCK_SIZE
+    return f'{block:08d}{match.group(2)}'
+
+
+class ForemostProcessor(LinuxProcessorInterface, metaclass=ProcessorMeta):
     """Run foremost on given filepath"""
 
     NAME = NAME
     SYSTEM = System.LINUX
+    BIN_KEY = 'datashark.processors.foremost.bin'
+    INPUTS = ['filepath', 'config']
+    OUTPUTS = ['output_dir']
+    RESOURCE_PROFILE = ResourceProfile.IO_BOUND
     ARGUMENTS = [
         {
             'name': 'quick',
@@ -49,27 +138,361 @@ class ForemostProcessor(ProcessorInterface, metaclass=ProcessorMeta):
             'required': True,
             'description': "File to process",
         },
+        {
+            'name': 'chunk_size',
+            'kind': Kind.INT,
+            'required': False,
+            'description': """
+                Carve chunks of this many bytes using concurrent foremost processes, chunks are aligned on 512 bytes
+                blocks and results are merged in output_dir. Chunks being carved are copied next to output_dir which
+                requires up to max_workers times chunk_size plus overlap bytes of free space
+            """,
+        },
+        {
+            'name': 'overlap',
+            'kind': Kind.INT,
+            'value': '16777216',
+            'required': False,
+            'description': """
+                Number of bytes each chunk reads past its end to complete files crossing chunk boundaries
+            """,
+        },
+        {
+            'name': 'max_workers',
+            'kind': Kind.INT,
+            'required': False,
+            'description': """
+                Maximum number of concurrent foremost processes when chunk_size is set, defaults to the number of cores
+            """,
+        },
+        {
+            'name': 'prescan',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Skip regions filled with a single byte value, chunks are dispatched over populated ranges only
+            """,
+        },
+        {
+            'name': 'dedup',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Hash carved files concurrently, move them to the content store and replace them with hard links,
+                carved files are listed with their hash, size and offset in <output_dir>/content.jsonl
+            """,
+        },
+        {
+            'name': 'index',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Stream the audit file into a compact index of carved files (type, offset, size, name) written to
+                <output_dir>/audit.idx, see CarveIndex to query it by type and offset range
+            """,
+        },
+        {
+            'name': 'index_export',
+            'kind': Kind.STR,
+            'required': False,
+            'description': """
+                Comma separated list of formats the index is exported to: jsonl writes <output_dir>/audit.jsonl,
+                sqlite writes <output_dir>/audit.sqlite. Implies index
+            """,
+        },
     ]
     DESCRIPTION = """
     Run foremost on given filepath
     """
 
-    async def _run(self, arguments: Dict[str, ProcessorArgument]):
-        """Process a file using foremost"""
+    async def _carve(self, arguments: Dict[str, ProcessorArgument]):
+        """Run a single foremost process
+
+        A chunk is read from chunk_file, filepath remains the input given
+        to the scheduler.
+        """
+        source = 'chunk_file' if get_value(arguments, 'chunk_file') else None
         # invoke subprocess
         proc = await self._start_subprocess(
-            'datashark.processors.foremost.bin',
+            self.BIN_KEY,
             ['-Q'],
             [
                 # optional
                 ('config', '-c'),
                 ('audit_only', '-w'),
                 ('output_dir', '-o'),
-                ('filepath', '-i'),
+                (source or 'filepath', '-i'),
                 # positional
             ],
             arguments,
             stdout=DEVNULL,
             stderr=PIPE,
         )
-        await self._handle_communicating_process(proc)
+        try:
+            await self._handle_communicating_process(proc)
+        except CancelledError:
+            if proc.returncode is None:
+                proc.kill()
+            raise
+
+    async def _carve_window(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        window: Window,
+        chunk_dir: Path,
+    ):
+        """Carve a window of the input copied to a chunk file
+
+        foremost seeks back in its input when a carved file spans its read
+        buffer so the chunk must be a regular file, not a pipe.
+        """
+        filepath = Path(get_value(arguments, 'filepath'))
+        chunk_file = chunk_dir.with_name(f'{chunk_dir.name}.input')
+        try:
+            await get_running_loop().run_in_executor(
+                None,
+                copy_range,
+                filepath,
+                chunk_file,
+                window.offset,
+                window.scan_length,
+            )
+            await self._carve(
+                override(
+                    arguments,
+                    make_argument('chunk_file', Kind.PATH, chunk_file),
+                    make_argument(INPUT_LENGTH, Kind.INT, window.scan_length),
+                    make_argument('output_dir', Kind.PATH, chunk_dir),
+                )
+            )
+        finally:
+            chunk_file.unlink(missing_ok=True)
+
+    @staticmethod
+    def _merge_chunk(
+        window: Window, chunk_dir: Path, output_dir: Path, counter: Counter
+    ) -> List[AuditEntry]:
+        """Move files owned by window to output_dir and return their entries"""
+        carved = {
+            path.name: path
+            for path in chunk_dir.rglob('*')
+            if path.is_file() and path.name != AUDIT_FILENAME
+        }
+        entries = []
+        audit = chunk_dir / AUDIT_FILENAME
+        with audit.open('r', errors='replace') as fobj:
+            for line in fobj:
+                entry = parse_audit_line(line)
+                if not entry:
+                    continue
+                offset = window.offset + entry.offset
+                # files starting in the overlap belong to the next window
+                if not window.owns(offset):
+                    continue
+                name = relocate_name(entry.name, window.offset)
+                source = carved.get(entry.name)
+                category = source.parent.name if source else Path(name).suffix
+                destination = output_dir / category / name
+                # moved already by an interrupted run
+                if source and not destination.exists():
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    source.rename(destination)
+                counter[category.lstrip('.')] += 1
+                entries.append(entry._replace(name=name, offset=offset))
+        return entries
+
+    async def _carve_chunk(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        window: Window,
+        output_dir: Path,
+    ) -> Tuple[List[AuditEntry], Counter]:
+        """Carve a window and move the files it owns to output_dir"""
+        chunk_dir = output_dir.with_name(
+            f'{output_dir.name}.chunk-{window.index:04d}'
+        )
+        checkpoint = self.checkpoint
+        if checkpoint and checkpoint.done(str(chunk_dir)):
+            result = checkpoint.result(str(chunk_dir))
+            return (
+                [AuditEntry(*entry) for entry in result['entries']],
+                Counter(result['counter']),
+            )
+        counter = Counter()
+        try:
+            await self._carve_window(arguments, window, chunk_dir)
+            entries = await get_running_loop().run_in_executor(
+                None,
+                self._merge_chunk,
+                window,
+                chunk_dir,
+                output_dir,
+                counter,
+            )
+        finally:
+            rmtree(chunk_dir, ignore_errors=True)
+        if checkpoint:
+            checkpoint.complete(
+                str(chunk_dir), {'entries': entries, 'counter': counter}
+            )
+        return entries, counter
+
+    async def _windows(
+        self, arguments: Dict[str, ProcessorArgument], chunk_size: int
+    ) -> List[Window]:
+        """Split the input, or its populated ranges, in chunks"""
+        filepath = Path(get_value(arguments, 'filepath'))
+        length = input_size(filepath)
+        overlap = get_value(arguments, 'overlap', 0)
+        if not get_value(arguments, 'prescan', False):
+            return split_windows(
+                0, length, -(-length // chunk_size), overlap, BLOCK_SIZE
+            )
+        ranges = clip_ranges(
+            await get_running_loop().run_in_executor(
+                None, prescan, self.config, filepath
+            ),
+            0,
+            length,
+            BLOCK_SIZE,
+        )
+        # without chunk_size each populated range is carved as a whole
+        step = chunk_size or max((size for _, size in ranges), default=1)
+        return split_ranges(ranges, step, overlap, length, BLOCK_SIZE)
+
+    async def _carve_chunked(
+        self, arguments: Dict[str, ProcessorArgument], chunk_size: int
+    ):
+        """Carve chunks of the input concurrently and merge their results"""
+        filepath = Path(get_value(arguments, 'filepath'))
+        output_dir = Path(get_value(arguments, 'output_dir', 'output'))
+        windows = await self._windows(arguments, chunk_size)
+        LOGGER.info(
+            "carving %s using %d chunks of %d bytes",
+            filepath,
+            len(windows),
+            windows[0].length if windows else 0,
+        )
+        output_dir.mkdir(parents=True, exist_ok=True)
+        results = await bounded_gather(
+            [
+                partial(self._carve_chunk, arguments, window, output_dir)
+                for window in windows
+            ],
+            get_value(arguments, 'max_workers') or cpu_count() or 1,
+        )
+        counter = Counter()
+        entries = []
+        for chunk_entries, chunk_counter in results:
+            entries.extend(chunk_entries)
+            counter.update(chunk_counter)
+        self._write_audit(
+            output_dir / AUDIT_FILENAME, filepath, entries, counter
+        )
+
+    @staticmethod
+    def _write_audit(
+        audit: Path,
+        filepath: Path,
+        entries: List[AuditEntry],
+        counter: Counter,
+    ):
+        """Write merged audit file"""
+        with audit.open('w') as fobj:
+            fobj.write("Foremost Audit File (merged from chunks)\n\n")
+            fobj.write(f"File: {filepath}\n")
+            fobj.write(f"Length: {input_size(filepath)} bytes\n\n")
+            fobj.write(
+                "Num\t Name (bs=512)\t       Size\t File Offset\t Comment\n\n"
+            )
+            for num, entry in enumerate(entries):
+                fobj.write(
+                    f"{num}:\t{entry.name:>15} \t {entry.size:>10} \t "
+                    f"{entry.offset:>13} \t {entry.comment}\n"
+                )
+            fobj.write(f"\n{len(entries)} FILES EXTRACTED\n\n")
+            for category, count in sorted(counter.items()):
+                fobj.write(f"{category}:= {count}\n")
+
+    @staticmethod
+    def _audit_offsets(audit: Path) -> Dict[str, int]:
+        """Offsets of carved files by name"""
+        if not audit.is_file():
+            return {}
+        return {entry.name: entry.offset for entry in read_audit(audit)}
+
+    @staticmethod
+    def _index(output_dir: Path, export_formats: List[str]):
+        """Index audit file and export index"""
+        audit = output_dir / AUDIT_FILENAME
+        if not audit.is_file():
+            LOGGER.warning("%s not found, nothing to index", audit)
+            return
+        index = CarveIndex.build(read_audit(audit))
+        index.save(output_dir / INDEX_FILENAME)
+        if 'jsonl' in export_formats:
+            index.to_jsonl(output_dir / 'audit.jsonl')
+        if 'sqlite' in export_formats:
+            index.to_sqlite(output_dir / 'audit.sqlite')
+        LOGGER.info("%d carved files indexed", len(index))
+
+    async def _deduplicate(self, arguments: Dict[str, ProcessorArgument]):
+        """Move carved files to the content store"""
+        output_dir = Path(get_value(arguments, 'output_dir', 'output'))
+        offsets = await get_running_loop().run_in_executor(
+            None, self._audit_offsets, output_dir / AUDIT_FILENAME
+        )
+        await deduplicate(
+            self.config,
+            output_dir,
+            'foremost',
+            lambda relative: offsets.get(relative.name),
+            lambda relative: relative.name not in INDEX_FILENAMES,
+            get_value(arguments, 'max_workers'),
+        )
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Process a file using foremost"""
+        chunk_size = get_value(arguments, 'chunk_size')
+        if chunk_size or get_value(arguments, 'prescan', False):
+            await self._carve_chunked(arguments, chunk_size)
+        else:
+            await self._carve(arguments)
+        if get_value(arguments, 'dedup', False) and not get_value(
+            arguments, 'audit_only', False
+        ):
+            await self._deduplicate(arguments)
+        export_formats = [
+            export_format.strip()
+            for export_format in get_value(
+                arguments, 'index_export', ''
+            ).split(',')
+            if export_format.strip()
+        ]
+        unknown = set(export_formats) - EXPORT_FORMATS
+        if unknown:
+            LOGGER.warning("unknown index export formats: %s", unknown)
+        if get_value(arguments, 'index', False) or export_formats:
+            await get_running_loop().run_in_executor(
+                None,
+                self._index,
+                Path(get_value(arguments, 'output_dir', 'output')),
+                export_formats,
+            )
+
+
+class ForemostBatchProcessor(BatchMixin, ForemostProcessor):
+    """Run foremost on many filepaths"""
+
+    NAME = BATCH_NAME
+    BATCH_INPUT = 'filepath'
+    BATCH_OUTPUTS = {'output_dir': 'output'}
+    ARGUMENTS = batch_arguments(
+        ForemostProcessor.ARGUMENTS, BATCH_INPUT, list(BATCH_OUTPUTS)
+    )
+    DESCRIPTION = """
+    Run foremost on many filepaths listed in a manifest
+    """
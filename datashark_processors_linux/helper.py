@@ -0,0 +1,116 @@
+"""Datashark Linux Processors Helpers
+"""
+from os import SEEK_END, sendfile
+from stat import S_ISBLK, S_ISREG
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from datashark_core.model.api import Kind, ProcessorArgument
+
+
+def get_value(
+    arguments: Dict[str, ProcessorArgument], name: str, default: Any = None
+) -> Any:
+    """Retrieve argument value or default if argument is missing or unset"""
+    argument = arguments.get(name)
+    if argument is None or argument.value is None:
+        return default
+    return argument.get_value()
+
+
+def make_argument(name: str, kind: Kind, value: Any) -> ProcessorArgument:
+    """Build a processor argument from a python value"""
+    if kind == Kind.BOOL:
+        value = 'true' if value else 'false'
+    return ProcessorArgument(
+        name=name, kind=kind, value=str(value), required=False
+    )
+
+
+def override(
+    arguments: Dict[str, ProcessorArgument], *overrides: ProcessorArgument
+) -> Dict[str, ProcessorArgument]:
+    """Copy arguments replacing some of them"""
+    arguments = dict(arguments)
+    for argument in overrides:
+        arguments[argument.name] = argument
+    return arguments
+
+
+def discard(
+    arguments: Dict[str, ProcessorArgument], *names: str
+) -> Dict[str, ProcessorArgument]:
+    """Copy arguments without some of them"""
+    return {
+        name: argument
+        for name, argument in arguments.items()
+        if name not in names
+    }
+
+
+def input_size(filepath: Path) -> int:
+    """Size of a regular file or block device in bytes"""
+    with filepath.open('rb') as fobj:
+        return fobj.seek(0, SEEK_END)
+
+
+def copy_range(src: Path, dst: Path, offset: int, length: int):
+    """Copy length bytes of src starting at offset to dst
+
+    The copy stops silently if dst is a named pipe which reader goes
+    away.
+    """
+    try:
+        with src.open('rb') as fsrc, dst.open('wb') as fdst:
+            while length > 0:
+                sent = sendfile(
+                    fdst.fileno(), fsrc.fileno(), offset, min(length, 1 << 24)
+                )
+                if not sent:
+                    break
+                offset += sent
+                length -= sent
+    except BrokenPipeError:
+        pass
+
+
+def config_value(config, key: str, default: Any = None) -> Any:
+    """Retrieve configuration value or default if key is missing or unset"""
+    try:
+        value = config.get(key)
+    except KeyError:
+        return default
+    return default if value is None else value
+
+
+def inputs_size(filepaths: List[Path]) -> int:
+    """Total size of regular files and block devices among filepaths"""
+    size = 0
+    for filepath in filepaths:
+        try:
+            mode = filepath.stat().st_mode
+        except OSError:
+            continue
+        if S_ISREG(mode) or S_ISBLK(mode):
+            size += input_size(filepath)
+    return size
+
+
+def build_argv(
+    default_args: List[str],
+    opt_pos_args: List[Tuple[str, Optional[str]]],
+    arguments: Dict[str, ProcessorArgument],
+) -> List[str]:
+    """Build command line arguments the way _start_subprocess does"""
+    argv = list(default_args)
+    for name, option in opt_pos_args:
+        argument = arguments.get(name)
+        if argument is None or argument.value is None:
+            continue
+        if argument.kind == Kind.BOOL:
+            if argument.get_value():
+                argv.append(option)
+            continue
+        if option:
+            argv.append(option)
+        argv.append(str(argument.get_value()))
+    return argv
@@ -0,0 +1,91 @@
+"""Datashark Linux Processors Incremental Source Tracking
+"""
+from os import scandir
+from re import escape
+from json import dumps, loads
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+from pathlib import Path
+
+
+class SourceEntry(NamedTuple):
+    """File of a source directory as it was processed"""
+
+    path: str
+    size: int
+    mtime: int
+
+
+def _walk(directory: Path) -> Iterator[Tuple[Path, int, int]]:
+    """Yield regular files under directory with their size and mtime"""
+    stack = [directory]
+    while stack:
+        with scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield Path(entry.path), stat.st_size, stat.st_mtime_ns
+
+
+def processed_manifest_path(storage_file: Path) -> Path:
+    """Manifest of source files already processed into storage_file"""
+    return storage_file.with_name(f'{storage_file.name}.processed.json')
+
+
+def read_processed(storage_file: Path) -> Dict[str, SourceEntry]:
+    """Read processed files manifest, empty if there is none"""
+    manifest = processed_manifest_path(storage_file)
+    if not manifest.is_file():
+        return {}
+    return {
+        item['path']: SourceEntry(item['path'], item['size'], item['mtime'])
+        for item in loads(manifest.read_text())['files']
+    }
+
+
+def write_processed(storage_file: Path, entries: Dict[str, SourceEntry]):
+    """Write processed files manifest"""
+    manifest = processed_manifest_path(storage_file)
+    tmp = manifest.with_name(f'{manifest.name}.tmp')
+    tmp.write_text(
+        dumps(
+            {
+                'files': [
+                    entry._asdict() for _, entry in sorted(entries.items())
+                ]
+            }
+        )
+    )
+    tmp.replace(manifest)
+
+
+def scan_delta(
+    source: Path, processed: Dict[str, SourceEntry]
+) -> List[SourceEntry]:
+    """List new or changed files of source
+
+    A file which size or mtime changed is processed again, sampling its
+    content could miss changes.
+    """
+    delta = []
+    for filepath, size, mtime in _walk(source):
+        path = '/' + filepath.relative_to(source).as_posix()
+        known = processed.get(path)
+        if known and known.size == size and known.mtime == mtime:
+            continue
+        delta.append(SourceEntry(path, size, mtime))
+    return delta
+
+
+def write_filter_file(filter_file: Path, entries: List[SourceEntry]):
+    """Write a plaso filter file selecting given source files
+
+    Path segments of plaso filter files are regular expressions.
+    """
+    with filter_file.open('w') as fobj:
+        for entry in entries:
+            segments = entry.path.split('/')[1:]
+            fobj.write(
+                '/' + '/'.join(escape(segment) for segment in segments) + '\n'
+            )
@@ -0,0 +1,367 @@
+"""Datashark Linux Processor Interface
+"""
+from abc import abstractmethod
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from asyncio import Queue, Task, ensure_future, gather, get_running_loop, wait
+from asyncio.subprocess import Process
+from pathlib import Path
+from contextvars import ContextVar
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.datetime import now
+from datashark_core.filesystem import prepend_workdir, ensure_parent_dir
+from datashark_core.processor import ProcessorError, ProcessorInterface
+from datashark_core.model.api import ProcessorArgument
+from .cache import ResultCache
+from .checkpoint import Checkpoint
+from .helper import config_value, get_value, inputs_size, build_argv
+from .metrics import MetricsSink, ProcessMonitor, RunMetrics
+from .plaso_pool import PlasoPool
+from .progress import ProgressEvent, ProgressParser, ProgressTracker
+from .progress import read_lines
+from .scheduler import ResourceProfile, Scheduler, SpawnLimits
+
+LOGGER = LOGGING_MANAGER.get_logger('linux_interface')
+# state of the ongoing run, runs of concurrent tasks do not share it
+CHECKPOINT = ContextVar('checkpoint', default=None)
+# directory receiving tool logs instead of <workdir>/logs
+LOG_DIRECTORY = ContextVar('log_directory', default=None)
+# internal argument giving the number of bytes of the inputs read by a
+# subprocess processing part of them, never passed to the tool
+INPUT_LENGTH = 'input_length'
+
+
+class LinuxProcessorInterface(ProcessorInterface):
+    """Common behavior of linux processors
+
+    Subclasses implement _process instead of _run and declare which
+    arguments are input files and output paths so that results can be
+    cached. Subprocesses are started through the scheduler according to
+    the resource profile of the tool and their resource usage is recorded
+    in metrics. Their output is read line by line and turned into progress
+    events sent to progress listeners.
+    """
+
+    BIN_KEY = None
+    INPUTS: List[str] = []
+    OUTPUTS: List[str] = []
+    RESOURCE_PROFILE = ResourceProfile.CPU_BOUND
+    PROGRESS_PARSER: Optional[ProgressParser] = None
+
+    @property
+    def metrics(self) -> List[RunMetrics]:
+        """Metrics of subprocesses which exited during the last run"""
+        return self.__dict__.setdefault('_metrics', [])
+
+    @property
+    def progress_listeners(self) -> List[Callable[[ProgressEvent], None]]:
+        """Callables receiving progress events of subprocesses"""
+        return self.__dict__.setdefault('_progress_listeners', [])
+
+    @property
+    def checkpoint(self) -> Optional[Checkpoint]:
+        """Checkpoint of the ongoing run, None if checkpoints are disabled"""
+        return CHECKPOINT.get()
+
+    @property
+    def _monitors(self) -> List[Task]:
+        return self.__dict__.setdefault('_monitor_tasks', [])
+
+    @property
+    def _trackers(self) -> Dict[int, ProgressTracker]:
+        return self.__dict__.setdefault('_progress_trackers', {})
+
+    @property
+    def _progress_queues(self) -> List[Queue]:
+        return self.__dict__.setdefault('_progress_queue_list', [])
+
+    def _emit_progress(self, event: ProgressEvent):
+        for listener in list(self.progress_listeners):
+            try:
+                listener(event)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("progress listener failed")
+        for queue in self._progress_queues:
+            queue.put_nowait(event)
+
+    async def progress(self) -> AsyncIterator[ProgressEvent]:
+        """Yield progress events until the ongoing run ends"""
+        queue = Queue()
+        self._progress_queues.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self._progress_queues.remove(queue)
+
+    async def _monitor(self, monitor: ProcessMonitor):
+        metrics = await monitor.monitor(
+            config_value(
+                self.config, 'datashark.processors.metrics.interval', 1.0
+            )
+        )
+        self.metrics.append(metrics)
+        MetricsSink.instance(self.config).record(metrics)
+        LOGGER.info(
+            "%s (pid=%d) exited after %.3fs (%.2f MB/s, peak rss %d bytes)",
+            metrics.tool,
+            metrics.pid,
+            metrics.wall_time,
+            metrics.throughput,
+            metrics.peak_rss,
+        )
+
+    def _inputs(self, arguments: Dict[str, ProcessorArgument]) -> List[Path]:
+        """Input paths of a run"""
+        return [
+            Path(get_value(arguments, name))
+            for name in self.INPUTS
+            if get_value(arguments, name)
+        ]
+
+    async def _start_subprocess(
+        self,
+        bin_key: str,
+        default_args: List[str],
+        opt_pos_args: List[Tuple[str, Optional[str]]],
+        arguments: Dict[str, ProcessorArgument],
+        **kwargs,
+    ) -> Process:
+        """Start subprocess once the scheduler grants a slot to the tool"""
+        tool = bin_key.split('.')[-2]
+        scheduler = Scheduler.instance(self.config)
+        release = await scheduler.acquire(
+            tool, self.RESOURCE_PROFILE, self._inputs(arguments)
+        )
+        try:
+            limits = scheduler.prepare(tool, self.RESOURCE_PROFILE)
+            try:
+                proc = await self._spawn(
+                    bin_key,
+                    default_args,
+                    opt_pos_args,
+                    arguments,
+                    limits,
+                    **kwargs,
+                )
+            except BaseException:
+                limits.discard()
+                raise
+            scheduler.watch(proc, release, limits)
+        except BaseException:
+            release()
+            raise
+        # shards read part of the inputs only
+        size = (
+            get_value(arguments, INPUT_LENGTH)
+            or self._progress_total(arguments)
+            or inputs_size(self._inputs(arguments))
+        )
+        self._monitors.append(
+            ensure_future(self._monitor(ProcessMonitor(tool, proc, size)))
+        )
+        self._trackers[proc.pid] = ProgressTracker(
+            tool,
+            proc.pid,
+            size or None,
+            self.PROGRESS_PARSER,
+            self._emit_progress,
+            config_value(
+                self.config, 'datashark.processors.progress.context_lines', 50
+            ),
+        )
+        return proc
+
+    async def _spawn(
+        self,
+        bin_key: str,
+        default_args: List[str],
+        opt_pos_args: List[Tuple[str, Optional[str]]],
+        arguments: Dict[str, ProcessorArgument],
+        limits: SpawnLimits,
+        **kwargs,
+    ) -> Process:
+        """Start subprocess as a plaso pool job when the pool serves it
+
+        Limits are applied by the subprocess itself before running the
+        tool so that processes started by the tool inherit them.
+        """
+        pool = PlasoPool.from_config(self.config)
+        binary = config_value(self.config, bin_key)
+        if pool and binary and set(kwargs) <= {'stdout', 'stderr'}:
+            proc = await pool.start(
+                bin_key.split('.')[-2],
+                Path(binary),
+                build_argv(default_args, opt_pos_args, arguments),
+                limits=limits.request(),
+                **kwargs,
+            )
+            if proc:
+                return proc
+        if limits.enabled:
+            kwargs['preexec_fn'] = limits.apply
+        return await super()._start_subprocess(
+            bin_key, default_args, opt_pos_args, arguments, **kwargs
+        )
+
+    def _log_path(self, tool: str, tag: str = '') -> Path:
+        """Log file of a tool run"""
+        suffix = f'-{tag}' if tag else ''
+        directory = LOG_DIRECTORY.get()
+        if directory:
+            logpath = directory / f'{tool}{suffix}.log.gz'
+        else:
+            timestamp = now('%Y%m%dT%H%M%S')
+            logpath = prepend_workdir(
+                self.config, f'logs/{tool}-{timestamp}{suffix}.log.gz'
+            )
+        ensure_parent_dir(logpath)
+        return logpath
+
+    def _progress_total(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> Optional[int]:
+        """Number of bytes a subprocess is expected to read if known"""
+        return None
+
+    async def _handle_communicating_process(self, proc: Process):
+        """Stream subprocess output to its progress tracker until it exits
+
+        Unlike communicate, memory usage does not depend on output size,
+        only last lines are kept to give context to errors.
+        """
+        tracker = self._trackers.pop(proc.pid, None) or ProgressTracker(
+            self.NAME,
+            proc.pid,
+            None,
+            self.PROGRESS_PARSER,
+            self._emit_progress,
+        )
+        interval = config_value(
+            self.config, 'datashark.processors.progress.interval', 1.0
+        )
+        stall_timeout = config_value(
+            self.config, 'datashark.processors.progress.stall_timeout'
+        )
+        readers = [
+            ensure_future(read_lines(stream, tracker.feed))
+            for stream in (proc.stdout, proc.stderr)
+            if stream is not None
+        ]
+        waiter = ensure_future(gather(proc.wait(), *readers))
+        try:
+            while not waiter.done():
+                await wait({waiter}, timeout=interval)
+                if tracker.sample(stall_timeout):
+                    LOGGER.warning(
+                        "%s (pid=%d) made no progress for %ss",
+                        self.NAME,
+                        proc.pid,
+                        stall_timeout,
+                    )
+            await waiter
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+        if proc.returncode != 0:
+            context = '\n'.join(tracker.context)
+            raise ProcessorError(
+                f"{self.NAME} subprocess exited with code {proc.returncode}"
+                + (f":\n{context}" if context else '')
+            )
+
+    def _outputs(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> Dict[str, Path]:
+        """Output paths produced by a run, empty if run is not cacheable"""
+        return {
+            name: Path(get_value(arguments, name))
+            for name in self.OUTPUTS
+            if get_value(arguments, name)
+        }
+
+    def _cache_key(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        outputs: Dict[str, Path],
+    ) -> Optional[str]:
+        """Cache key of a run, None if run is not cacheable"""
+        inputs = self._inputs(arguments)
+        # directories cannot be fingerprinted cheaply
+        if not inputs or any(path.is_dir() for path in inputs):
+            return None
+        binary = config_value(self.config, self.BIN_KEY)
+        if not binary:
+            return None
+        return ResultCache.key(
+            self.NAME,
+            inputs,
+            [
+                (name, str(argument.value))
+                for name, argument in arguments.items()
+                if name not in outputs
+                and name not in self.INPUTS
+                and name not in self.OUTPUTS
+            ],
+            Path(binary),
+        )
+
+    @abstractmethod
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Process arguments"""
+
+    async def _process_checkpointed(
+        self, arguments: Dict[str, ProcessorArgument]
+    ):
+        """Process arguments resuming a failed run with the same arguments"""
+        loop = get_running_loop()
+        checkpoint = await loop.run_in_executor(
+            None,
+            Checkpoint.from_config,
+            self.config,
+            self.NAME,
+            self._inputs(arguments),
+            arguments,
+        )
+        token = CHECKPOINT.set(checkpoint)
+        try:
+            await self._process(arguments)
+        finally:
+            CHECKPOINT.reset(token)
+        if checkpoint:
+            checkpoint.clear()
+
+    async def _run_cached(self, arguments: Dict[str, ProcessorArgument]):
+        """Process arguments unless results can be restored from cache"""
+        cache = ResultCache.from_config(self.config)
+        outputs = self._outputs(arguments) if cache else {}
+        if not outputs:
+            await self._process_checkpointed(arguments)
+            return
+        loop = get_running_loop()
+        key = await loop.run_in_executor(
+            None, self._cache_key, arguments, outputs
+        )
+        if key is None:
+            await self._process_checkpointed(arguments)
+            return
+        if await loop.run_in_executor(None, cache.restore, key, outputs):
+            LOGGER.info("%s results restored from cache %s", self.NAME, key)
+            return
+        await self._process_checkpointed(arguments)
+        await loop.run_in_executor(None, cache.store, key, outputs)
+
+    async def _run(self, arguments: Dict[str, ProcessorArgument]):
+        """Process arguments and collect metrics of started subprocesses"""
+        self.metrics.clear()
+        try:
+            await self._run_cached(arguments)
+        finally:
+            monitors = list(self._monitors)
+            self._monitors.clear()
+            await gather(*monitors, return_exceptions=True)
+            self._trackers.clear()
+            for queue in self._progress_queues:
+                queue.put_nowait(None)
@@ -1,23 +1,72 @@
 """Datashark log2timeline.py Processor
 """
-from typing import Dict
-from asyncio.subprocess import PIPE, DEVNULL
+from os import cpu_count
+from re import compile as re_compile
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from asyncio import get_running_loop
+from functools import partial
+from asyncio.subprocess import PIPE
 from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.datetime import now
-from datashark_core.processor import ProcessorInterface
+from datashark_core.processor import ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
-from datashark_core.filesystem import prepend_workdir, ensure_parent_dir
+from .interface import LinuxProcessorInterface
+from .batch import BatchMixin, batch_arguments
+from .progress import parse_plaso_status
+from .scheduler import ResourceProfile
+from .helper import get_value, make_argument, override, config_value
+from .storage import (
+    range_expression,
+    shard_storage_file,
+    read_manifest,
+    write_manifest,
+    remove_manifest,
+)
+from .incremental import (
+    read_processed,
+    write_processed,
+    scan_delta,
+    write_filter_file,
+)
+from .parallel import bounded_gather
 
 NAME = 'linux_log2timeline'
+BATCH_NAME = 'linux_log2timeline_batch'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
+MMLS_BIN_KEY = 'datashark.processors.mmls.bin'
+MMLS_SLOT_PATTERN = re_compile(r'^\d+:\s+\d+:\d+\s')
+OPTIONS = [
+    # optional
+    ('artifact_definitions', '--artifact-definitions'),
+    ('artifact_filters_file', '--artifact-filters_file'),
+    ('filter_file', '--filter-file'),
+    ('hasher_file_size_limit', '--hasher-file-size-limit'),
+    ('hashers', '--hashers'),
+    ('parsers', '--parsers'),
+    ('partitions', '--partitions'),
+    ('volumes', '--volumes'),
+    ('no_vss', '--no-vss'),
+    ('vss_only', '--vss-only'),
+    ('vss_stores', '--vss-stores'),
+    ('credential', '--credential'),
+    # positional
+    ('storage_file', None),
+    ('source', None),
+]
 
 
-class Log2TimelineProcessor(ProcessorInterface, metaclass=ProcessorMeta):
+class Log2TimelineProcessor(LinuxProcessorInterface, metaclass=ProcessorMeta):
     """Run log2timeline on given filepath"""
 
     NAME = NAME
     SYSTEM = System.LINUX
+    BIN_KEY = 'datashark.processors.log2timeline.bin'
+    INPUTS = ['source', 'filter_file', 'artifact_filters_file']
+    OUTPUTS = ['storage_file']
+    RESOURCE_PROFILE = ResourceProfile.CPU_BOUND
+    PROGRESS_PARSER = staticmethod(parse_plaso_status)
     ARGUMENTS = [
         {
             'name': 'artifact_definitions',
@@ -145,6 +194,36 @@ class Log2TimelineProcessor(ProcessorInterface, metaclass=ProcessorMeta):
                 WARNING credentials passed via command line arguments can end up in logs, so use this option with care.
             """,
         },
+        {
+            'name': 'fan_out',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Run one log2timeline process per partition (or per volume if partitions is not given) into
+                separate storage files listed in a <storage_file>.shards.json manifest. "all" partitions are
+                enumerated using mmls, "all" volumes cannot be enumerated and are processed by a single process.
+            """,
+        },
+        {
+            'name': 'incremental',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Only process files of a source directory which are new or changed since the previous incremental
+                run. Processed files are tracked in <storage_file>.processed.json, new files are processed into a
+                sibling storage file listed in <storage_file>.shards.json. Cannot be combined with filter_file.
+            """,
+        },
+        {
+            'name': 'max_workers',
+            'kind': Kind.INT,
+            'required': False,
+            'description': """
+                Maximum number of concurrent log2timeline processes in fan_out mode, defaults to the number of cores
+            """,
+        },
         {
             'name': 'storage_file',
             'kind': Kind.PATH,
@@ -166,37 +245,215 @@ class Log2TimelineProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Run log2timeline with given arguments
     """
 
-    async def _run(self, arguments: Dict[str, ProcessorArgument]):
-        """Process a file using log2timeline.py"""
+    def _outputs(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> Dict[str, Path]:
+        """Fan out outputs are not cacheable"""
+        if get_value(arguments, 'fan_out', False):
+            return {}
+        return super()._outputs(arguments)
+
+    async def _extract(
+        self, arguments: Dict[str, ProcessorArgument], tag: str = ''
+    ):
+        """Run a single log2timeline process"""
+        logpath = self._log_path('log2timeline', tag)
         # invoke subprocess
-        timestamp = now('%Y%m%dT%H%M%S')
-        logpath = prepend_workdir(
-            self.config, f'logs/log2timeline-{timestamp}.log.gz'
-        )
-        ensure_parent_dir(logpath)
         proc = await self._start_subprocess(
-            'datashark.processors.log2timeline.bin',
-            ['-q', '-u', '--log-file', str(logpath)],
+            self.BIN_KEY,
             [
-                # optional
-                ('artifact_definitions', '--artifact-definitions'),
-                ('artifact_filters_file', '--artifact-filters_file'),
-                ('filter_file', '--filter-file'),
-                ('hasher_file_size_limit', '--hasher-file-size-limit'),
-                ('hashers', '--hashers'),
-                ('parsers', '--parsers'),
-                ('partitions', '--partitions'),
-                ('volumes', '--volumes'),
-                ('no_vss', '--no-vss'),
-                ('vss_only', '--vss-only'),
-                ('vss_stores', '--vss-stores'),
-                ('credential', '--credential'),
-                # positional
-                ('storage_file', None),
-                ('source', None),
+                '-q',
+                '-u',
+                '--status_view',
+                'linear',
+                '--log-file',
+                str(logpath),
             ],
+            OPTIONS,
             arguments,
-            stdout=DEVNULL,
+            stdout=PIPE,
             stderr=PIPE,
         )
         await self._handle_communicating_process(proc)
+
+    async def _extract_unit(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        storage_file: Path,
+        tag: str,
+    ):
+        """Run log2timeline unless storage file was completed already"""
+        checkpoint = self.checkpoint
+        if checkpoint:
+            if checkpoint.done(str(storage_file)) and storage_file.exists():
+                LOGGER.info("%s completed already", storage_file)
+                return
+            # written by an interrupted run
+            storage_file.unlink(missing_ok=True)
+        await self._extract(arguments, tag)
+        if checkpoint:
+            checkpoint.complete(str(storage_file))
+
+    async def _count_partitions(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> Optional[int]:
+        """Count allocated partitions of source using mmls
+
+        plaso numbers allocated partitions only, in partition table order.
+        Returns None when mmls is not available.
+        """
+        if not config_value(self.config, MMLS_BIN_KEY):
+            LOGGER.warning("%s is not configured", MMLS_BIN_KEY)
+            return None
+        try:
+            proc = await self._start_subprocess(
+                MMLS_BIN_KEY,
+                [],
+                [('source', None)],
+                arguments,
+                stdout=PIPE,
+                stderr=PIPE,
+            )
+        except (ProcessorError, OSError) as exc:
+            LOGGER.warning("cannot run mmls: %s", exc)
+            return None
+        stdout, _ = await proc.communicate()
+        if proc.returncode != 0:
+            return None
+        return sum(
+            1
+            for line in stdout.decode(errors='replace').splitlines()
+            if MMLS_SLOT_PATTERN.match(line)
+        )
+
+    async def _fan_out_targets(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> Tuple[Optional[str], List[int]]:
+        """Determine argument to fan out and its values"""
+        for name in ('partitions', 'volumes'):
+            expression = get_value(arguments, name)
+            if not expression:
+                continue
+            indices = range_expression(expression)
+            if indices is None and name == 'partitions':
+                count = await self._count_partitions(arguments)
+                if count:
+                    indices = list(range(1, count + 1))
+            if indices is None:
+                LOGGER.warning("cannot enumerate %s: %s", name, expression)
+                return None, []
+            return name, indices
+        return None, []
+
+    async def _extract_fan_out(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        name: str,
+        indices: List[int],
+    ):
+        """Run one log2timeline process per partition or volume"""
+        storage_file = Path(get_value(arguments, 'storage_file'))
+        prefix = name[0]
+        storage_files = [
+            shard_storage_file(storage_file, f'{prefix}{index}')
+            for index in indices
+        ]
+        LOGGER.info(
+            "extracting %d %s into %d storage files",
+            len(indices),
+            name,
+            len(storage_files),
+        )
+        await bounded_gather(
+            [
+                partial(
+                    self._extract_unit,
+                    override(
+                        arguments,
+                        make_argument(name, Kind.STR, index),
+                        make_argument('storage_file', Kind.PATH, filepath),
+                    ),
+                    filepath,
+                    f'{prefix}{index}',
+                )
+                for index, filepath in zip(indices, storage_files)
+            ],
+            get_value(arguments, 'max_workers') or cpu_count() or 1,
+        )
+        write_manifest(storage_file, storage_files)
+
+    async def _extract_incremental(
+        self, arguments: Dict[str, ProcessorArgument]
+    ):
+        """Process new or changed files of source only"""
+        source = Path(get_value(arguments, 'source'))
+        storage_file = Path(get_value(arguments, 'storage_file'))
+        processed = read_processed(storage_file)
+        delta = await get_running_loop().run_in_executor(
+            None, scan_delta, source, processed
+        )
+        LOGGER.info("%d new or changed files in %s", len(delta), source)
+        if not delta:
+            write_processed(storage_file, processed)
+            return
+        if not storage_file.exists():
+            remove_manifest(storage_file)
+            await self._extract(arguments)
+        else:
+            if not processed:
+                LOGGER.warning(
+                    "%s has no processed files manifest, all files of %s "
+                    "are processed again",
+                    storage_file,
+                    source,
+                )
+            tag = f"delta-{now('%Y%m%dT%H%M%S')}"
+            delta_file = shard_storage_file(storage_file, tag)
+            filter_file = delta_file.with_name(f'{delta_file.name}.filter')
+            write_filter_file(filter_file, delta)
+            await self._extract(
+                override(
+                    arguments,
+                    make_argument('filter_file', Kind.PATH, filter_file),
+                    make_argument('storage_file', Kind.PATH, delta_file),
+                ),
+                tag,
+            )
+            storage_files = read_manifest(storage_file) or [storage_file]
+            write_manifest(storage_file, storage_files + [delta_file])
+        processed.update({entry.path: entry for entry in delta})
+        write_processed(storage_file, processed)
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Process a file using log2timeline.py"""
+        if get_value(arguments, 'incremental', False):
+            source = Path(get_value(arguments, 'source'))
+            if source.is_dir() and not get_value(arguments, 'filter_file'):
+                await self._extract_incremental(arguments)
+                return
+            LOGGER.warning(
+                "incremental mode requires a directory source and no "
+                "filter_file"
+            )
+        if get_value(arguments, 'fan_out', False):
+            name, indices = await self._fan_out_targets(arguments)
+            if name:
+                await self._extract_fan_out(arguments, name, indices)
+                return
+        # storage file is no longer sharded
+        remove_manifest(Path(get_value(arguments, 'storage_file')))
+        await self._extract(arguments)
+
+
+class Log2TimelineBatchProcessor(BatchMixin, Log2TimelineProcessor):
+    """Run log2timeline on many sources"""
+
+    NAME = BATCH_NAME
+    BATCH_INPUT = 'source'
+    BATCH_OUTPUTS = {'storage_file': 'storage.plaso'}
+    ARGUMENTS = batch_arguments(
+        Log2TimelineProcessor.ARGUMENTS, BATCH_INPUT, list(BATCH_OUTPUTS)
+    )
+    DESCRIPTION = """
+    Run log2timeline on many sources listed in a manifest
+    """
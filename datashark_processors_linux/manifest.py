@@ -0,0 +1,121 @@
+"""Datashark Linux Processors Metadata Manifest
+
+Processor metadata is read from processors.json without importing
+processor modules, processor classes are imported when first needed.
+Regenerate the manifest whenever processor arguments change:
+
+    python -m datashark_processors_linux.manifest [--check]
+"""
+import sys
+from json import dumps, loads
+from typing import Any, Dict, List, Optional
+from textwrap import dedent
+from pathlib import Path
+from functools import lru_cache
+from importlib import import_module
+
+MANIFEST = Path(__file__).resolve().with_name('processors.json')
+# keep in sync with datashark_processors entry points of setup.cfg
+ENTRY_POINTS = {
+    'linux_psort': 'datashark_processors_linux.psort:PSortProcessor',
+    'linux_psort_batch': (
+        'datashark_processors_linux.psort:PSortBatchProcessor'
+    ),
+    'linux_tskape': 'datashark_processors_linux.tskape:TSKAPEProcessor',
+    'linux_tskape_batch': (
+        'datashark_processors_linux.tskape:TSKAPEBatchProcessor'
+    ),
+    'linux_binwalk': 'datashark_processors_linux.binwalk:BinwalkProcessor',
+    'linux_binwalk_batch': (
+        'datashark_processors_linux.binwalk:BinwalkBatchProcessor'
+    ),
+    'linux_foremost': 'datashark_processors_linux.foremost:ForemostProcessor',
+    'linux_foremost_batch': (
+        'datashark_processors_linux.foremost:ForemostBatchProcessor'
+    ),
+    'linux_log2timeline': (
+        'datashark_processors_linux.log2timeline:Log2TimelineProcessor'
+    ),
+    'linux_log2timeline_batch': (
+        'datashark_processors_linux.log2timeline:Log2TimelineBatchProcessor'
+    ),
+    'linux_plaso_pipeline': (
+        'datashark_processors_linux.pipeline:PlasoPipelineProcessor'
+    ),
+    'linux_plaso_merge': (
+        'datashark_processors_linux.merge:PlasoMergeProcessor'
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def processors() -> Dict[str, Dict[str, Any]]:
+    """Metadata of processors by name
+
+    Argument kinds and systems are given as enum member names of
+    datashark_core.model.api Kind and System.
+    """
+    return loads(MANIFEST.read_text())['processors']
+
+
+def processor_metadata(name: str) -> Optional[Dict[str, Any]]:
+    """Metadata of a processor, None if there is no such processor"""
+    return processors().get(name)
+
+
+def load_processor(name: str) -> type:
+    """Import processor class"""
+    module, _, attribute = ENTRY_POINTS[name].partition(':')
+    return getattr(import_module(module), attribute)
+
+
+def _argument(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'name': spec['name'],
+        'kind': spec['kind'].name,
+        'value': spec.get('value'),
+        'required': spec['required'],
+        'description': dedent(spec.get('description') or '').strip(),
+    }
+
+
+def build_manifest() -> Dict[str, Any]:
+    """Build manifest by importing processor classes"""
+    entries = {}
+    for name in ENTRY_POINTS:
+        processor = load_processor(name)
+        if processor.NAME != name:
+            raise ValueError(f"{ENTRY_POINTS[name]} is named {processor.NAME}")
+        entries[name] = {
+            'name': name,
+            'entry_point': ENTRY_POINTS[name],
+            'system': processor.SYSTEM.name,
+            'description': dedent(processor.DESCRIPTION or '').strip(),
+            'arguments': [_argument(spec) for spec in processor.ARGUMENTS],
+        }
+    return {'processors': entries}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Write manifest, or check that it is up to date"""
+    # only needed to generate the manifest, keep reading it cheap
+    # pylint: disable=import-outside-toplevel
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Generate processors manifest")
+    parser.add_argument(
+        '--check', action='store_true', help="fail if manifest is stale"
+    )
+    args = parser.parse_args(argv)
+    manifest = dumps(build_manifest(), indent=2) + '\n'
+    if args.check:
+        if not MANIFEST.is_file() or MANIFEST.read_text() != manifest:
+            print(f"{MANIFEST} is stale", file=sys.stderr)
+            return 1
+        return 0
+    MANIFEST.write_text(manifest)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
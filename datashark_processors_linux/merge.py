@@ -0,0 +1,194 @@
+"""Datashark plaso Storage Merge Processor
+"""
+from os import cpu_count
+from time import monotonic
+from typing import Dict, List
+from asyncio import get_running_loop
+from pathlib import Path
+from functools import partial
+from datashark_core.meta import ProcessorMeta
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.processor import ProcessorError
+from datashark_core.model.api import Kind, ProcessorArgument
+from .psort import PSortProcessor
+from .helper import get_value, make_argument, override, discard
+from .parallel import bounded_gather
+from .storage import read_manifest
+from .timeline import MERGEABLE_FORMATS, merge_exports
+
+NAME = 'linux_plaso_merge'
+LOGGER = LOGGING_MANAGER.get_logger(NAME)
+# psort arguments applying to every storage file, analysis is left out
+# since plugins would only see the events of each storage file
+PSORT_ARGUMENTS = [
+    'slice',
+    'slice_size',
+    'output_file',
+    'filter',
+]
+
+
+class PlasoMergeProcessor(PSortProcessor, metaclass=ProcessorMeta):
+    """Export many storage files as a single timeline"""
+
+    NAME = NAME
+    ARGUMENTS = (
+        [
+            {
+                'name': 'storage_file',
+                'kind': Kind.PATH,
+                'required': True,
+                'description': """
+                Storage file to export, storage files listed in <storage_file>.shards.json by a fan out or
+                incremental log2timeline run are exported instead when this manifest exists
+            """,
+            },
+            {
+                'name': 'storage_files',
+                'kind': Kind.STR,
+                'required': False,
+                'description': """
+                Comma separated list of other storage files to export along with storage_file, for instance
+                storage files of log2timeline runs on different sources
+            """,
+            },
+            {
+                'name': 'output_format',
+                'kind': Kind.STR,
+                'value': 'json_line',
+                'required': False,
+                'description': """
+                Format of the merged timeline, one of: dynamic, json_line, l2tcsv
+            """,
+            },
+            {
+                'name': 'unique',
+                'kind': Kind.BOOL,
+                'value': 'true',
+                'required': False,
+                'description': """
+                Drop exact-duplicate events, for instance events of a file extracted by several runs
+            """,
+            },
+            {
+                'name': 'max_workers',
+                'kind': Kind.INT,
+                'required': False,
+                'description': """
+                Maximum number of concurrent psort processes, defaults to the number of cores
+            """,
+            },
+        ]
+        + [
+            spec
+            for spec in PSortProcessor.ARGUMENTS
+            if spec['name'] in PSORT_ARGUMENTS
+        ]
+    )
+    DESCRIPTION = """
+    Export storage files with psort and merge exports by timestamp
+    """
+
+    @staticmethod
+    def _storage_files(arguments: Dict[str, ProcessorArgument]) -> List[Path]:
+        """Storage files to export, in the order of the merge"""
+        storage_file = Path(get_value(arguments, 'storage_file'))
+        storage_files = read_manifest(storage_file) or [storage_file]
+        others = get_value(arguments, 'storage_files') or ''
+        for filepath in others.split(','):
+            filepath = filepath.strip()
+            if filepath and Path(filepath) not in storage_files:
+                storage_files.append(Path(filepath))
+        return storage_files
+
+    def _inputs(self, arguments: Dict[str, ProcessorArgument]) -> List[Path]:
+        """Every storage file of the merge"""
+        return self._storage_files(arguments)
+
+    async def _export_part(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        storage_file: Path,
+        output_file: Path,
+        tag: str,
+    ):
+        """Export a storage file to a part of the merge"""
+        checkpoint = self.checkpoint
+        if checkpoint:
+            if checkpoint.done(str(output_file)) and output_file.exists():
+                LOGGER.info("%s completed already", output_file)
+                return
+            # written by an interrupted run
+            output_file.unlink(missing_ok=True)
+        await self._export(
+            override(
+                arguments,
+                make_argument('storage_file', Kind.PATH, storage_file),
+                make_argument('output_file', Kind.PATH, output_file),
+            ),
+            tag,
+        )
+        if checkpoint:
+            checkpoint.complete(str(output_file))
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Export storage files concurrently then merge exports"""
+        output_format = get_value(arguments, 'output_format', 'json_line')
+        if output_format not in MERGEABLE_FORMATS:
+            raise ProcessorError(
+                f"{output_format} exports cannot be merged, use one of: "
+                f"{', '.join(sorted(MERGEABLE_FORMATS))}"
+            )
+        storage_files = self._storage_files(arguments)
+        output_file = Path(get_value(arguments, 'output_file'))
+        partial_files = [
+            output_file.with_name(f'{output_file.name}.part-{index:04d}')
+            for index in range(len(storage_files))
+        ]
+        unique = get_value(arguments, 'unique', True)
+        max_workers = get_value(arguments, 'max_workers') or cpu_count() or 1
+        arguments = override(
+            discard(arguments, 'storage_files', 'unique', 'max_workers'),
+            make_argument('output_format', Kind.STR, output_format),
+        )
+        start = monotonic()
+        checkpoint = self.checkpoint
+        try:
+            await bounded_gather(
+                [
+                    partial(
+                        self._export_part,
+                        arguments,
+                        storage_file,
+                        filepath,
+                        f'part-{index:04d}',
+                    )
+                    for index, (storage_file, filepath) in enumerate(
+                        zip(storage_files, partial_files)
+                    )
+                ],
+                max_workers,
+            )
+            count = await get_running_loop().run_in_executor(
+                None,
+                merge_exports,
+                partial_files,
+                output_file,
+                output_format,
+                unique,
+            )
+        except BaseException:
+            # completed exports are kept to resume the merge
+            for filepath in partial_files:
+                if not checkpoint or not checkpoint.done(str(filepath)):
+                    filepath.unlink(missing_ok=True)
+            raise
+        for filepath in partial_files:
+            filepath.unlink(missing_ok=True)
+        LOGGER.info(
+            "%d storage files merged into %s (%d events) in %.3fs",
+            len(storage_files),
+            output_file,
+            count,
+            monotonic() - start,
+        )
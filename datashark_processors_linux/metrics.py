@@ -0,0 +1,240 @@
+"""Datashark Linux Processors Resource Instrumentation
+"""
+from os import getpid, sysconf
+from json import dumps
+from time import monotonic, time
+from typing import Any, Dict, List, NamedTuple, Optional
+from asyncio import ensure_future, wait
+from pathlib import Path
+from resource import RUSAGE_CHILDREN, getrusage
+from asyncio.subprocess import Process
+from .helper import config_value
+
+PROC = Path('/proc')
+CLOCK_TICKS = sysconf('SC_CLK_TCK')
+PAGE_SIZE = sysconf('SC_PAGE_SIZE')
+
+
+class RunMetrics(NamedTuple):
+    """Resources used by a tool subprocess and its descendants"""
+
+    tool: str
+    pid: int
+    returncode: Optional[int]
+    started: float
+    wall_time: float
+    cpu_user: float
+    cpu_system: float
+    peak_rss: int
+    read_bytes: int
+    write_bytes: int
+    input_size: int
+
+    @property
+    def throughput(self) -> float:
+        """Input megabytes processed per second"""
+        if not self.wall_time:
+            return 0.0
+        return self.input_size / self.wall_time / 1000000
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Metrics as a dict including throughput"""
+        metrics = self._asdict()
+        metrics['throughput'] = self.throughput
+        return metrics
+
+
+class _Usage(NamedTuple):
+    cpu_user: float
+    cpu_system: float
+    rss: int
+    read_bytes: int
+    write_bytes: int
+
+
+def _read_usage(pid: int) -> Optional[_Usage]:
+    """Read usage of a single process from procfs"""
+    try:
+        stat = (PROC / str(pid) / 'stat').read_text()
+        fields = stat[stat.rindex(')') + 2 :].split()
+        io_counters = {}
+        try:
+            for line in (PROC / str(pid) / 'io').read_text().splitlines():
+                name, _, value = line.partition(':')
+                io_counters[name] = int(value)
+        except PermissionError:
+            pass
+    except (OSError, ValueError):
+        return None
+    return _Usage(
+        int(fields[11]) / CLOCK_TICKS,
+        int(fields[12]) / CLOCK_TICKS,
+        int(fields[21]) * PAGE_SIZE,
+        io_counters.get('read_bytes', 0),
+        io_counters.get('write_bytes', 0),
+    )
+
+
+def _process_tree(root: int) -> List[int]:
+    """List pids of root and its descendants"""
+    children: Dict[int, List[int]] = {}
+    for entry in PROC.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / 'stat').read_text()
+            ppid = int(stat[stat.rindex(')') + 2 :].split()[1])
+        except (OSError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+    tree = [root]
+    for pid in tree:
+        tree.extend(children.get(pid, []))
+    return tree
+
+
+class ProcessMonitor:
+    """Sample procfs usage of a process tree until it exits
+
+    Counters of descendants which exit between two samples are only
+    accounted up to the last sample, the getrusage counters of waited
+    children are used instead when they are greater and no other
+    subprocess ran concurrently.
+    """
+
+    _ACTIVE = 0
+
+    def __init__(self, tool: str, proc: Process, input_size: int):
+        self._tool = tool
+        self._proc = proc
+        self._input_size = input_size
+        self._usages: Dict[int, _Usage] = {}
+        self._peak_rss = 0
+        self._exclusive = ProcessMonitor._ACTIVE == 0
+
+    def _sample(self):
+        rss = 0
+        for pid in _process_tree(self._proc.pid):
+            usage = _read_usage(pid)
+            if usage:
+                self._usages[pid] = usage
+                rss += usage.rss
+        self._peak_rss = max(self._peak_rss, rss)
+
+    async def monitor(self, interval: float = 1.0) -> RunMetrics:
+        """Wait for process exit and return its metrics"""
+        ProcessMonitor._ACTIVE += 1
+        started = time()
+        start = monotonic()
+        rusage = getrusage(RUSAGE_CHILDREN)
+        waiter = ensure_future(self._proc.wait())
+        try:
+            while not waiter.done():
+                self._sample()
+                await wait({waiter}, timeout=interval)
+        finally:
+            ProcessMonitor._ACTIVE -= 1
+            if not waiter.done():
+                waiter.cancel()
+        self._exclusive = self._exclusive and ProcessMonitor._ACTIVE == 0
+        wall_time = monotonic() - start
+        usages = list(self._usages.values())
+        cpu_user = sum(usage.cpu_user for usage in usages)
+        cpu_system = sum(usage.cpu_system for usage in usages)
+        if self._exclusive:
+            final = getrusage(RUSAGE_CHILDREN)
+            cpu_user = max(cpu_user, final.ru_utime - rusage.ru_utime)
+            cpu_system = max(cpu_system, final.ru_stime - rusage.ru_stime)
+        return RunMetrics(
+            tool=self._tool,
+            pid=self._proc.pid,
+            returncode=self._proc.returncode,
+            started=started,
+            wall_time=wall_time,
+            cpu_user=cpu_user,
+            cpu_system=cpu_system,
+            peak_rss=self._peak_rss,
+            read_bytes=sum(usage.read_bytes for usage in usages),
+            write_bytes=sum(usage.write_bytes for usage in usages),
+            input_size=self._input_size,
+        )
+
+
+class MetricsSink:
+    """Write run metrics to JSON-lines and Prometheus textfile outputs"""
+
+    _INSTANCE: Optional['MetricsSink'] = None
+
+    def __init__(self, jsonl: Optional[Path], textfile: Optional[Path]):
+        self._jsonl = jsonl
+        self._textfile = textfile
+        self._totals: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def instance(cls, config) -> 'MetricsSink':
+        """Sink shared by all processors of this process"""
+        if cls._INSTANCE is None:
+            jsonl = config_value(config, 'datashark.processors.metrics.jsonl')
+            textfile = config_value(
+                config, 'datashark.processors.metrics.textfile'
+            )
+            cls._INSTANCE = cls(
+                Path(jsonl) if jsonl else None,
+                Path(textfile) if textfile else None,
+            )
+        return cls._INSTANCE
+
+    def _write_textfile(self):
+        lines = []
+        for name, kind in (
+            ('runs', 'counter'),
+            ('failures', 'counter'),
+            ('wall_seconds', 'counter'),
+            ('cpu_user_seconds', 'counter'),
+            ('cpu_system_seconds', 'counter'),
+            ('read_bytes', 'counter'),
+            ('write_bytes', 'counter'),
+            ('input_bytes', 'counter'),
+            ('peak_rss_bytes', 'gauge'),
+            ('throughput_mbps', 'gauge'),
+        ):
+            metric = f'datashark_linux_processor_{name}'
+            if kind == 'counter':
+                metric += '_total'
+            lines.append(f'# TYPE {metric} {kind}')
+            for tool, totals in sorted(self._totals.items()):
+                lines.append(f'{metric}{{tool="{tool}"}} {totals[name]}')
+        tmp = self._textfile.with_name(f'{self._textfile.name}.{getpid()}')
+        tmp.write_text('\n'.join(lines) + '\n')
+        tmp.replace(self._textfile)
+
+    def record(self, metrics: RunMetrics):
+        """Record metrics of a run"""
+        if self._jsonl:
+            with self._jsonl.open('a') as fobj:
+                fobj.write(dumps(metrics.as_dict()) + '\n')
+        if self._textfile:
+            totals = self._totals.setdefault(
+                metrics.tool,
+                {
+                    'runs': 0,
+                    'failures': 0,
+                    'wall_seconds': 0.0,
+                    'cpu_user_seconds': 0.0,
+                    'cpu_system_seconds': 0.0,
+                    'read_bytes': 0,
+                    'write_bytes': 0,
+                    'input_bytes': 0,
+                },
+            )
+            totals['runs'] += 1
+            totals['failures'] += int(metrics.returncode != 0)
+            totals['wall_seconds'] += metrics.wall_time
+            totals['cpu_user_seconds'] += metrics.cpu_user
+            totals['cpu_system_seconds'] += metrics.cpu_system
+            totals['read_bytes'] += metrics.read_bytes
+            totals['write_bytes'] += metrics.write_bytes
+            totals['input_bytes'] += metrics.input_size
+            totals['peak_rss_bytes'] = metrics.peak_rss
+            totals['throughput_mbps'] = metrics.throughput
+            self._write_textfile()
@@ -0,0 +1,123 @@
+"""Datashark Linux Processors Parallel Execution Helpers
+"""
+from typing import Any, Awaitable, Callable, Iterable, List, NamedTuple, Tuple
+from asyncio import Semaphore, ensure_future, gather
+
+
+class Window(NamedTuple):
+    """Region of an input owned by a shard
+
+    Shard scans [offset, stop) but only reports results starting in
+    [offset, end), the overlap lets it complete results crossing the end
+    of the owned region.
+    """
+
+    index: int
+    offset: int
+    length: int
+    overlap: int
+
+    @property
+    def end(self) -> int:
+        """End of the owned region"""
+        return self.offset + self.length
+
+    @property
+    def stop(self) -> int:
+        """End of the scanned region"""
+        return self.end + self.overlap
+
+    @property
+    def scan_length(self) -> int:
+        """Number of bytes to scan"""
+        return self.length + self.overlap
+
+    def owns(self, offset: int) -> bool:
+        """Determine if given absolute offset belongs to this window"""
+        return self.offset <= offset < self.end
+
+
+def _align_up(value: int, alignment: int) -> int:
+    return -(-value // alignment) * alignment
+
+
+def split_windows(
+    start: int,
+    length: int,
+    count: int,
+    overlap: int = 0,
+    alignment: int = 1,
+) -> List[Window]:
+    """Split [start, start + length) in at most count overlapping windows
+
+    Window offsets are aligned on alignment (relative to start) and the
+    last window overlap is clipped to the end of the region.
+    """
+    if length <= 0:
+        return []
+    step = _align_up(-(-length // max(1, count)), max(1, alignment))
+    stop = start + length
+    windows = []
+    for offset in range(start, stop, step):
+        owned = min(step, stop - offset)
+        windows.append(
+            Window(
+                index=len(windows),
+                offset=offset,
+                length=owned,
+                overlap=min(overlap, stop - offset - owned),
+            )
+        )
+    return windows
+
+
+async def bounded_gather(
+    factories: Iterable[Callable[[], Awaitable[Any]]], max_workers: int
+) -> List[Any]:
+    """Await coroutines created by factories, at most max_workers at once
+
+    Remaining tasks are cancelled as soon as one of them fails.
+    """
+    semaphore = Semaphore(max(1, max_workers))
+
+    async def _bounded(factory):
+        async with semaphore:
+            return await factory()
+
+    tasks = [ensure_future(_bounded(factory)) for factory in factories]
+    try:
+        return await gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+        raise
+
+
+def split_ranges(
+    ranges: List[Tuple[int, int]],
+    step: int,
+    overlap: int,
+    size: int,
+    alignment: int = 1,
+) -> List[Window]:
+    """Split (offset, length) ranges in windows of at most step bytes
+
+    Unlike split_windows, overlap may extend past the end of a range up
+    to size so that results crossing the range end are complete.
+    """
+    step = _align_up(max(1, step), max(1, alignment))
+    windows = []
+    for start, length in ranges:
+        stop = start + length
+        for offset in range(start, stop, step):
+            owned = min(step, stop - offset)
+            windows.append(
+                Window(
+                    index=len(windows),
+                    offset=offset,
+                    length=owned,
+                    overlap=max(0, min(overlap, size - offset - owned)),
+                )
+            )
+    return windows
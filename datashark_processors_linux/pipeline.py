@@ -0,0 +1,331 @@
+"""Datashark log2timeline.py and psort.py Pipeline Processor
+"""
+from json import dumps
+from time import monotonic
+from typing import Awaitable, Dict, List, NamedTuple
+from asyncio import gather, get_running_loop
+from pathlib import Path
+from functools import partial
+from datashark_core.meta import ProcessorMeta
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.processor import ProcessorError
+from datashark_core.model.api import Kind, ProcessorArgument
+from .log2timeline import Log2TimelineProcessor
+from .psort import PSortProcessor
+from .helper import get_value, make_argument, override, discard
+from .parallel import bounded_gather
+from .storage import read_manifest
+from .timeline import MERGEABLE_FORMATS, merge_exports
+
+NAME = 'linux_plaso_pipeline'
+LOGGER = LOGGING_MANAGER.get_logger(NAME)
+# psort arguments applying to every exported format
+PSORT_ARGUMENTS = [
+    'analysis',
+    'slice',
+    'slicer',
+    'slice_size',
+    'row_group_size',
+    'shards',
+    'start',
+    'end',
+    'index',
+    'filter',
+]
+
+
+class StageTiming(NamedTuple):
+    """Wall time and resources used by a pipeline stage"""
+
+    stage: str
+    wall_time: float
+    processes: int
+    cpu_user: float
+    cpu_system: float
+    read_bytes: int
+    write_bytes: int
+
+
+class PlasoPipelineProcessor(
+    Log2TimelineProcessor, PSortProcessor, metaclass=ProcessorMeta
+):
+    """Run log2timeline then psort on the resulting storage file"""
+
+    NAME = NAME
+    OUTPUTS = ['storage_file']
+    ARGUMENTS = (
+        Log2TimelineProcessor.ARGUMENTS
+        + [
+            spec
+            for spec in PSortProcessor.ARGUMENTS
+            if spec['name'] in PSORT_ARGUMENTS
+        ]
+        + [
+            {
+                'name': 'output_formats',
+                'kind': Kind.STR,
+                'value': 'l2tcsv',
+                'required': False,
+                'description': """
+                    Comma separated list of psort output formats, each format is exported by its own psort
+                    process as soon as extraction completes, all formats concurrently
+                """,
+            },
+            {
+                'name': 'output_directory',
+                'kind': Kind.PATH,
+                'required': True,
+                'description': """
+                    Write exports to <output_directory>/<storage file stem>.<output format> and stage timings to
+                    <output_directory>/<storage file stem>.timings.json
+                """,
+            },
+        ]
+    )
+    DESCRIPTION = """
+    Run log2timeline and export the storage file with psort
+    """
+
+    @property
+    def stage_timings(self) -> List[StageTiming]:
+        """Timings of the stages of the last run"""
+        return self.__dict__.setdefault('_stage_timings', [])
+
+    @staticmethod
+    def _output_formats(arguments: Dict[str, ProcessorArgument]) -> List[str]:
+        formats = []
+        expression = get_value(arguments, 'output_formats', 'l2tcsv')
+        for output_format in expression.split(','):
+            output_format = output_format.strip()
+            if output_format and output_format not in formats:
+                formats.append(output_format)
+        return formats
+
+    @staticmethod
+    def _output_file(
+        arguments: Dict[str, ProcessorArgument],
+        storage_file: Path,
+        output_format: str,
+    ) -> Path:
+        output_directory = Path(get_value(arguments, 'output_directory'))
+        return output_directory / f'{storage_file.stem}.{output_format}'
+
+    def _inputs(self, arguments: Dict[str, ProcessorArgument]) -> List[Path]:
+        """Source for extraction, storage file for exports"""
+        if get_value(arguments, 'source'):
+            return super()._inputs(arguments)
+        return [Path(get_value(arguments, 'storage_file'))]
+
+    def _outputs(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> Dict[str, Path]:
+        """Storage file and exports, fan out runs are not cacheable"""
+        outputs = super()._outputs(arguments)
+        if not outputs:
+            return {}
+        storage_file = Path(get_value(arguments, 'storage_file'))
+        for output_format in self._output_formats(arguments):
+            outputs[f'output_{output_format}'] = self._output_file(
+                arguments, storage_file, output_format
+            )
+        return outputs
+
+    async def _stage(self, stage: str, awaitable: Awaitable):
+        """Run a stage and record its timing"""
+        first = len(self.metrics)
+        start = monotonic()
+        try:
+            await awaitable
+        finally:
+            wall_time = monotonic() - start
+            # wait for metrics of the stage subprocesses
+            await gather(*self._monitors, return_exceptions=True)
+            metrics = self.metrics[first:]
+            timing = StageTiming(
+                stage=stage,
+                wall_time=wall_time,
+                processes=len(metrics),
+                cpu_user=sum(item.cpu_user for item in metrics),
+                cpu_system=sum(item.cpu_system for item in metrics),
+                read_bytes=sum(item.read_bytes for item in metrics),
+                write_bytes=sum(item.write_bytes for item in metrics),
+            )
+            self.stage_timings.append(timing)
+            LOGGER.info(
+                "%s stage took %.3fs (%d processes, %.3fs cpu)",
+                stage,
+                wall_time,
+                timing.processes,
+                timing.cpu_user + timing.cpu_system,
+            )
+
+    async def _export_storage_file(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        storage_file: Path,
+        output_format: str,
+        output_file: Path,
+    ):
+        """Export a storage file to a format using psort"""
+        checkpoint = self.checkpoint
+        if checkpoint:
+            if checkpoint.done(str(output_file)) and output_file.exists():
+                LOGGER.info("%s completed already", output_file)
+                return
+            # written by an interrupted run
+            output_file.unlink(missing_ok=True)
+        start = monotonic()
+        await PSortProcessor._process(
+            self,
+            override(
+                arguments,
+                make_argument('storage_file', Kind.PATH, storage_file),
+                make_argument('output_format', Kind.STR, output_format),
+                make_argument('output_file', Kind.PATH, output_file),
+            ),
+        )
+        LOGGER.info(
+            "%s exported to %s in %.3fs",
+            storage_file,
+            output_file,
+            monotonic() - start,
+        )
+        if checkpoint:
+            checkpoint.complete(str(output_file))
+
+    async def _export_format(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        storage_files: List[Path],
+        output_format: str,
+    ):
+        """Export storage files to a format
+
+        Exports of the storage files of a fan out or incremental run are
+        merged by timestamp when the format allows it.
+        """
+        storage_file = Path(get_value(arguments, 'storage_file'))
+        output_file = self._output_file(arguments, storage_file, output_format)
+        if storage_files == [storage_file]:
+            await self._export_storage_file(
+                arguments, storage_file, output_format, output_file
+            )
+            return
+        if output_format not in MERGEABLE_FORMATS:
+            LOGGER.warning(
+                "%s exports cannot be merged, one export per storage file",
+                output_format,
+            )
+            await gather(
+                *[
+                    self._export_storage_file(
+                        arguments,
+                        filepath,
+                        output_format,
+                        self._output_file(arguments, filepath, output_format),
+                    )
+                    for filepath in storage_files
+                ]
+            )
+            return
+        partial_files = [
+            output_file.with_name(f'{output_file.name}.part-{index:04d}')
+            for index in range(len(storage_files))
+        ]
+        checkpoint = self.checkpoint
+        try:
+            await gather(
+                *[
+                    self._export_storage_file(
+                        arguments, filepath, output_format, partial_file
+                    )
+                    for filepath, partial_file in zip(
+                        storage_files, partial_files
+                    )
+                ]
+            )
+            await get_running_loop().run_in_executor(
+                None, merge_exports, partial_files, output_file, output_format
+            )
+        except BaseException:
+            # completed exports are kept to resume the run
+            for filepath in partial_files:
+                if not checkpoint or not checkpoint.done(str(filepath)):
+                    filepath.unlink(missing_ok=True)
+            raise
+        for filepath in partial_files:
+            filepath.unlink(missing_ok=True)
+
+    @staticmethod
+    def _many_storage_files(arguments: Dict[str, ProcessorArgument]) -> bool:
+        """Determine if extraction may write several storage files"""
+        return get_value(arguments, 'fan_out', False) or get_value(
+            arguments, 'incremental', False
+        )
+
+    def _storage_files(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> List[Path]:
+        """Storage files written by the extraction stage of this run"""
+        storage_file = Path(get_value(arguments, 'storage_file'))
+        # a manifest left by an earlier run must not be exported
+        if self._many_storage_files(arguments):
+            return read_manifest(storage_file) or [storage_file]
+        return [storage_file]
+
+    async def _export_formats(self, arguments: Dict[str, ProcessorArgument]):
+        """Export storage file to all formats concurrently"""
+        storage_files = self._storage_files(arguments)
+        formats = self._output_formats(arguments)
+        # psort processes are bounded by the scheduler
+        await bounded_gather(
+            [
+                partial(
+                    self._export_format,
+                    arguments,
+                    storage_files,
+                    output_format,
+                )
+                for output_format in formats
+            ],
+            len(formats),
+        )
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Extract events then export them"""
+        if get_value(arguments, 'analysis') and self._many_storage_files(
+            arguments
+        ):
+            # plugins would only see the events of each storage file
+            raise ProcessorError(
+                "analysis cannot be combined with fan_out or incremental"
+            )
+        self.stage_timings.clear()
+        output_directory = Path(get_value(arguments, 'output_directory'))
+        output_directory.mkdir(parents=True, exist_ok=True)
+        storage_file = Path(get_value(arguments, 'storage_file'))
+        checkpoint = self.checkpoint
+        try:
+            if checkpoint and checkpoint.done(str(storage_file)):
+                LOGGER.info("%s extracted already", storage_file)
+            else:
+                await self._stage(
+                    'log2timeline',
+                    Log2TimelineProcessor._process(self, arguments),
+                )
+                if checkpoint:
+                    checkpoint.complete(str(storage_file))
+            await self._stage(
+                'psort',
+                self._export_formats(
+                    discard(arguments, *Log2TimelineProcessor.INPUTS)
+                ),
+            )
+        finally:
+            timings = output_directory / f'{storage_file.stem}.timings.json'
+            timings.write_text(
+                dumps(
+                    [timing._asdict() for timing in self.stage_timings],
+                    indent=2,
+                )
+            )
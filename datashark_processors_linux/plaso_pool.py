@@ -0,0 +1,291 @@
+"""Datashark Linux Processors Pre-warmed plaso Pool
+"""
+import sys
+from os import O_WRONLY, close, dup, getcwd, killpg, pipe
+from os import open as os_open
+from json import dumps, loads
+from time import monotonic
+from atexit import register
+from shutil import rmtree
+from signal import SIGKILL, SIGTERM
+from array import array
+from socket import AF_UNIX, SCM_RIGHTS, SOCK_STREAM, SOL_SOCKET, socket
+from typing import Any, Dict, List, Optional
+from asyncio import (
+    StreamReader,
+    StreamReaderProtocol,
+    ensure_future,
+    get_running_loop,
+    open_unix_connection,
+    shield,
+)
+from pathlib import Path
+from tempfile import mkdtemp
+from selectors import EVENT_READ, DefaultSelector
+from threading import Lock, Thread
+from subprocess import PIPE, Popen
+from datashark_core.logging import LOGGING_MANAGER
+from .helper import config_value
+
+LOGGER = LOGGING_MANAGER.get_logger('linux_plaso_pool')
+WORKER = Path(__file__).resolve().with_name('plaso_worker.py')
+
+
+def _interpreter(binary: Path) -> str:
+    """Interpreter of a plaso script according to its shebang"""
+    try:
+        with binary.open('rb') as fobj:
+            line = fobj.readline(4096).decode(errors='replace')
+    except OSError:
+        line = ''
+    if line.startswith('#!'):
+        command = line[2:].split()
+        # /usr/bin/env python3
+        if command and Path(command[0]).name == 'env':
+            command = command[1:]
+        if command:
+            return command[0]
+    return sys.executable
+
+
+class PooledProcess:
+    """Job of a plaso fork server, behaves like an asyncio Process"""
+
+    def __init__(
+        self,
+        pid: int,
+        reader,
+        writer,
+        stdout: Optional[StreamReader],
+        stderr: Optional[StreamReader],
+    ):
+        self.pid = pid
+        self.stdin = None
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+        self._reader = reader
+        self._writer = writer
+        self._exit = ensure_future(self._wait_exit())
+
+    async def _wait_exit(self) -> int:
+        try:
+            line = await self._reader.readline()
+        finally:
+            self._writer.close()
+        if line:
+            self.returncode = loads(line)['returncode']
+        else:
+            # server died, the job cannot be waited for anymore
+            self.kill()
+            self.returncode = -SIGKILL
+        return self.returncode
+
+    async def wait(self) -> int:
+        """Wait for job to exit and return its returncode"""
+        return await shield(self._exit)
+
+    def send_signal(self, signal: int):
+        """Send signal to job and the workers it started"""
+        try:
+            killpg(self.pid, signal)
+        except OSError:
+            pass
+
+    def terminate(self):
+        """Terminate job"""
+        self.send_signal(SIGTERM)
+
+    def kill(self):
+        """Kill job"""
+        self.send_signal(SIGKILL)
+
+
+class PlasoPool:
+    """Fork servers keeping plaso tools imported between jobs
+
+    There is one server per tool, each job runs in a fork of the server
+    so jobs are isolated from each other and concurrency is left to the
+    scheduler. Servers of all configured tools are started as soon as the
+    pool is created. A tool which server fails to start is not retried,
+    jobs fall back to one-shot subprocesses.
+    """
+
+    _INSTANCE: Optional['PlasoPool'] = None
+
+    def __init__(self, tools: List[str], start_timeout: float):
+        self._tools = tools
+        self._start_timeout = start_timeout
+        self._directory = Path(mkdtemp(prefix='datashark-plaso-'))
+        self._servers: Dict[str, Popen] = {}
+        self._failed = set()
+        self._locks = {tool: Lock() for tool in tools}
+        register(self.close)
+
+    @classmethod
+    def from_config(cls, config) -> Optional['PlasoPool']:
+        """Pool shared by all processors of this process, None if disabled"""
+        if not config_value(
+            config, 'datashark.processors.plaso_pool.enabled', False
+        ):
+            return None
+        if cls._INSTANCE is None:
+            cls._INSTANCE = cls(
+                config_value(
+                    config,
+                    'datashark.processors.plaso_pool.tools',
+                    ['log2timeline', 'psort'],
+                ),
+                config_value(
+                    config, 'datashark.processors.plaso_pool.start_timeout', 60
+                ),
+            )
+            for tool in cls._INSTANCE._tools:
+                binary = config_value(
+                    config, f'datashark.processors.{tool}.bin'
+                )
+                if binary:
+                    Thread(
+                        target=cls._INSTANCE._ensure,
+                        args=(tool, Path(binary)),
+                        daemon=True,
+                    ).start()
+        return cls._INSTANCE
+
+    def _socket(self, tool: str) -> Path:
+        return self._directory / f'{tool}.sock'
+
+    def _start_server(self, tool: str, binary: Path) -> Optional[Popen]:
+        """Start a fork server and wait until it is ready"""
+        path = self._socket(tool)
+        path.unlink(missing_ok=True)
+        with (self._directory / f'{tool}.log').open('ab') as log:
+            server = Popen(
+                [_interpreter(binary), str(WORKER), tool, str(path)],
+                stdin=PIPE,
+                stdout=PIPE,
+                stderr=log,
+            )
+        deadline = monotonic() + self._start_timeout
+        with DefaultSelector() as selector:
+            selector.register(server.stdout, EVENT_READ)
+            while selector.select(max(0, deadline - monotonic())):
+                line = server.stdout.readline()
+                if not line:
+                    break
+                if line == b'ready\n':
+                    LOGGER.info("plaso %s fork server started", tool)
+                    return server
+        server.kill()
+        server.wait()
+        LOGGER.warning(
+            "plaso %s fork server failed to start, see %s",
+            tool,
+            self._directory / f'{tool}.log',
+        )
+        return None
+
+    def _ensure(self, tool: str, binary: Path) -> Optional[Path]:
+        """Socket of a running server for tool, None if unavailable"""
+        lock = self._locks.get(tool)
+        if lock is None:
+            return None
+        with lock:
+            if tool in self._failed:
+                return None
+            server = self._servers.get(tool)
+            if server is None or server.poll() is not None:
+                server = self._start_server(tool, binary)
+                if server is None:
+                    self._failed.add(tool)
+                    return None
+                self._servers[tool] = server
+            return self._socket(tool)
+
+    @staticmethod
+    async def _reader(fd: int) -> StreamReader:
+        loop = get_running_loop()
+        reader = StreamReader(loop=loop)
+        await loop.connect_read_pipe(
+            lambda: StreamReaderProtocol(reader, loop=loop),
+            open(fd, 'rb', buffering=0),
+        )
+        return reader
+
+    async def start(
+        self,
+        tool: str,
+        binary: Path,
+        argv: List[str],
+        stdout: int = PIPE,
+        stderr: int = PIPE,
+        limits: Optional[Dict[str, Any]] = None,
+    ) -> Optional[PooledProcess]:
+        """Start a job, None if the server of tool is unavailable
+
+        Limits are applied by the job before running the tool, see
+        SpawnLimits.request.
+        """
+        if tool not in self._locks:
+            return None
+        loop = get_running_loop()
+        path = await loop.run_in_executor(None, self._ensure, tool, binary)
+        if path is None:
+            return None
+        # read ends of pipes, file descriptors passed to the job
+        pipes, fds = [], []
+        for mode in (stdout, stderr):
+            if mode == PIPE:
+                read_fd, write_fd = pipe()
+                pipes.append(read_fd)
+                fds.append(write_fd)
+            elif mode is not None and mode >= 0:
+                pipes.append(None)
+                fds.append(dup(mode))
+            else:
+                pipes.append(None)
+                fds.append(os_open('/dev/null', O_WRONLY))
+        sock = socket(AF_UNIX, SOCK_STREAM)
+        try:
+            sock.connect(str(path))
+            sock.sendmsg(
+                [
+                    dumps(
+                        {'argv': argv, 'cwd': getcwd(), 'limits': limits}
+                    ).encode()
+                ],
+                [(SOL_SOCKET, SCM_RIGHTS, array('i', fds))],
+            )
+            sock.setblocking(False)
+            reader, writer = await open_unix_connection(sock=sock)
+            line = await reader.readline()
+            if not line:
+                writer.close()
+        except OSError as exc:
+            sock.close()
+            LOGGER.warning("plaso %s fork server unavailable: %s", tool, exc)
+            line = b''
+        finally:
+            for fd in fds:
+                close(fd)
+        if not line:
+            for fd in pipes:
+                if fd is not None:
+                    close(fd)
+            return None
+        streams = [
+            await self._reader(fd) if fd is not None else None for fd in pipes
+        ]
+        return PooledProcess(loads(line)['pid'], reader, writer, *streams)
+
+    def close(self):
+        """Stop servers, running jobs are terminated"""
+        for server in self._servers.values():
+            if server.poll() is None:
+                server.stdin.close()
+                try:
+                    server.wait(5)
+                except Exception:  # pylint: disable=broad-except
+                    server.kill()
+        self._servers.clear()
+        rmtree(self._directory, ignore_errors=True)
@@ -0,0 +1,182 @@
+"""Datashark plaso fork server
+
+Imports a plaso tool once, then runs each job received on a unix socket
+in a fork of itself so that jobs skip interpreter startup and plaso
+imports. This script only depends on the standard library and plaso, it
+runs under the interpreter plaso is installed for.
+
+Usage: python plaso_worker.py TOOL SOCKET
+
+A job request is a JSON object holding argv, cwd and the scheduler
+limits the job applies to itself, sent along with the stdout and stderr
+file descriptors of the job. The server replies with a
+JSON line holding the pid of the job, then with a JSON line holding its
+returncode once it exits. The server exits when its stdin is closed.
+"""
+import os
+import sys
+import json
+import socket
+import traceback
+from array import array
+from signal import SIGTERM
+from importlib import import_module
+from selectors import EVENT_READ, DefaultSelector
+
+WARM_MODULES = ['plaso.parsers', 'plaso.output', 'plaso.analysis']
+MAX_REQUEST_SIZE = 1 << 20
+
+
+def _warm(tool: str):
+    """Import tool entrypoint and plugin registries"""
+    module = import_module(f'plaso.scripts.{tool}')
+    for name in WARM_MODULES:
+        try:
+            import_module(name)
+        except ImportError:
+            pass
+    return module
+
+
+def _limit(limits: dict):
+    """Apply scheduler limits to the job, best effort"""
+    try:
+        if limits.get('nice') is not None:
+            os.setpriority(os.PRIO_PROCESS, 0, limits['nice'])
+    except OSError:
+        pass
+    try:
+        if limits.get('ionice'):
+            command = [*limits['ionice'], '-p', str(os.getpid())]
+            os.waitpid(os.posix_spawn(command[0], command, os.environ), 0)
+    except OSError:
+        pass
+    try:
+        if limits.get('cgroup'):
+            path = os.path.join(limits['cgroup'], 'cgroup.procs')
+            with open(path, 'w') as fobj:
+                fobj.write('0')
+    except OSError:
+        pass
+
+
+def _run_job(tool: str, module, request: dict, fds: list):
+    """Run a job in a forked child, never returns"""
+    code = 1
+    try:
+        # job gets its own process group so that it can be killed along
+        # with the workers plaso starts
+        os.setpgid(0, 0)
+        _limit(request.get('limits') or {})
+        null = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        for fd in (null, *fds):
+            os.close(fd)
+        os.chdir(request['cwd'])
+        sys.argv = [f'{tool}.py', *request['argv']]
+        code = 0 if module.Main() else 1
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            code = exc.code or 0
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        os._exit(code)
+
+
+def _receive(conn: socket.socket):
+    """Receive a job request and its file descriptors"""
+    fds = array('i')
+    data, ancdata, _, _ = conn.recvmsg(
+        MAX_REQUEST_SIZE, socket.CMSG_LEN(2 * fds.itemsize)
+    )
+    for level, kind, payload in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            size = len(payload) - len(payload) % fds.itemsize
+            fds.frombytes(payload[:size])
+    return json.loads(data), list(fds)
+
+
+def _exitcode(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _reply(conn: socket.socket, **message):
+    try:
+        conn.sendall(json.dumps(message).encode() + b'\n')
+    except OSError:
+        pass
+
+
+def serve(tool: str, path: str):
+    """Serve jobs until stdin is closed"""
+    module = _warm(tool)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(64)
+    print('ready', flush=True)
+    selector = DefaultSelector()
+    selector.register(listener, EVENT_READ)
+    selector.register(sys.stdin, EVENT_READ)
+    jobs = {}
+    while True:
+        for key, _ in selector.select(timeout=0.05):
+            if key.fileobj is sys.stdin:
+                if not os.read(sys.stdin.fileno(), 4096):
+                    for pid in jobs:
+                        try:
+                            os.killpg(pid, SIGTERM)
+                        except OSError:
+                            pass
+                    return
+                continue
+            conn, _ = listener.accept()
+            conn.settimeout(5)
+            try:
+                request, fds = _receive(conn)
+            except (OSError, ValueError):
+                conn.close()
+                continue
+            if len(fds) != 2:
+                for fd in fds:
+                    os.close(fd)
+                conn.close()
+                continue
+            pid = os.fork()
+            if pid == 0:
+                selector.close()
+                listener.close()
+                conn.close()
+                _run_job(tool, module, request, fds)
+            try:
+                os.setpgid(pid, pid)
+            except OSError:
+                pass
+            for fd in fds:
+                os.close(fd)
+            jobs[pid] = conn
+            _reply(conn, pid=pid)
+        while jobs:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            conn = jobs.pop(pid, None)
+            if conn:
+                _reply(conn, returncode=_exitcode(status))
+                conn.close()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1], sys.argv[2])
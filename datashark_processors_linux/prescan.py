@@ -0,0 +1,112 @@
+"""Datashark Linux Processors Empty Region Pre-scan
+"""
+from json import dumps, loads
+from mmap import ACCESS_READ, mmap
+from typing import List, Tuple
+from pathlib import Path
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.filesystem import prepend_workdir
+from .cache import fingerprint
+from .helper import config_value, input_size
+
+LOGGER = LOGGING_MANAGER.get_logger('linux_prescan')
+BLOCK_SIZE = 65536
+MIN_GAP = 1048576
+# blocks checked at once before looking at individual blocks
+SUPERBLOCK_COUNT = 64
+
+Range = Tuple[int, int]
+
+
+def _uniform(data: bytes) -> bool:
+    """Determine if data is made of a single repeated byte"""
+    return data.count(data[:1]) == len(data)
+
+
+def _extend(ranges: List[Range], offset: int, length: int, min_gap: int):
+    """Append a range, merging it with the previous one if close enough"""
+    if ranges:
+        start, previous = ranges[-1]
+        if offset - (start + previous) <= min_gap:
+            ranges[-1] = (start, offset + length - start)
+            return
+    ranges.append((offset, length))
+
+
+def populated_ranges(
+    filepath: Path, block_size: int = BLOCK_SIZE, min_gap: int = MIN_GAP
+) -> List[Range]:
+    """List (offset, length) ranges of filepath which are not uniform
+
+    Blocks filled with a single byte value (zeroed or erased regions) are
+    skipped, ranges separated by at most min_gap bytes are merged.
+    """
+    size = input_size(filepath)
+    ranges = []
+    if not size:
+        return ranges
+    zero = bytes(block_size * SUPERBLOCK_COUNT)
+    with filepath.open('rb') as fobj, mmap(
+        fobj.fileno(), size, access=ACCESS_READ
+    ) as view:
+        offset = 0
+        while offset < size:
+            data = view[offset : offset + len(zero)]
+            if data == zero[: len(data)] or _uniform(data):
+                offset += len(data)
+                continue
+            for index in range(0, len(data), block_size):
+                block = data[index : index + block_size]
+                if not _uniform(block):
+                    _extend(ranges, offset + index, len(block), min_gap)
+            offset += len(data)
+    return ranges
+
+
+def clip_ranges(
+    ranges: List[Range], start: int, stop: int, alignment: int = 1
+) -> List[Range]:
+    """Restrict ranges to [start, stop), range offsets are aligned down"""
+    clipped = []
+    for offset, length in ranges:
+        begin = max(offset, start)
+        begin -= (begin - start) % alignment
+        end = min(offset + length, stop)
+        if begin < end:
+            clipped.append((begin, end - begin))
+    return clipped
+
+
+def prescan(config, filepath: Path) -> List[Range]:
+    """Populated ranges of filepath, cached in a sidecar index"""
+    block_size = config_value(
+        config, 'datashark.processors.prescan.block_size', BLOCK_SIZE
+    )
+    min_gap = config_value(
+        config, 'datashark.processors.prescan.min_gap', MIN_GAP
+    )
+    index = prepend_workdir(config, 'prescan') / (
+        f'{fingerprint(filepath)}-{block_size}-{min_gap}.json'
+    )
+    if index.is_file():
+        return [tuple(item) for item in loads(index.read_text())['ranges']]
+    ranges = populated_ranges(filepath, block_size, min_gap)
+    index.parent.mkdir(parents=True, exist_ok=True)
+    tmp = index.with_name(f'{index.name}.tmp')
+    tmp.write_text(
+        dumps(
+            {
+                'filepath': str(filepath),
+                'size': input_size(filepath),
+                'ranges': ranges,
+            }
+        )
+    )
+    tmp.replace(index)
+    LOGGER.info(
+        "pre-scan of %s kept %d bytes in %d ranges",
+        filepath,
+        sum(length for _, length in ranges),
+        len(ranges),
+    )
+    return ranges
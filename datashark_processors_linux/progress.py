@@ -0,0 +1,180 @@
+"""Datashark Linux Processors Progress Tracking
+"""
+from re import compile as re_compile
+from time import monotonic, time
+from typing import Callable, List, NamedTuple, Optional, Tuple
+from asyncio import StreamReader
+from pathlib import Path
+from collections import deque
+
+PROC = Path('/proc')
+READ_SIZE = 65536
+# longer lines are truncated, progress bars may never end a line
+MAX_LINE_LENGTH = 4096
+LINE_SEPARATOR = re_compile(rb'[\r\n]')
+PLASO_STATUS_PATTERN = re_compile(
+    r'^(\S+) \(PID: (\d+)\) status: ([^,]+), '
+    r'(?:event data|events) (?:produced|consumed): (\d+)'
+)
+
+# parsers return (done, total, unit) or None when line is not progress
+Progress = Tuple[int, Optional[int], str]
+ProgressParser = Callable[[str, int], Optional[Progress]]
+
+
+class ProgressEvent(NamedTuple):
+    """Progress of a tool subprocess"""
+
+    tool: str
+    pid: int
+    timestamp: float
+    done: int
+    total: Optional[int]
+    unit: str
+    rate: float
+    eta: Optional[float]
+    stalled: bool
+    message: str
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Completed fraction, None if total is unknown"""
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+
+def parse_plaso_status(line: str, pid: int) -> Optional[Progress]:
+    """Parse plaso linear status view line of the main process"""
+    match = PLASO_STATUS_PATTERN.match(line)
+    # worker lines report their own share of the events
+    if not match or int(match.group(2)) != pid:
+        return None
+    return int(match.group(4)), None, 'events'
+
+
+def read_chars(pid: int) -> Optional[int]:
+    """Number of bytes read by a process according to procfs"""
+    try:
+        for line in (PROC / str(pid) / 'io').read_text().splitlines():
+            name, _, value = line.partition(':')
+            if name == 'rchar':
+                return int(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+async def read_lines(stream: StreamReader, callback: Callable[[str], None]):
+    """Call callback with each line of stream until end of file
+
+    Both carriage returns and line feeds end a line so that progress
+    updates rewriting the same terminal line are seen as they come.
+    """
+    pending = b''
+    while True:
+        data = await stream.read(READ_SIZE)
+        if not data:
+            break
+        parts = LINE_SEPARATOR.split(pending + data)
+        pending = parts.pop()[:MAX_LINE_LENGTH]
+        for part in parts:
+            if part:
+                callback(part[:MAX_LINE_LENGTH].decode(errors='replace'))
+    if pending:
+        callback(pending.decode(errors='replace'))
+
+
+class ProgressTracker:
+    """Turn output lines and read counters of a subprocess into events
+
+    Output lines are parsed by the tool parser when there is one, bytes
+    read by the process are used otherwise. Last lines are kept in a
+    bounded buffer to give context to errors.
+    """
+
+    def __init__(
+        self,
+        tool: str,
+        pid: int,
+        total: Optional[int],
+        parser: Optional[ProgressParser],
+        emit: Callable[[ProgressEvent], None],
+        context_lines: int = 50,
+    ):
+        self._tool = tool
+        self._pid = pid
+        self._total = total
+        self._parser = parser
+        self._emit = emit
+        self._context = deque(maxlen=context_lines)
+        self._start = monotonic()
+        self._changed = self._start
+        self._done = 0
+        self._unit = 'bytes'
+        self._parsed = False
+        self._stalled = False
+        self._message = ''
+
+    @property
+    def context(self) -> List[str]:
+        """Last output lines"""
+        return list(self._context)
+
+    def _update(self, done: int, total: Optional[int], unit: str):
+        now = monotonic()
+        if done != self._done:
+            self._changed = now
+            self._stalled = False
+        if total or unit != self._unit:
+            self._total = total
+        self._done, self._unit = done, unit
+        self._send(now)
+
+    def _send(self, now: float):
+        elapsed = now - self._start
+        rate = self._done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self._total and rate > 0:
+            eta = max(0.0, (self._total - self._done) / rate)
+        self._emit(
+            ProgressEvent(
+                tool=self._tool,
+                pid=self._pid,
+                timestamp=time(),
+                done=self._done,
+                total=self._total,
+                unit=self._unit,
+                rate=rate,
+                eta=eta,
+                stalled=self._stalled,
+                message=self._message,
+            )
+        )
+
+    def feed(self, line: str):
+        """Handle an output line"""
+        progress = self._parser(line, self._pid) if self._parser else None
+        if progress:
+            self._parsed = True
+            self._update(*progress)
+            return
+        self._context.append(line)
+        self._message = line
+
+    def sample(self, stall_timeout: Optional[float]) -> bool:
+        """Sample read counter and detect stalls, True if just stalled"""
+        if not self._parsed:
+            done = read_chars(self._pid)
+            if done is not None:
+                self._update(done, None, 'bytes')
+        now = monotonic()
+        if (
+            stall_timeout
+            and not self._stalled
+            and now - self._changed > stall_timeout
+        ):
+            self._stalled = True
+            self._send(now)
+            return True
+        return False
@@ -1,23 +1,85 @@
 """Datashark psort.py Processor
 """
-from typing import Dict
-from asyncio.subprocess import PIPE, DEVNULL
+from os import close, cpu_count, pipe
+from typing import Dict, Optional, Tuple
+from asyncio import gather, get_running_loop
+from pathlib import Path
+from datetime import timedelta
+from functools import partial
+from asyncio.subprocess import PIPE
 from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
-from datashark_core.datetime import now
-from datashark_core.processor import ProcessorInterface
+from datashark_core.processor import ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
-from datashark_core.filesystem import prepend_workdir, ensure_parent_dir
+from .interface import INPUT_LENGTH, LinuxProcessorInterface
+from .batch import BatchMixin, batch_arguments
+from .progress import parse_plaso_status
+from .scheduler import ResourceProfile
+from .helper import (
+    get_value,
+    make_argument,
+    override,
+    discard,
+    inputs_size,
+)
+from .parallel import Window, split_windows, bounded_gather
+from .timeline_index import TimelineIndexRegistry, parse_filter
+from .columnar import (
+    PARQUET_FORMAT,
+    parquet_available,
+    json_lines_to_parquet,
+)
+from .timeline import (
+    MERGEABLE_FORMATS,
+    EPOCH,
+    merge_exports,
+    parse_datetime,
+    to_microseconds,
+)
 
 NAME = 'linux_psort'
+BATCH_NAME = 'linux_psort_batch'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
+OPTIONS = [
+    # optional
+    ('analysis', '--analysis'),
+    ('slice', '--slice'),
+    ('slicer', '--slicer'),
+    ('slice_size', '--slice-size'),
+    ('output_format', '--output-format'),
+    ('output_file', '--write'),
+    # positional
+    ('storage_file', None),
+    ('filter', None),
+]
 
 
-class PSortProcessor(ProcessorInterface, metaclass=ProcessorMeta):
+def _format_datetime(microseconds: int) -> str:
+    value = EPOCH + timedelta(microseconds=microseconds)
+    return value.replace(tzinfo=None).isoformat()
+
+
+def window_filter(window: Window, event_filter: Optional[str]) -> str:
+    """Restrict event filter to the time window"""
+    time_filter = (
+        f"date >= DATETIME('{_format_datetime(window.offset)}') and "
+        f"date < DATETIME('{_format_datetime(window.end)}')"
+    )
+    if not event_filter:
+        return time_filter
+    return f"({event_filter}) and {time_filter}"
+
+
+class PSortProcessor(LinuxProcessorInterface, metaclass=ProcessorMeta):
     """Wraps psort.py"""
 
     NAME = NAME
     SYSTEM = System.LINUX
+    BIN_KEY = 'datashark.processors.psort.bin'
+    INPUTS = ['storage_file']
+    OUTPUTS = ['output_file']
+    RESOURCE_PROFILE = ResourceProfile.CPU_BOUND
+    PROGRESS_PARSER = staticmethod(parse_plaso_status)
     ARGUMENTS = [
         {
             'name': 'analysis',
@@ -63,7 +125,19 @@ class PSortProcessor(ProcessorInterface, metaclass=ProcessorMeta):
             'kind': Kind.STR,
             'value': 'l2tcsv',
             'required': False,
-            'description': "The output format",
+            'description': """
+                The output format. parquet converts json_line output on the fly to a Parquet file with typed
+                timestamps, dictionary-encoded strings and row groups which never span two days (requires pyarrow)
+            """,
+        },
+        {
+            'name': 'row_group_size',
+            'kind': Kind.INT,
+            'value': '65536',
+            'required': False,
+            'description': """
+                Maximum number of events per Parquet row group, bounds the memory used by the parquet converter
+            """,
         },
         {
             'name': 'output_file',
@@ -77,6 +151,56 @@ class PSortProcessor(ProcessorInterface, metaclass=ProcessorMeta):
             'required': True,
             'description': "Path to a storage file",
         },
+        {
+            'name': 'shards',
+            'kind': Kind.INT,
+            'value': '1',
+            'required': False,
+            'description': """
+                Split the time range in this many windows exported by concurrent psort processes and merged by
+                timestamp into output_file. The time range is given by start and end or by slice and slice_size.
+                Only l2tcsv, dynamic and json_line output formats can be sharded, runs with analysis or slicer are
+                not sharded
+            """,
+        },
+        {
+            'name': 'start',
+            'kind': Kind.STR,
+            'required': False,
+            'description': """
+                Start of the time range to export along with end, in ISO 8601 format, for example:
+                2020-06-19T20:09:23+02:00
+            """,
+        },
+        {
+            'name': 'end',
+            'kind': Kind.STR,
+            'required': False,
+            'description': """
+                End of the time range to export (excluded) along with start, in ISO 8601 format
+            """,
+        },
+        {
+            'name': 'max_workers',
+            'kind': Kind.INT,
+            'required': False,
+            'description': """
+                Maximum number of concurrent psort processes when shards is greater than 1, defaults to the number
+                of cores
+            """,
+        },
+        {
+            'name': 'index',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Export the whole storage file once to the workdir and index it by time and by parser, source type
+                and hostname. Later slice, start and end requests and filters made of field equalities (parser,
+                hostname, data_type for json_line) and date bounds are answered from the indexed export instead of
+                running psort again. Ignored with analysis, slicer and parquet output
+            """,
+        },
         {
             'name': 'filter',
             'kind': Kind.STR,
@@ -92,30 +216,283 @@ class PSortProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Run psort with given arguments
     """
 
-    async def _run(self, arguments: Dict[str, ProcessorArgument]):
-        """Process a file using psort.py"""
-        timestamp = now('%Y%m%dT%H%M%S')
-        logpath = prepend_workdir(
-            self.config, f'logs/psort-{timestamp}.log.gz'
-        )
-        ensure_parent_dir(logpath)
+    async def _export(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        tag: str = '',
+        stdout: int = PIPE,
+    ):
+        """Run a single psort process
+
+        Status is read from stdout unless stdout receives events.
+        """
+        logpath = self._log_path('psort', tag)
         proc = await self._start_subprocess(
-            'datashark.processors.psort.bin',
-            ['-q', '-u', '--log-file', str(logpath)],
+            # the pipeline processor inherits the log2timeline BIN_KEY
+            PSortProcessor.BIN_KEY,
             [
-                # optional
-                ('analysis', '--analysis'),
-                ('slice', '--slice'),
-                ('slicer', '--slicer'),
-                ('slice_size', '--slice-size'),
-                ('output_format', '--output-format'),
-                ('output_file', '--write'),
-                # positional
-                ('storage_file', None),
-                ('filter', None),
+                '-q',
+                '-u',
+                '--status_view',
+                'linear' if stdout == PIPE else 'none',
+                '--log-file',
+                str(logpath),
             ],
+            OPTIONS,
             arguments,
-            stdout=DEVNULL,
+            stdout=stdout,
             stderr=PIPE,
         )
         await self._handle_communicating_process(proc)
+
+    @staticmethod
+    def _convert(read_fd: int, output_file: Path, row_group_size: int) -> int:
+        """Convert json_line events read from a pipe to Parquet"""
+        # closing the pipe early makes psort fail instead of blocking
+        with open(read_fd, 'r', encoding='utf-8', errors='replace') as fobj:
+            return json_lines_to_parquet(fobj, output_file, row_group_size)
+
+    async def _export_parquet(self, arguments: Dict[str, ProcessorArgument]):
+        """Stream json_line events from psort stdout into a Parquet file"""
+        if not parquet_available():
+            raise ProcessorError(
+                "parquet output format requires pyarrow (parquet extra)"
+            )
+        output_file = Path(get_value(arguments, 'output_file'))
+        read_fd, write_fd = pipe()
+        converter = get_running_loop().run_in_executor(
+            None,
+            self._convert,
+            read_fd,
+            output_file,
+            get_value(arguments, 'row_group_size', 65536),
+        )
+        try:
+            await self._export(
+                override(
+                    discard(arguments, 'output_file'),
+                    make_argument('output_format', Kind.STR, 'json_line'),
+                ),
+                stdout=write_fd,
+            )
+        except BaseException:
+            close(write_fd)
+            await gather(converter, return_exceptions=True)
+            raise
+        close(write_fd)
+        count = await converter
+        LOGGER.info("%d events written to %s", count, output_file)
+
+    @staticmethod
+    def _time_range(
+        arguments: Dict[str, ProcessorArgument]
+    ) -> Optional[Tuple[int, int]]:
+        """Time range to shard in microseconds since epoch"""
+        start = get_value(arguments, 'start')
+        end = get_value(arguments, 'end')
+        if start and end:
+            return (
+                to_microseconds(parse_datetime(start)),
+                to_microseconds(parse_datetime(end)),
+            )
+        center = get_value(arguments, 'slice')
+        if center:
+            center = to_microseconds(parse_datetime(center))
+            size = get_value(arguments, 'slice_size') or 5
+            size *= 60 * 1000000
+            return center - size, center + size
+        return None
+
+    async def _export_window(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        window: Window,
+        output_file: Path,
+    ):
+        """Export events of a time window"""
+        checkpoint = self.checkpoint
+        if checkpoint:
+            if checkpoint.done(str(output_file)) and output_file.exists():
+                return
+            # written by an interrupted run
+            output_file.unlink(missing_ok=True)
+        await self._export(
+            override(
+                discard(arguments, 'slice', 'slice_size'),
+                make_argument(
+                    'filter',
+                    Kind.STR,
+                    window_filter(window, get_value(arguments, 'filter')),
+                ),
+                make_argument('output_file', Kind.PATH, output_file),
+            ),
+            f'shard-{window.index:04d}',
+        )
+        if checkpoint:
+            checkpoint.complete(str(output_file))
+
+    async def _export_sharded(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        shards: int,
+        time_range: Tuple[int, int],
+    ):
+        """Export time windows concurrently and merge them by timestamp"""
+        start, end = time_range
+        windows = split_windows(start, end - start, shards)
+        output_file = Path(get_value(arguments, 'output_file'))
+        partial_files = [
+            output_file.with_name(
+                f'{output_file.name}.shard-{window.index:04d}'
+            )
+            for window in windows
+        ]
+        # every window reads the storage file, metrics are given a share
+        # proportional to the window duration
+        size = inputs_size(self._inputs(arguments))
+        checkpoint = self.checkpoint
+        try:
+            await bounded_gather(
+                [
+                    partial(
+                        self._export_window,
+                        override(
+                            arguments,
+                            make_argument(
+                                INPUT_LENGTH,
+                                Kind.INT,
+                                size * window.length // (end - start),
+                            ),
+                        ),
+                        window,
+                        filepath,
+                    )
+                    for window, filepath in zip(windows, partial_files)
+                ],
+                get_value(arguments, 'max_workers') or cpu_count() or 1,
+            )
+            merge_exports(
+                partial_files,
+                output_file,
+                get_value(arguments, 'output_format'),
+            )
+        except BaseException:
+            # completed windows are kept to resume the export
+            for filepath in partial_files:
+                if not checkpoint or not checkpoint.done(str(filepath)):
+                    filepath.unlink(missing_ok=True)
+            raise
+        for filepath in partial_files:
+            filepath.unlink(missing_ok=True)
+
+    async def _export_indexed(
+        self, arguments: Dict[str, ProcessorArgument]
+    ) -> bool:
+        """Answer request from an indexed export, False if it cannot be"""
+        output_format = get_value(arguments, 'output_format')
+        if (
+            output_format not in MERGEABLE_FORMATS
+            or get_value(arguments, 'analysis')
+            or get_value(arguments, 'slicer')
+        ):
+            return False
+        query = parse_filter(get_value(arguments, 'filter'), output_format)
+        if query is None:
+            LOGGER.info("filter cannot be answered from index")
+            return False
+        time_range = self._time_range(arguments)
+        if time_range:
+            query = query.restrict(*time_range)
+        storage_file = Path(get_value(arguments, 'storage_file'))
+        registry = TimelineIndexRegistry.from_config(self.config)
+        loop = get_running_loop()
+        index, export = await loop.run_in_executor(
+            None, registry.lookup, storage_file, output_format
+        )
+        if index is None:
+            export.parent.mkdir(parents=True, exist_ok=True)
+            export.unlink(missing_ok=True)
+            await self._export(
+                override(
+                    discard(arguments, 'slice', 'slice_size', 'filter'),
+                    make_argument('output_file', Kind.PATH, export),
+                ),
+                'index',
+            )
+            index = await loop.run_in_executor(
+                None, registry.register, storage_file, output_format, export
+            )
+        if not set(query.fields) <= set(index.fields):
+            LOGGER.info("filtered fields are not part of the export")
+            return False
+        output_file = Path(get_value(arguments, 'output_file'))
+        count = await loop.run_in_executor(
+            None, index.query, query, output_file
+        )
+        LOGGER.info("%d events read from indexed export", count)
+        return True
+
+    @staticmethod
+    def _restrict(
+        arguments: Dict[str, ProcessorArgument]
+    ) -> Dict[str, ProcessorArgument]:
+        """Restrict filter to start and end, psort handles slice itself"""
+        start = get_value(arguments, 'start')
+        end = get_value(arguments, 'end')
+        if not (start and end):
+            return arguments
+        start = to_microseconds(parse_datetime(start))
+        end = to_microseconds(parse_datetime(end))
+        return override(
+            arguments,
+            make_argument(
+                'filter',
+                Kind.STR,
+                window_filter(
+                    Window(0, start, end - start, 0),
+                    get_value(arguments, 'filter'),
+                ),
+            ),
+        )
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Process a file using psort.py"""
+        if get_value(arguments, 'index', False):
+            if await self._export_indexed(arguments):
+                return
+        if get_value(arguments, 'output_format') == PARQUET_FORMAT:
+            if get_value(arguments, 'shards', 1) > 1:
+                LOGGER.warning("%s output cannot be sharded", PARQUET_FORMAT)
+            await self._export_parquet(self._restrict(arguments))
+            return
+        shards = get_value(arguments, 'shards', 1)
+        if shards > 1:
+            time_range = self._time_range(arguments)
+            output_format = get_value(arguments, 'output_format')
+            if get_value(arguments, 'slicer'):
+                LOGGER.warning("slicer cannot be sharded")
+            elif get_value(arguments, 'analysis'):
+                # plugins would run on each window and report partial results
+                LOGGER.warning("analysis cannot be sharded")
+            elif output_format not in MERGEABLE_FORMATS:
+                LOGGER.warning("%s output cannot be sharded", output_format)
+            elif not time_range:
+                LOGGER.warning("sharding requires start and end or slice")
+            else:
+                await self._export_sharded(arguments, shards, time_range)
+                return
+        await self._export(self._restrict(arguments))
+
+
+class PSortBatchProcessor(BatchMixin, PSortProcessor):
+    """Run psort on many storage files"""
+
+    NAME = BATCH_NAME
+    BATCH_INPUT = 'storage_file'
+    BATCH_OUTPUTS = {'output_file': 'timeline'}
+    ARGUMENTS = batch_arguments(
+        PSortProcessor.ARGUMENTS, BATCH_INPUT, list(BATCH_OUTPUTS)
+    )
+    DESCRIPTION = """
+    Run psort on many storage files listed in a manifest
+    """
@@ -0,0 +1,228 @@
+"""Datashark Linux Processors Subprocess Scheduler
+"""
+from os import (
+    PRIO_PROCESS,
+    cpu_count,
+    environ,
+    getpid,
+    posix_spawn,
+    setpriority,
+    waitpid,
+)
+from enum import Enum
+from shutil import which
+from itertools import count
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+from asyncio import Semaphore, Task, ensure_future
+from pathlib import Path
+from asyncio.subprocess import Process
+from datashark_core.logging import LOGGING_MANAGER
+from .helper import config_value
+
+LOGGER = LOGGING_MANAGER.get_logger('linux_scheduler')
+
+
+class ResourceProfile(Enum):
+    """Main resource consumed by a tool"""
+
+    IO_BOUND = 'io'
+    CPU_BOUND = 'cpu'
+
+
+def _remove_cgroup(cgroup: Optional[Path]):
+    if cgroup:
+        try:
+            cgroup.rmdir()
+        except OSError:
+            pass
+
+
+class SpawnLimits(NamedTuple):
+    """Limits a subprocess applies to itself before exec
+
+    Processes started by the tool inherit the limits.
+    """
+
+    nice: Optional[int]
+    # ionice command line without the process to apply it to
+    ionice: List[str]
+    cgroup: Optional[Path]
+
+    @property
+    def enabled(self) -> bool:
+        """Determine if there is a limit to apply"""
+        return self.nice is not None or bool(self.ionice) or bool(self.cgroup)
+
+    def apply(self):
+        """Apply limits to the calling process, best effort
+
+        Runs in the forked child where failures cannot be logged.
+        """
+        try:
+            if self.nice is not None:
+                setpriority(PRIO_PROCESS, 0, self.nice)
+        except OSError:
+            pass
+        try:
+            if self.ionice:
+                pid = posix_spawn(
+                    self.ionice[0],
+                    [*self.ionice, '-p', str(getpid())],
+                    environ,
+                )
+                waitpid(pid, 0)
+        except OSError:
+            pass
+        try:
+            if self.cgroup:
+                # 0 moves the writing process
+                (self.cgroup / 'cgroup.procs').write_text('0')
+        except OSError:
+            pass
+
+    def request(self) -> Dict[str, Any]:
+        """Limits as a plaso pool job request member"""
+        return {
+            'nice': self.nice,
+            'ionice': self.ionice,
+            'cgroup': str(self.cgroup) if self.cgroup else None,
+        }
+
+    def discard(self):
+        """Remove the cgroup of a subprocess which did not start"""
+        _remove_cgroup(self.cgroup)
+
+
+class Scheduler:
+    """Limit concurrent subprocesses and the resources they can use
+
+    Slots are acquired in a fixed order (tool, device, global) so that
+    concurrent acquisitions cannot deadlock.
+    """
+
+    _INSTANCE: Optional['Scheduler'] = None
+
+    def __init__(self, settings: Dict[str, Any]):
+        self._settings = settings
+        self._global = Semaphore(settings.get('max_processes') or cpu_count())
+        self._tools: Dict[str, Semaphore] = {}
+        self._devices: Dict[int, Semaphore] = {}
+        self._watchers: Set[Task] = set()
+        self._cgroups = count()
+
+    @classmethod
+    def instance(cls, config) -> 'Scheduler':
+        """Scheduler shared by all processors of this process"""
+        if cls._INSTANCE is None:
+            cls._INSTANCE = cls(
+                config_value(config, 'datashark.processors.scheduler', {})
+            )
+        return cls._INSTANCE
+
+    def _tool_semaphore(self, tool: str) -> Optional[Semaphore]:
+        limit = (self._settings.get('tools') or {}).get(tool)
+        if not limit:
+            return None
+        if tool not in self._tools:
+            self._tools[tool] = Semaphore(limit)
+        return self._tools[tool]
+
+    def _device_semaphore(self, device: Optional[int]) -> Optional[Semaphore]:
+        slots = self._settings.get('io_slots_per_device')
+        if device is None or not slots:
+            return None
+        if device not in self._devices:
+            self._devices[device] = Semaphore(slots)
+        return self._devices[device]
+
+    async def acquire(
+        self,
+        tool: str,
+        profile: ResourceProfile,
+        inputs: List[Path],
+    ) -> Callable[[], None]:
+        """Wait for slots allowing to start a subprocess
+
+        Returns a callable releasing acquired slots.
+        """
+        device = None
+        if profile == ResourceProfile.IO_BOUND:
+            for filepath in inputs:
+                if filepath.exists():
+                    device = filepath.stat().st_dev
+                    break
+        semaphores = [
+            semaphore
+            for semaphore in (
+                self._tool_semaphore(tool),
+                self._device_semaphore(device),
+                self._global,
+            )
+            if semaphore is not None
+        ]
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            raise
+
+        def _release():
+            for semaphore in acquired:
+                semaphore.release()
+
+        return _release
+
+    def _cgroup(self, tool: str, limits: Dict[str, Any]) -> Optional[Path]:
+        """Create a cgroup v2 applying cpu and memory limits"""
+        root = self._settings.get('cgroup')
+        if not root or not (limits.get('cpu_max') or limits.get('memory_max')):
+            return None
+        cgroup = Path(root) / f'{tool}-{getpid()}-{next(self._cgroups)}'
+        try:
+            cgroup.mkdir(parents=True, exist_ok=True)
+            if limits.get('cpu_max'):
+                (cgroup / 'cpu.max').write_text(str(limits['cpu_max']))
+            if limits.get('memory_max'):
+                (cgroup / 'memory.max').write_text(str(limits['memory_max']))
+        except OSError as exc:
+            LOGGER.warning("cannot apply cgroup limits to %s: %s", tool, exc)
+            _remove_cgroup(cgroup)
+            return None
+        return cgroup
+
+    def prepare(self, tool: str, profile: ResourceProfile) -> SpawnLimits:
+        """Limits of profile, applied by the subprocess before exec"""
+        limits = (self._settings.get('profiles') or {}).get(
+            profile.value
+        ) or {}
+        ionice = []
+        if limits.get('ionice_class') is not None and which('ionice'):
+            ionice = [which('ionice'), '-c', str(limits['ionice_class'])]
+            if limits.get('ionice_level') is not None:
+                ionice += ['-n', str(limits['ionice_level'])]
+        return SpawnLimits(
+            limits.get('nice'), ionice, self._cgroup(tool, limits)
+        )
+
+    def watch(
+        self,
+        proc: Process,
+        release: Callable[[], None],
+        limits: SpawnLimits,
+    ):
+        """Release slots and remove cgroup once the process exits"""
+
+        async def _watch():
+            try:
+                await proc.wait()
+            finally:
+                release()
+                _remove_cgroup(limits.cgroup)
+
+        watcher = ensure_future(_watch())
+        self._watchers.add(watcher)
+        watcher.add_done_callback(self._watchers.discard)
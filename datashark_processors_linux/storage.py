@@ -0,0 +1,66 @@
+"""Datashark Linux Processors Plaso Storage Helpers
+"""
+from json import dumps, loads
+from typing import List, Optional
+from pathlib import Path
+
+
+def range_expression(expression: str) -> Optional[List[int]]:
+    """Expand a plaso range expression such as "1,3..5"
+
+    Returns None for "all" which cannot be expanded without inspecting
+    the source.
+    """
+    expression = expression.strip().lower()
+    if expression == 'all':
+        return None
+    indices = []
+    for item in expression.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        first, sep, last = item.partition('..')
+        if not sep:
+            last = first
+        for index in range(int(first), int(last) + 1):
+            if index not in indices:
+                indices.append(index)
+    return indices
+
+
+def shard_storage_file(storage_file: Path, tag: str) -> Path:
+    """Storage file of a shard identified by tag"""
+    return storage_file.with_name(
+        f'{storage_file.stem}.{tag}{storage_file.suffix}'
+    )
+
+
+def manifest_path(storage_file: Path) -> Path:
+    """Path of the manifest listing storage files sharing a storage path"""
+    return storage_file.with_name(f'{storage_file.name}.shards.json')
+
+
+def read_manifest(storage_file: Path) -> List[Path]:
+    """Read storage files listed in manifest, empty if there is none"""
+    manifest = manifest_path(storage_file)
+    if not manifest.is_file():
+        return []
+    return [
+        Path(filepath)
+        for filepath in loads(manifest.read_text())['storage_files']
+    ]
+
+
+def write_manifest(storage_file: Path, storage_files: List[Path]):
+    """Write the manifest listing storage files to merge"""
+    manifest_path(storage_file).write_text(
+        dumps(
+            {'storage_files': [str(filepath) for filepath in storage_files]},
+            indent=2,
+        )
+    )
+
+
+def remove_manifest(storage_file: Path):
+    """Remove the manifest left by an earlier sharded run"""
+    manifest_path(storage_file).unlink(missing_ok=True)
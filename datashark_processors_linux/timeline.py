@@ -0,0 +1,153 @@
+"""Datashark Linux Processors Timeline Export Helpers
+"""
+from json import loads
+from heapq import merge
+from operator import itemgetter
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
+from pathlib import Path
+from datetime import datetime, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# line-oriented psort output formats which can be merged
+HEADER_FORMATS = {'l2tcsv', 'dynamic'}
+MERGEABLE_FORMATS = HEADER_FORMATS | {'json_line'}
+
+
+def to_microseconds(value: datetime) -> int:
+    """Convert datetime to microseconds since epoch, naive means UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse an ISO 8601 date and time, basic format date is accepted"""
+    value = value.strip().replace('Z', '+00:00')
+    if len(value) >= 8 and value[:8].isdigit():
+        value = f'{value[:4]}-{value[4:6]}-{value[6:]}'
+    return datetime.fromisoformat(value)
+
+
+def _l2tcsv_timestamp(line: str) -> Optional[int]:
+    fields = line.split(',', 2)
+    if len(fields) < 3:
+        return None
+    try:
+        value = datetime.strptime(
+            f'{fields[0]} {fields[1]}', '%m/%d/%Y %H:%M:%S'
+        )
+    except ValueError:
+        return None
+    return to_microseconds(value)
+
+
+def _dynamic_timestamp(line: str) -> Optional[int]:
+    try:
+        return to_microseconds(parse_datetime(line.split(',', 1)[0]))
+    except ValueError:
+        return None
+
+
+def _json_line_timestamp(line: str) -> Optional[int]:
+    try:
+        return int(loads(line)['timestamp'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+TIMESTAMP_PARSERS: Dict[str, Callable[[str], Optional[int]]] = {
+    'l2tcsv': _l2tcsv_timestamp,
+    'dynamic': _dynamic_timestamp,
+    'json_line': _json_line_timestamp,
+}
+
+
+def event_timestamp(line: str, output_format: str) -> Optional[int]:
+    """Timestamp of an exported event in microseconds since epoch"""
+    return TIMESTAMP_PARSERS[output_format](line)
+
+
+def _events(fobj: TextIO, output_format: str) -> Iterator[str]:
+    if output_format in HEADER_FORMATS:
+        next(fobj, None)
+    for line in fobj:
+        if line.strip():
+            yield line
+
+
+def unique_events(events: Iterable[Tuple[int, str]]) -> Iterator[str]:
+    """Drop exact-duplicate events of a stream sorted by timestamp
+
+    Duplicates share their timestamp so only events of the current
+    timestamp are remembered, identical lines with different timestamps
+    are not duplicates.
+    """
+    current, seen = None, set()
+    for timestamp, line in events:
+        if timestamp != current:
+            current, seen = timestamp, set()
+        event = line.rstrip('\r\n')
+        if event not in seen:
+            seen.add(event)
+            yield line
+
+
+def merge_exports(
+    inputs: List[Path], output: Path, output_format: str, unique: bool = False
+) -> int:
+    """Merge psort exports sorted by time into output
+
+    Exports are read line by line through a k-way merge so memory usage
+    does not depend on their size. Exact-duplicate events are dropped when
+    unique is set. Returns the number of events written.
+    """
+    parser = TIMESTAMP_PARSERS[output_format]
+
+    def _keyed(fobj: TextIO) -> Iterator[Tuple[int, str]]:
+        previous = -1
+        for line in _events(fobj, output_format):
+            timestamp = parser(line)
+            # rows without timestamp follow the previous row so that the
+            # stream remains sorted
+            if timestamp is None:
+                timestamp = previous
+            previous = timestamp
+            yield timestamp, line
+
+    count = 0
+    fobjs = [filepath.open('r', newline='') for filepath in inputs]
+    try:
+        with output.open('w', newline='') as fout:
+            if output_format in HEADER_FORMATS:
+                for fobj in fobjs:
+                    header = fobj.readline()
+                    if header:
+                        fout.write(header)
+                        break
+                for fobj in fobjs:
+                    fobj.seek(0)
+            events = merge(
+                *[_keyed(fobj) for fobj in fobjs], key=itemgetter(0)
+            )
+            lines = (
+                unique_events(events)
+                if unique
+                else (line for _, line in events)
+            )
+            for line in lines:
+                fout.write(line)
+                count += 1
+    finally:
+        for fobj in fobjs:
+            fobj.close()
+    return count
@@ -0,0 +1,399 @@
+"""Datashark Linux Processors Timeline Export Index
+"""
+from os import getpid
+from re import IGNORECASE
+from re import compile as re_compile
+from csv import reader
+from json import dumps, loads
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from pathlib import Path
+from datashark_core.filesystem import prepend_workdir
+from .cache import fingerprint
+from .helper import config_value
+from .timeline import (
+    HEADER_FORMATS,
+    MERGEABLE_FORMATS,
+    TIMESTAMP_PARSERS,
+    parse_datetime,
+    to_microseconds,
+)
+
+BUCKET_SIZE = 300
+# exported columns holding indexed fields, by output format
+FIELD_COLUMNS = {
+    'l2tcsv': {
+        'parser': 'format',
+        'source_type': 'sourcetype',
+        'hostname': 'host',
+    },
+    'dynamic': {
+        'parser': 'parser',
+        'source_type': 'source_long',
+        'hostname': 'hostname',
+    },
+    'json_line': {
+        'parser': 'parser',
+        'source_type': 'data_type',
+        'hostname': 'hostname',
+    },
+}
+L2TCSV_COLUMNS = [
+    'date',
+    'time',
+    'timezone',
+    'MACB',
+    'source',
+    'sourcetype',
+    'type',
+    'user',
+    'host',
+    'short',
+    'desc',
+    'version',
+    'filename',
+    'inode',
+    'notes',
+    'format',
+    'extra',
+]
+# event filter attributes which can be answered from indexed fields
+FILTER_FIELDS = {
+    'l2tcsv': {'parser': 'parser', 'hostname': 'hostname'},
+    'dynamic': {'parser': 'parser', 'hostname': 'hostname'},
+    'json_line': {
+        'parser': 'parser',
+        'hostname': 'hostname',
+        'data_type': 'source_type',
+    },
+}
+EQUALITY_PATTERN = re_compile(r"^(\w+)\s+(?:is|==)\s+'([^']*)'$", IGNORECASE)
+DATE_PATTERN = re_compile(
+    r"^date\s+(>=|<)\s+DATETIME\('([^']+)'\)$", IGNORECASE
+)
+CONJUNCTION_PATTERN = re_compile(r'\s+and\s+', IGNORECASE)
+
+
+class SimpleQuery(NamedTuple):
+    """Time range and field values an indexed export can answer"""
+
+    start: Optional[int]
+    end: Optional[int]
+    fields: Dict[str, str]
+
+    def restrict(self, start: int, end: int) -> 'SimpleQuery':
+        """Intersect time range with [start, end)"""
+        return self._replace(
+            start=start if self.start is None else max(self.start, start),
+            end=end if self.end is None else min(self.end, end),
+        )
+
+
+def _unwrap(expression: str) -> str:
+    """Remove parentheses enclosing the whole expression"""
+    expression = expression.strip()
+    while expression.startswith('(') and expression.endswith(')'):
+        depth = 0
+        for position, char in enumerate(expression):
+            depth += {'(': 1, ')': -1}.get(char, 0)
+            if not depth and position < len(expression) - 1:
+                return expression
+        expression = expression[1:-1].strip()
+    return expression
+
+
+def parse_filter(
+    event_filter: Optional[str], output_format: str
+) -> Optional[SimpleQuery]:
+    """Parse a conjunction of field equalities and date bounds
+
+    Returns None when the filter needs psort to be evaluated.
+    """
+    start, end, fields = None, None, {}
+    expression = _unwrap(event_filter or '')
+    terms = CONJUNCTION_PATTERN.split(expression) if expression else []
+    for term in terms:
+        term = _unwrap(term)
+        match = EQUALITY_PATTERN.match(term)
+        if match:
+            field = FILTER_FIELDS[output_format].get(match.group(1).lower())
+            value = match.group(2)
+            if not field or fields.get(field, value) != value:
+                return None
+            fields[field] = value
+            continue
+        match = DATE_PATTERN.match(term)
+        if not match:
+            return None
+        value = to_microseconds(parse_datetime(match.group(2)))
+        if match.group(1) == '>=':
+            start = value if start is None else max(start, value)
+        else:
+            end = value if end is None else min(end, value)
+    return SimpleQuery(start, end, fields)
+
+
+class TimelineIndex:
+    """Time bucket byte offsets and field postings of a psort export
+
+    The export is split in runs of consecutive events falling in the same
+    time bucket. Postings map field values to the runs containing them so
+    that queries only read matching runs of the export.
+    """
+
+    def __init__(self, export: Path, metadata: Dict):
+        self._export = export
+        self._metadata = metadata
+
+    @property
+    def export(self) -> Path:
+        """Indexed export"""
+        return self._export
+
+    @property
+    def fields(self) -> List[str]:
+        """Fields present in the export"""
+        return self._metadata['fields']
+
+    @staticmethod
+    def _columns(output_format: str, header: str) -> Dict[str, int]:
+        names = L2TCSV_COLUMNS
+        if output_format == 'dynamic':
+            names = next(reader([header.strip()]))
+        return {
+            field: names.index(column)
+            for field, column in FIELD_COLUMNS[output_format].items()
+            if column in names
+        }
+
+    @staticmethod
+    def _fields(
+        line: str, output_format: str, columns: Dict[str, int]
+    ) -> Dict[str, str]:
+        if output_format == 'json_line':
+            try:
+                event = loads(line)
+            except ValueError:
+                return {}
+            return {
+                field: str(event[column])
+                for field, column in FIELD_COLUMNS[output_format].items()
+                if event.get(column) is not None
+            }
+        values = next(reader([line.rstrip('\r\n')]), [])
+        return {
+            field: values[position]
+            for field, position in columns.items()
+            if position < len(values)
+        }
+
+    @classmethod
+    def build(
+        cls, export: Path, output_format: str, bucket_size: int = BUCKET_SIZE
+    ) -> 'TimelineIndex':
+        """Index an export in a single pass"""
+        parser = TIMESTAMP_PARSERS[output_format]
+        bucket_us = bucket_size * 1000000
+        buckets: List[int] = []
+        offsets: List[int] = []
+        postings: Dict[str, Dict[str, List[int]]] = {
+            field: {} for field in FIELD_COLUMNS[output_format]
+        }
+        header = ''
+        offset = 0
+        with export.open('rb') as fobj:
+            if output_format in HEADER_FORMATS:
+                raw = fobj.readline()
+                header = raw.decode(errors='replace')
+                offset = len(raw)
+            columns = cls._columns(output_format, header)
+            fields = list(columns)
+            if output_format == 'json_line':
+                fields = list(FIELD_COLUMNS[output_format])
+            for raw in fobj:
+                line = raw.decode(errors='replace')
+                timestamp = parser(line)
+                if timestamp is not None and (
+                    not buckets or timestamp // bucket_us != buckets[-1]
+                ):
+                    buckets.append(timestamp // bucket_us)
+                    offsets.append(offset)
+                elif not buckets:
+                    buckets.append(0)
+                    offsets.append(offset)
+                run = len(buckets) - 1
+                for field, value in cls._fields(
+                    line, output_format, columns
+                ).items():
+                    runs = postings[field].setdefault(value, [])
+                    if not runs or runs[-1] != run:
+                        runs.append(run)
+                offset += len(raw)
+        offsets.append(offset)
+        return cls(
+            export,
+            {
+                'format': output_format,
+                'bucket_size': bucket_size,
+                'header': header,
+                'fields': fields,
+                'buckets': buckets,
+                'offsets': offsets,
+                'postings': postings,
+            },
+        )
+
+    def _runs(self, query: SimpleQuery) -> List[int]:
+        """Runs which may hold events matching query"""
+        bucket_us = self._metadata['bucket_size'] * 1000000
+        low = None if query.start is None else query.start // bucket_us
+        high = None if query.end is None else (query.end - 1) // bucket_us
+        runs = {
+            run
+            for run, bucket in enumerate(self._metadata['buckets'])
+            if (low is None or bucket >= low)
+            and (high is None or bucket <= high)
+        }
+        for field, value in query.fields.items():
+            runs &= set(
+                self._metadata['postings'].get(field, {}).get(value, [])
+            )
+        return sorted(runs)
+
+    def _ranges(self, runs: List[int]) -> Iterator[Tuple[int, int]]:
+        """Byte ranges covering consecutive runs"""
+        offsets = self._metadata['offsets']
+        first = previous = None
+        for run in runs:
+            if previous is not None and run == previous + 1:
+                previous = run
+                continue
+            if first is not None:
+                yield offsets[first], offsets[previous + 1]
+            first = previous = run
+        if first is not None:
+            yield offsets[first], offsets[previous + 1]
+
+    def _matches(
+        self, line: str, query: SimpleQuery, columns: Dict[str, int]
+    ) -> bool:
+        """Determine if an exported event matches query"""
+        output_format = self._metadata['format']
+        if query.start is not None or query.end is not None:
+            timestamp = TIMESTAMP_PARSERS[output_format](line)
+            if timestamp is None:
+                return False
+            if query.start is not None and timestamp < query.start:
+                return False
+            if query.end is not None and timestamp >= query.end:
+                return False
+        if query.fields:
+            fields = self._fields(line, output_format, columns)
+            return all(
+                fields.get(field) == value
+                for field, value in query.fields.items()
+            )
+        return True
+
+    def query(self, query: SimpleQuery, output: Path) -> int:
+        """Write events matching query to output, return their number"""
+        header = self._metadata['header']
+        columns = self._columns(self._metadata['format'], header)
+        count = 0
+        with self._export.open('rb') as fin, output.open('wb') as fout:
+            fout.write(header.encode())
+            for start, stop in self._ranges(self._runs(query)):
+                fin.seek(start)
+                remaining = stop - start
+                while remaining > 0:
+                    raw = fin.readline()
+                    if not raw:
+                        break
+                    remaining -= len(raw)
+                    if self._matches(
+                        raw.decode(errors='replace'), query, columns
+                    ):
+                        fout.write(raw)
+                        count += 1
+        return count
+
+    def save(self, filepath: Path):
+        """Write index next to its metadata"""
+        tmp = filepath.with_name(f'{filepath.name}.{getpid()}')
+        tmp.write_text(dumps(dict(self._metadata, export=str(self._export))))
+        tmp.replace(filepath)
+
+    @classmethod
+    def load(cls, filepath: Path) -> Optional['TimelineIndex']:
+        """Read index, None if index or its export is missing"""
+        if not filepath.is_file():
+            return None
+        metadata = loads(filepath.read_text())
+        export = Path(metadata.pop('export'))
+        if not export.is_file():
+            return None
+        return cls(export, metadata)
+
+
+class TimelineIndexRegistry:
+    """Indexed full exports of storage files kept in the workdir
+
+    Entries are keyed on the storage file fingerprint and output format,
+    entries of a previous version of a storage file are removed.
+    """
+
+    def __init__(self, directory: Path, bucket_size: int):
+        self._directory = directory
+        self._bucket_size = bucket_size
+
+    @classmethod
+    def from_config(cls, config) -> 'TimelineIndexRegistry':
+        """Build registry from configuration"""
+        return cls(
+            prepend_workdir(config, 'timeline-index'),
+            config_value(
+                config,
+                'datashark.processors.timeline_index.bucket_size',
+                BUCKET_SIZE,
+            ),
+        )
+
+    def _paths(self, key: str, output_format: str) -> Tuple[Path, Path]:
+        stem = f'{key}.{output_format}'
+        return (
+            self._directory / f'{stem}.export',
+            self._directory / f'{stem}.index.json',
+        )
+
+    def lookup(
+        self, storage_file: Path, output_format: str
+    ) -> Tuple[Optional[TimelineIndex], Path]:
+        """Index of storage file export and the path to export it to"""
+        key = fingerprint(storage_file)
+        export, index = self._paths(key, output_format)
+        return TimelineIndex.load(index), export
+
+    def register(
+        self, storage_file: Path, output_format: str, export: Path
+    ) -> TimelineIndex:
+        """Index an export of storage file"""
+        if output_format not in MERGEABLE_FORMATS:
+            raise ValueError(f"{output_format} exports cannot be indexed")
+        self._directory.mkdir(parents=True, exist_ok=True)
+        key = fingerprint(storage_file)
+        index = TimelineIndex.build(export, output_format, self._bucket_size)
+        index.save(self._paths(key, output_format)[1])
+        self._forget_previous(storage_file, key)
+        return index
+
+    def _forget_previous(self, storage_file: Path, key: str):
+        """Remove entries of previous versions of storage file"""
+        sources = self._directory / 'sources.json'
+        entries = loads(sources.read_text()) if sources.is_file() else {}
+        previous = entries.get(str(storage_file.resolve()))
+        if previous and previous != key:
+            for path in self._directory.glob(f'{previous}.*'):
+                path.unlink(missing_ok=True)
+        entries[str(storage_file.resolve())] = key
+        tmp = sources.with_name(f'sources.json.{getpid()}')
+        tmp.write_text(dumps(entries))
+        tmp.replace(sources)
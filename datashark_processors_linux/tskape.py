@@ -1,21 +1,91 @@
 """Datashark TSKAPE Processor
 """
-from typing import Dict
+from re import compile as re_compile, error as re_error
+from typing import Any, Dict, List, Pattern, Set, Tuple
+from asyncio import get_running_loop
+from pathlib import Path
+from contextvars import ContextVar
 from asyncio.subprocess import PIPE, DEVNULL
 from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
-from datashark_core.processor import ProcessorInterface
+from datashark_core.processor import ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .interface import LinuxProcessorInterface
+from .batch import BatchMixin, BatchResult, batch_arguments, unique_name
+from .helper import get_value, make_argument, override, discard
+from .scheduler import ResourceProfile
 
 NAME = 'linux_tskape'
+BATCH_NAME = 'linux_tskape_batch'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
+PATTERNS_FILENAME = 'patterns.txt'
+# matchers of the pattern files of the running batch
+MATCHERS = ContextVar('tskape_matchers', default=())
 
 
-class TSKAPEProcessor(ProcessorInterface, metaclass=ProcessorMeta):
+def read_list(filepath: Path) -> List[str]:
+    """Read non-empty lines of a file"""
+    return [
+        line.strip()
+        for line in filepath.read_text().splitlines()
+        if line.strip()
+    ]
+
+
+def _alternation(patterns: List[str]) -> List[Pattern]:
+    """Compile patterns into a single alternation if possible"""
+    if not patterns:
+        # an empty alternation would match everything
+        return []
+    try:
+        return [re_compile('|'.join(f'(?:{pattern})' for pattern in patterns))]
+    except re_error:
+        # inline global flags cannot be combined
+        return [re_compile(pattern) for pattern in patterns]
+
+
+def log_path(line: str) -> str:
+    """Matched path of a tskape log line, the text before the first tab"""
+    return line.rstrip('\r\n').split('\t', 1)[0]
+
+
+def compile_patterns(
+    pattern_files: List[Path],
+) -> Tuple[List[str], List[List[Pattern]]]:
+    """Compile pattern files into a combined pattern file content
+
+    Returns the lines of the combined pattern file, a single alternation
+    of all patterns when possible, and the matchers of each pattern file
+    used to tag matches with the pattern files they come from. Empty
+    pattern files are skipped and get no matchers.
+    """
+    patterns = []
+    matchers = []
+    for pattern_file in pattern_files:
+        file_patterns = read_list(pattern_file)
+        if not file_patterns:
+            LOGGER.warning("%s has no patterns, skipped", pattern_file)
+        matchers.append(_alternation(file_patterns))
+        patterns.extend(
+            pattern for pattern in file_patterns if pattern not in patterns
+        )
+    if not patterns:
+        raise ProcessorError("pattern files have no patterns")
+    combined = _alternation(patterns)
+    if len(combined) > 1:
+        return patterns, matchers
+    return [combined[0].pattern], matchers
+
+
+class TSKAPEProcessor(LinuxProcessorInterface, metaclass=ProcessorMeta):
     """Run tskape on given filepath"""
 
     NAME = NAME
     SYSTEM = System.LINUX
+    BIN_KEY = 'datashark.processors.tskape.bin'
+    INPUTS = ['filepath', 'pattern_file']
+    OUTPUTS = ['log', 'extract_to']
+    RESOURCE_PROFILE = ResourceProfile.IO_BOUND
     ARGUMENTS = [
         {
             'name': 'extract_to',
@@ -46,11 +116,11 @@ class TSKAPEProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Run tskape on given filepath
     """
 
-    async def _run(self, arguments: Dict[str, ProcessorArgument]):
-        """Process a file using tskape"""
+    async def _find(self, arguments: Dict[str, ProcessorArgument]):
+        """Run a single tskape process"""
         # invoke subprocess
         proc = await self._start_subprocess(
-            'datashark.processors.tskape.bin',
+            self.BIN_KEY,
             ['find'],
             [
                 # optional
@@ -65,3 +135,146 @@ class TSKAPEProcessor(ProcessorInterface, metaclass=ProcessorMeta):
             stderr=PIPE,
         )
         await self._handle_communicating_process(proc)
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Process a file using tskape"""
+        await self._find(arguments)
+
+
+def log_names(pattern_files: List[Path], reserved: Set[str]) -> List[str]:
+    """Log filename of each pattern file, <pattern file stem>.log
+
+    Stems colliding with each other or with reserved names are suffixed
+    with a counter.
+    """
+    names = set(reserved)
+    filenames = []
+    for filepath in pattern_files:
+        name = unique_name(filepath.stem, names)
+        names.add(name)
+        filenames.append(f'{name}.log')
+    return filenames
+
+
+def tag_matches(
+    log: Path, directory: Path, matchers: List[Tuple[str, List[Pattern]]]
+):
+    """Split log into <directory>/<log filename> of each matcher"""
+    logs = []
+    try:
+        for filename, _ in matchers:
+            logs.append((directory / filename).open('w'))
+        with log.open('r', errors='replace') as fobj:
+            for line in fobj:
+                # patterns apply to paths, not to whole log lines
+                path = log_path(line)
+                for fout, (_, patterns) in zip(logs, matchers):
+                    if any(p.search(path) for p in patterns):
+                        fout.write(line)
+    finally:
+        for fobj in logs:
+            fobj.close()
+
+
+class TSKAPEBatchProcessor(BatchMixin, TSKAPEProcessor):
+    """Run tskape on many filepaths with many pattern files"""
+
+    NAME = BATCH_NAME
+    BATCH_INPUT = 'filepath'
+    BATCH_OUTPUTS = {'log': 'tskape.log', 'extract_to': 'extracted'}
+    ARGUMENTS = [
+        spec
+        for spec in batch_arguments(
+            TSKAPEProcessor.ARGUMENTS, BATCH_INPUT, list(BATCH_OUTPUTS)
+        )
+        if spec['name'] != 'pattern_file'
+    ] + [
+        {
+            'name': 'pattern_files',
+            'kind': Kind.PATH,
+            'required': True,
+            'description': """
+                File listing pattern files, one path per line. Patterns of all files are combined so that each file
+                to process is walked once, matches are then split in <output_root>/<input name>/<pattern file
+                stem>.log according to the path of each match, stems used already are suffixed with a counter
+            """,
+        },
+        {
+            'name': 'extract',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Extract matched filepath content to <output_root>/<input name>/extracted
+            """,
+        },
+    ]
+    DESCRIPTION = """
+    Run tskape on many filepaths listed in a manifest with many pattern files
+    """
+
+    def _item_arguments(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        item: Dict[str, Any],
+        item_dir: Path,
+    ) -> Dict[str, ProcessorArgument]:
+        item_arguments = super()._item_arguments(arguments, item, item_dir)
+        if not get_value(arguments, 'extract', False):
+            item_arguments = discard(item_arguments, 'extract_to')
+        return discard(item_arguments, 'pattern_files', 'extract')
+
+    async def _run_item(
+        self,
+        arguments: Dict[str, ProcessorArgument],
+        item: Dict[str, Any],
+        item_dir: Path,
+    ) -> BatchResult:
+        """Process an item then split its matches per pattern file"""
+        result = await super()._run_item(arguments, item, item_dir)
+        if result.status != 'ok':
+            return result
+        try:
+            await get_running_loop().run_in_executor(
+                None,
+                tag_matches,
+                item_dir / self.BATCH_OUTPUTS['log'],
+                item_dir,
+                MATCHERS.get(),
+            )
+        except OSError as exc:
+            LOGGER.error("%s tagging failed: %s", result.input, exc)
+            return result._replace(status='failed', error=str(exc))
+        return result
+
+    async def _process(self, arguments: Dict[str, ProcessorArgument]):
+        """Combine pattern files then process items of the manifest"""
+        if get_value(arguments, 'manifest') is None:
+            await super()._process(arguments)
+            return
+        pattern_files = [
+            Path(line)
+            for line in read_list(Path(get_value(arguments, 'pattern_files')))
+        ]
+        lines, matchers = compile_patterns(pattern_files)
+        output_root = Path(get_value(arguments, 'output_root'))
+        output_root.mkdir(parents=True, exist_ok=True)
+        # kept in output_root so that items can be cached, rewritten only
+        # when patterns change so that its fingerprint does not change
+        pattern_file = output_root / PATTERNS_FILENAME
+        content = '\n'.join(lines) + '\n'
+        if not pattern_file.is_file() or pattern_file.read_text() != content:
+            pattern_file.write_text(content)
+        filenames = log_names(
+            pattern_files, {Path(self.BATCH_OUTPUTS['log']).stem}
+        )
+        token = MATCHERS.set(list(zip(filenames, matchers)))
+        try:
+            await super()._process(
+                override(
+                    arguments,
+                    make_argument('pattern_file', Kind.PATH, pattern_file),
+                )
+            )
+        finally:
+            MATCHERS.reset(token)
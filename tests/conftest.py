@@ -0,0 +1,35 @@
+"""Fixtures running processors with the stub tools of benchmarks
+"""
+from typing import Any, Callable, Dict
+from pytest import fixture
+from benchmarks.run import STUBS, TOOLS, BenchmarkConfig
+from datashark_processors_linux.metrics import MetricsSink
+from datashark_processors_linux.scheduler import Scheduler
+
+
+@fixture(name='make_config')
+def make_config_fixture(
+    tmp_path, monkeypatch
+) -> Callable[..., BenchmarkConfig]:
+    """Build a configuration using stub tools and a temporary workdir
+
+    Keyword arguments update datashark.processors.<keyword> settings.
+    """
+    # per-process singletons are bound to the event loop of a test
+    monkeypatch.setattr(Scheduler, '_INSTANCE', None)
+    monkeypatch.setattr(MetricsSink, '_INSTANCE', None)
+
+    def _make_config(**settings: Dict[str, Any]) -> BenchmarkConfig:
+        processors = {tool: {'bin': str(STUBS / tool)} for tool in TOOLS}
+        for name, values in settings.items():
+            processors.setdefault(name, {}).update(values)
+        return BenchmarkConfig(
+            {
+                'datashark': {
+                    'agent': {'workdir': str(tmp_path / 'workdir')},
+                    'processors': processors,
+                }
+            }
+        )
+
+    return _make_config
@@ -0,0 +1,53 @@
+"""Batch helpers tests
+"""
+from pytest import raises
+from datashark_core.model.api import Kind
+from datashark_processors_linux.batch import (
+    BATCH_ARGUMENTS,
+    batch_arguments,
+    read_batch_manifest,
+    unique_name,
+)
+
+
+def test_unique_name():
+    taken = set()
+    names = []
+    for name in ['disk.img', 'disk.img', 'disk.img-1', 'disk.img']:
+        name = unique_name(name, taken)
+        taken.add(name)
+        names.append(name)
+    assert names == ['disk.img', 'disk.img-1', 'disk.img-1-1', 'disk.img-2']
+
+
+def test_read_batch_manifest(tmp_path):
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text(
+        '# evidence\n'
+        '/evidence/a.img\n'
+        '\n'
+        '{"filepath": "/evidence/b.img", "quick": "true"}\n'
+    )
+    assert read_batch_manifest(manifest, 'filepath') == [
+        {'filepath': '/evidence/a.img'},
+        {'filepath': '/evidence/b.img', 'quick': 'true'},
+    ]
+
+
+def test_read_batch_manifest_without_input(tmp_path):
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text('{"quick": "true"}\n')
+    with raises(ValueError):
+        read_batch_manifest(manifest, 'filepath')
+
+
+def test_batch_arguments():
+    arguments = [
+        {'name': 'filepath', 'kind': Kind.PATH, 'required': True},
+        {'name': 'log', 'kind': Kind.PATH, 'required': True},
+        {'name': 'quick', 'kind': Kind.BOOL, 'required': False},
+    ]
+    assert (
+        batch_arguments(arguments, 'filepath', ['log'])
+        == [arguments[2]] + BATCH_ARGUMENTS
+    )
@@ -0,0 +1,81 @@
+"""Result cache tests
+"""
+from itertools import count
+from pytest import fixture
+from datashark_processors_linux import cache
+from datashark_processors_linux.cache import ResultCache
+
+
+@fixture(name='clock', autouse=True)
+def clock_fixture(monkeypatch):
+    # distinct access times regardless of the clock resolution
+    monkeypatch.setattr(cache, 'time', count().__next__)
+
+
+def _output(directory, name, content):
+    output = directory / name
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(content)
+    return output
+
+
+def test_key(tmp_path):
+    binary = _output(tmp_path, 'tool', '#!/bin/sh\n')
+    evidence = _output(tmp_path, 'evidence', 'a' * 1000)
+    key = ResultCache.key('tool', [evidence], [('a', '1')], binary)
+    assert key == ResultCache.key('tool', [evidence], [('a', '1')], binary)
+    assert key != ResultCache.key('tool', [evidence], [('a', '2')], binary)
+    assert key != ResultCache.key('other', [evidence], [('a', '1')], binary)
+    evidence.write_text('b' * 1000)
+    assert key != ResultCache.key('tool', [evidence], [('a', '1')], binary)
+
+
+def test_miss_then_hit(tmp_path):
+    result_cache = ResultCache(tmp_path / 'cache', 1 << 20)
+    log = _output(tmp_path / 'run', 'log', 'hits\n')
+    extracted = _output(tmp_path / 'run' / 'extracted', 'a/b.bin', 'data')
+    outputs = {'log': log, 'extracted': extracted.parent.parent}
+    assert not result_cache.restore('k', outputs)
+    result_cache.store('k', outputs)
+    targets = {
+        'log': tmp_path / 'other' / 'log',
+        'extracted': tmp_path / 'other' / 'extracted',
+    }
+    assert result_cache.restore('k', targets)
+    assert targets['log'].read_text() == 'hits\n'
+    assert (targets['extracted'] / 'a' / 'b.bin').read_text() == 'data'
+    assert result_cache.stats() == {
+        'hits': 1,
+        'misses': 1,
+        'entries': 1,
+        'size': 9,
+    }
+
+
+def test_outputs_do_not_share_entry_files(tmp_path):
+    result_cache = ResultCache(tmp_path / 'cache', 1 << 20)
+    log = _output(tmp_path, 'log', 'first run\n')
+    result_cache.store('k', {'log': log})
+    # outputs modified after store
+    log.write_text('modified after store\n')
+    assert result_cache.restore('k', {'log': log})
+    assert log.read_text() == 'first run\n'
+    # restored outputs rewritten in place by a later run
+    with log.open('w') as fobj:
+        fobj.write('rewritten in place\n')
+    assert result_cache.restore('k', {'log': log})
+    assert log.read_text() == 'first run\n'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    result_cache = ResultCache(tmp_path / 'cache', 20)
+    for key in ('a', 'b'):
+        result_cache.store(key, {'log': _output(tmp_path, key, key * 10)})
+    # a becomes more recently used than b
+    assert result_cache.restore('a', {'log': tmp_path / 'restored'})
+    result_cache.store('c', {'log': _output(tmp_path, 'c', 'c' * 10)})
+    assert not result_cache.restore('b', {'log': tmp_path / 'restored'})
+    assert not (result_cache.directory / 'b').exists()
+    assert result_cache.restore('a', {'log': tmp_path / 'restored'})
+    assert result_cache.restore('c', {'log': tmp_path / 'restored'})
+    assert result_cache.stats()['size'] == 20
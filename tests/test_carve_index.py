@@ -0,0 +1,91 @@
+"""Carved files index tests
+"""
+from json import loads
+from sqlite3 import connect
+from datashark_processors_linux.foremost import AuditEntry, parse_audit_line
+from datashark_processors_linux.carve_index import (
+    CarvedFile,
+    CarveIndex,
+    parse_size,
+)
+
+ENTRIES = [
+    AuditEntry('00000008.jpg', '12 KB', 4096, ''),
+    AuditEntry('00000000.pdf', '1.5 MB', 0, ''),
+    AuditEntry('00000016.jpg', '512 B', 8192, ''),
+    AuditEntry('00000024', '1 KB', 12288, ''),
+]
+
+
+def test_parse_size():
+    assert parse_size('512 B') == 512
+    assert parse_size('12 KB') == 12 << 10
+    assert parse_size('1.5 MB') == 3 << 19
+    assert parse_size('unknown') == -1
+
+
+def test_parse_audit_line():
+    assert parse_audit_line(
+        '1:\t00000008.jpg \t 12 KB \t 4096 \t (header)'
+    ) == AuditEntry('00000008.jpg', '12 KB', 4096, '(header)')
+    assert parse_audit_line('Num\t Name (bs=512)\t Size\t File Offset') is None
+
+
+def test_build_sorts_by_offset():
+    index = CarveIndex.build(ENTRIES)
+    assert len(index) == 4
+    assert sorted(index.types) == ['', 'jpg', 'pdf']
+    assert list(index.query()) == [
+        CarvedFile('pdf', 0, 3 << 19, '00000000.pdf'),
+        CarvedFile('jpg', 4096, 12 << 10, '00000008.jpg'),
+        CarvedFile('jpg', 8192, 512, '00000016.jpg'),
+        CarvedFile('', 12288, 1 << 10, '00000024'),
+    ]
+
+
+def test_query_by_type_and_range():
+    index = CarveIndex.build(ENTRIES)
+    assert [carved.offset for carved in index.query(types=['jpg'])] == [
+        4096,
+        8192,
+    ]
+    assert [carved.offset for carved in index.query(start=4096)] == [
+        4096,
+        8192,
+        12288,
+    ]
+    assert [
+        carved.name for carved in index.query(types=['jpg'], end=8192)
+    ] == ['00000008.jpg']
+    assert list(index.query(types=['png'])) == []
+
+
+def test_save_load(tmp_path):
+    index = CarveIndex.build(ENTRIES)
+    filepath = tmp_path / 'audit.idx'
+    index.save(filepath)
+    loaded = CarveIndex.load(filepath)
+    assert loaded.types == index.types
+    assert list(loaded.query()) == list(index.query())
+
+
+def test_exports(tmp_path):
+    index = CarveIndex.build(ENTRIES)
+    index.to_jsonl(tmp_path / 'carved.jsonl', types=['jpg'])
+    records = [
+        loads(line)
+        for line in (tmp_path / 'carved.jsonl').read_text().splitlines()
+    ]
+    assert [record['path'] for record in records] == [
+        'jpg/00000008.jpg',
+        'jpg/00000016.jpg',
+    ]
+    index.to_sqlite(tmp_path / 'carved.db')
+    connection = connect(str(tmp_path / 'carved.db'))
+    try:
+        rows = connection.execute(
+            'SELECT path FROM carved WHERE offset >= 8192 ORDER BY offset'
+        ).fetchall()
+    finally:
+        connection.close()
+    assert rows == [('jpg/00000016.jpg',), ('/00000024',)]
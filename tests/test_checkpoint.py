@@ -0,0 +1,106 @@
+"""Checkpoint tests
+"""
+from json import loads
+from asyncio import run
+from pytest import raises
+from benchmarks.run import build_arguments
+from benchmarks.synthetic import log_tree
+from datashark_core.processor import ProcessorError
+from datashark_processors_linux.psort import PSortProcessor
+from datashark_processors_linux.checkpoint import Checkpoint
+from datashark_processors_linux.log2timeline import Log2TimelineProcessor
+
+
+def test_completed_units_are_reloaded(tmp_path):
+    filepath = tmp_path / 'checkpoint.json'
+    checkpoint = Checkpoint(filepath)
+    checkpoint.complete('/out/shard-0000', [1, 2])
+    checkpoint.complete('/out/shard-0001')
+    checkpoint = Checkpoint(filepath)
+    assert checkpoint.done('/out/shard-0000')
+    assert checkpoint.result('/out/shard-0000') == [1, 2]
+    assert checkpoint.done('/out/shard-0001')
+    assert not checkpoint.done('/out/shard-0002')
+    checkpoint.clear()
+    assert not filepath.exists()
+
+
+def test_key_depends_on_arguments_and_inputs(tmp_path):
+    storage_file = tmp_path / 'l2t.plaso'
+    storage_file.write_text('events')
+    arguments = build_arguments(
+        PSortProcessor, {'storage_file': storage_file, 'shards': 2}
+    )
+    key = Checkpoint.key('linux_psort', [storage_file], arguments)
+    assert key == Checkpoint.key('linux_psort', [storage_file], arguments)
+    assert key != Checkpoint.key(
+        'linux_psort',
+        [storage_file],
+        build_arguments(
+            PSortProcessor, {'storage_file': storage_file, 'shards': 4}
+        ),
+    )
+    storage_file.write_text('more events')
+    assert key != Checkpoint.key('linux_psort', [storage_file], arguments)
+
+
+def test_interrupted_sharded_export_resumes(
+    make_config, tmp_path, monkeypatch
+):
+    log_tree(tmp_path / 'logs', 4, 50)
+    storage_file = tmp_path / 'l2t.plaso'
+    run(
+        Log2TimelineProcessor(make_config())._run(
+            build_arguments(
+                Log2TimelineProcessor,
+                {'source': tmp_path / 'logs', 'storage_file': storage_file},
+            )
+        )
+    )
+    output_file = tmp_path / 'timeline.json_line'
+    arguments = build_arguments(
+        PSortProcessor,
+        {
+            'storage_file': storage_file,
+            'output_file': output_file,
+            'output_format': 'json_line',
+            'shards': 4,
+            'start': '2020-01-01T00:00:00+00:00',
+            'end': '2020-01-05T00:00:00+00:00',
+            'max_workers': 1,
+        },
+    )
+    exported, interrupted = [], []
+    export = PSortProcessor._export
+
+    async def _export(self, arguments, tag='', **kwargs):
+        exported.append(tag)
+        if tag == 'shard-0002' and not interrupted:
+            interrupted.append(tag)
+            raise ProcessorError('interrupted')
+        await export(self, arguments, tag, **kwargs)
+
+    monkeypatch.setattr(PSortProcessor, '_export', _export)
+    config = make_config(checkpoint={'enabled': True})
+    with raises(ProcessorError):
+        run(PSortProcessor(config)._run(arguments))
+    # the last window may start before the run is cancelled
+    assert exported[:3] == ['shard-0000', 'shard-0001', 'shard-0002']
+    # completed windows are kept, interrupted ones are removed
+    assert sorted(path.name for path in tmp_path.glob('timeline.*')) == [
+        'timeline.json_line.shard-0000',
+        'timeline.json_line.shard-0001',
+    ]
+    checkpoints = tmp_path / 'workdir' / 'checkpoints'
+    assert len(list(checkpoints.iterdir())) == 1
+    exported.clear()
+    run(PSortProcessor(config)._run(arguments))
+    assert exported == ['shard-0002', 'shard-0003']
+    timestamps = [
+        loads(line)['timestamp']
+        for line in output_file.read_text().splitlines()
+    ]
+    assert len(timestamps) == 200
+    assert timestamps == sorted(timestamps)
+    # checkpoint of a successful run is removed
+    assert not list(checkpoints.iterdir())
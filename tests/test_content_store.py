@@ -0,0 +1,60 @@
+"""Content-addressed store tests
+"""
+from json import loads
+from asyncio import run
+from hashlib import sha256
+from datashark_processors_linux.content_store import (
+    MANIFEST_FILENAME,
+    ContentStore,
+    deduplicate,
+)
+
+
+def test_add_links_duplicates(tmp_path):
+    store = ContentStore(tmp_path / 'store')
+    first, second = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    first.write_bytes(b'carved')
+    second.write_bytes(b'carved')
+    digest = sha256(b'carved').hexdigest()
+    assert store.add(first) == (digest, False)
+    assert store.add(second) == (digest, True)
+    assert second.samefile(first)
+    assert store.path(digest).samefile(first)
+    # adding a stored file again keeps it
+    assert store.add(first) == (digest, True)
+    assert first.read_bytes() == b'carved'
+
+
+def test_deduplicate_streams_carved_files(make_config, tmp_path):
+    config = make_config(content_store={'directory': str(tmp_path / 'store')})
+    output_dir = tmp_path / 'output'
+    for index in range(50):
+        filepath = output_dir / ('jpg', 'png')[index % 2] / f'{index:03d}.bin'
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.write_bytes(bytes([index % 5]) * 100)
+    (output_dir / 'audit.txt').write_text('audit')
+    run(
+        deduplicate(
+            config,
+            output_dir,
+            'foremost',
+            lambda relative: int(relative.stem),
+            lambda relative: relative.name != 'audit.txt',
+            2,
+        )
+    )
+    manifest = [
+        loads(line)
+        for line in (output_dir / MANIFEST_FILENAME).read_text().splitlines()
+    ]
+    assert sorted(item['offset'] for item in manifest) == list(range(50))
+    assert sum(item['duplicate'] for item in manifest) == 45
+    assert {item['carver'] for item in manifest} == {'foremost'}
+    for item in manifest:
+        filepath = output_dir / item['path']
+        assert filepath.samefile(item['stored'])
+        assert sha256(filepath.read_bytes()).hexdigest() == item['sha256']
+    stored = [
+        path for path in (tmp_path / 'store').rglob('*') if path.is_file()
+    ]
+    assert len(stored) == 5
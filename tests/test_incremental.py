@@ -0,0 +1,110 @@
+"""Incremental source tracking tests
+"""
+from os import utime
+from re import fullmatch
+from json import dumps
+from datashark_processors_linux.incremental import (
+    SourceEntry,
+    processed_manifest_path,
+    read_processed,
+    scan_delta,
+    write_filter_file,
+    write_processed,
+)
+
+
+def _source(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'var' / 'log').mkdir(parents=True)
+    (source / 'var' / 'log' / 'syslog').write_text('boot\n')
+    (source / 'etc').mkdir()
+    (source / 'etc' / 'hosts').write_text('127.0.0.1 localhost\n')
+    return source
+
+
+def test_scan_delta_lists_new_files(tmp_path):
+    source = _source(tmp_path)
+    delta = scan_delta(source, {})
+    assert sorted(entry.path for entry in delta) == [
+        '/etc/hosts',
+        '/var/log/syslog',
+    ]
+
+
+def test_scan_delta_skips_unchanged_files(tmp_path):
+    source = _source(tmp_path)
+    processed = {entry.path: entry for entry in scan_delta(source, {})}
+    assert scan_delta(source, processed) == []
+
+
+def test_scan_delta_lists_modified_files(tmp_path):
+    source = _source(tmp_path)
+    processed = {entry.path: entry for entry in scan_delta(source, {})}
+    (source / 'var' / 'log' / 'syslog').write_text('boot\nshutdown\n')
+    delta = scan_delta(source, processed)
+    assert [entry.path for entry in delta] == ['/var/log/syslog']
+
+
+def test_scan_delta_lists_touched_files(tmp_path):
+    source = _source(tmp_path)
+    processed = {entry.path: entry for entry in scan_delta(source, {})}
+    hosts = source / 'etc' / 'hosts'
+    utime(hosts, ns=(0, processed['/etc/hosts'].mtime + 1000))
+    delta = scan_delta(source, processed)
+    assert delta == [
+        SourceEntry(
+            '/etc/hosts', hosts.stat().st_size, hosts.stat().st_mtime_ns
+        )
+    ]
+
+
+def test_scan_delta_lists_files_modified_in_place(tmp_path):
+    source = _source(tmp_path)
+    disk = source / 'disk.img'
+    disk.write_bytes(bytes(4 << 20))
+    processed = {entry.path: entry for entry in scan_delta(source, {})}
+    # same size, change far from the start and the end of the file
+    with disk.open('r+b') as fobj:
+        fobj.seek((2 << 20) + 12345)
+        fobj.write(b'modified')
+    utime(disk, ns=(0, processed['/disk.img'].mtime + 1000))
+    delta = scan_delta(source, processed)
+    assert [entry.path for entry in delta] == ['/disk.img']
+
+
+def test_processed_round_trip(tmp_path):
+    storage_file = tmp_path / 'l2t.plaso'
+    assert read_processed(storage_file) == {}
+    entries = {'/a': SourceEntry('/a', 1, 2)}
+    write_processed(storage_file, entries)
+    assert read_processed(storage_file) == entries
+
+
+def test_read_processed_ignores_unknown_fields(tmp_path):
+    storage_file = tmp_path / 'l2t.plaso'
+    processed_manifest_path(storage_file).write_text(
+        dumps({'files': [{'path': '/a', 'size': 1, 'mtime': 2, 'hash': 'ff'}]})
+    )
+    assert read_processed(storage_file) == {'/a': SourceEntry('/a', 1, 2)}
+
+
+def test_write_filter_file_escapes_segments(tmp_path):
+    filter_file = tmp_path / 'filter.txt'
+    write_filter_file(
+        filter_file,
+        [
+            SourceEntry('/var/log/syslog.1', 1, 1),
+            SourceEntry('/home/user/a+b (1).txt', 1, 1),
+        ],
+    )
+    lines = filter_file.read_text().splitlines()
+    assert len(lines) == 2
+    for line, path in zip(
+        lines, ['/var/log/syslog.1', '/home/user/a+b (1).txt']
+    ):
+        segments = line.split('/')[1:]
+        assert all(
+            fullmatch(pattern, segment)
+            for pattern, segment in zip(segments, path.split('/')[1:])
+        )
+    assert not fullmatch(lines[0].split('/')[-1], 'syslogx1')
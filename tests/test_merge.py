@@ -0,0 +1,91 @@
+"""Plaso storage merge processor tests
+"""
+from json import loads
+from asyncio import run
+from pytest import raises
+from benchmarks.run import build_arguments
+from benchmarks.synthetic import log_tree
+from datashark_core.processor import ProcessorError
+from datashark_processors_linux.merge import PlasoMergeProcessor
+from datashark_processors_linux.storage import write_manifest
+from datashark_processors_linux.log2timeline import Log2TimelineProcessor
+
+
+def _storage_file(config, source, storage_file):
+    run(
+        Log2TimelineProcessor(config)._run(
+            build_arguments(
+                Log2TimelineProcessor,
+                {'source': source, 'storage_file': storage_file},
+            )
+        )
+    )
+    return storage_file
+
+
+def _merge(config, **values):
+    run(
+        PlasoMergeProcessor(config)._run(
+            build_arguments(PlasoMergeProcessor, values)
+        )
+    )
+
+
+def _timestamps(filepath):
+    return [
+        loads(line)['timestamp'] for line in filepath.read_text().splitlines()
+    ]
+
+
+def test_merge_storage_files(make_config, tmp_path):
+    config = make_config()
+    log_tree(tmp_path / 'a', 2, 50, seed=1)
+    log_tree(tmp_path / 'b', 3, 40, seed=2)
+    first = _storage_file(config, tmp_path / 'a', tmp_path / 'a.plaso')
+    second = _storage_file(config, tmp_path / 'b', tmp_path / 'b.plaso')
+    # storage files of a fan out run are listed by a manifest
+    storage_file = tmp_path / 'l2t.plaso'
+    write_manifest(storage_file, [first])
+    output_file = tmp_path / 'timeline.json_line'
+    _merge(
+        config,
+        storage_file=storage_file,
+        storage_files=f'{second},{first}',
+        output_file=output_file,
+    )
+    timestamps = _timestamps(output_file)
+    assert len(timestamps) == 220
+    assert timestamps == sorted(timestamps)
+    assert [path.name for path in tmp_path.glob('timeline.*')] == [
+        output_file.name
+    ]
+
+
+def test_merge_drops_duplicate_events(make_config, tmp_path):
+    config = make_config()
+    log_tree(tmp_path / 'logs', 2, 50)
+    first = _storage_file(config, tmp_path / 'logs', tmp_path / 'a.plaso')
+    second = _storage_file(config, tmp_path / 'logs', tmp_path / 'b.plaso')
+    values = {'storage_file': first, 'storage_files': str(second)}
+    _merge(config, output_file=tmp_path / 'unique.json_line', **values)
+    assert len(_timestamps(tmp_path / 'unique.json_line')) == 100
+    _merge(
+        config,
+        output_file=tmp_path / 'all.json_line',
+        unique=False,
+        **values,
+    )
+    assert len(_timestamps(tmp_path / 'all.json_line')) == 200
+
+
+def test_merge_refuses_unmergeable_formats(make_config, tmp_path):
+    assert 'analysis' not in [
+        spec['name'] for spec in PlasoMergeProcessor.ARGUMENTS
+    ]
+    with raises(ProcessorError):
+        _merge(
+            make_config(),
+            storage_file=tmp_path / 'l2t.plaso',
+            output_file=tmp_path / 'timeline.xlsx',
+            output_format='xlsx',
+        )
@@ -0,0 +1,101 @@
+"""Run metrics tests
+"""
+import sys
+from json import loads
+from asyncio import create_subprocess_exec, run
+from benchmarks.run import build_arguments
+from benchmarks.synthetic import raw_image
+from datashark_processors_linux.metrics import (
+    MetricsSink,
+    ProcessMonitor,
+    RunMetrics,
+)
+from datashark_processors_linux.foremost import ForemostProcessor
+
+BUSY = 'sum(range(3000000)); print("x" * 1000000)'
+
+
+def _metrics(**values) -> RunMetrics:
+    metrics = {
+        'tool': 'tool',
+        'pid': 1,
+        'returncode': 0,
+        'started': 0.0,
+        'wall_time': 2.0,
+        'cpu_user': 1.0,
+        'cpu_system': 0.5,
+        'peak_rss': 1 << 20,
+        'read_bytes': 10,
+        'write_bytes': 20,
+        'input_size': 4000000,
+    }
+    metrics.update(values)
+    return RunMetrics(**metrics)
+
+
+def test_monitor_measures_process_tree():
+    async def _run():
+        # the busy process is a child of the monitored process
+        proc = await create_subprocess_exec(
+            sys.executable,
+            '-c',
+            f'import subprocess, sys; '
+            f'subprocess.run([sys.executable, "-c", {BUSY!r}], '
+            f'stdout=subprocess.DEVNULL)',
+        )
+        return await ProcessMonitor('tool', proc, 1000).monitor(0.01)
+
+    metrics = run(_run())
+    assert metrics.returncode == 0
+    assert metrics.wall_time > 0
+    assert metrics.cpu_user + metrics.cpu_system > 0
+    assert metrics.peak_rss > 0
+    assert metrics.input_size == 1000
+
+
+def test_throughput():
+    assert _metrics().throughput == 2.0
+    assert _metrics(wall_time=0.0).throughput == 0.0
+
+
+def test_sink(tmp_path):
+    sink = MetricsSink(tmp_path / 'metrics.jsonl', tmp_path / 'metrics.prom')
+    sink.record(_metrics())
+    sink.record(_metrics(returncode=1))
+    records = [
+        loads(line)
+        for line in (tmp_path / 'metrics.jsonl').read_text().splitlines()
+    ]
+    assert [record['returncode'] for record in records] == [0, 1]
+    assert records[0]['throughput'] == 2.0
+    textfile = (tmp_path / 'metrics.prom').read_text().splitlines()
+    assert 'datashark_linux_processor_runs_total{tool="tool"} 2' in textfile
+    assert (
+        'datashark_linux_processor_failures_total{tool="tool"} 1' in textfile
+    )
+    assert (
+        'datashark_linux_processor_input_bytes_total{tool="tool"} 8000000'
+        in textfile
+    )
+
+
+def test_chunk_metrics_record_bytes_read(make_config, tmp_path):
+    size, chunk_size, overlap = 8 << 20, 2 << 20, 65536
+    image = tmp_path / 'image.raw'
+    raw_image(image, size, 8)
+    processor = ForemostProcessor(make_config())
+    run(
+        processor._run(
+            build_arguments(
+                ForemostProcessor,
+                {
+                    'filepath': image,
+                    'output_dir': tmp_path / 'out',
+                    'chunk_size': chunk_size,
+                    'overlap': overlap,
+                },
+            )
+        )
+    )
+    sizes = sorted(metrics.input_size for metrics in processor.metrics)
+    assert sizes == [chunk_size] + [chunk_size + overlap] * 3
@@ -0,0 +1,70 @@
+"""Parallel execution helpers tests
+"""
+from datashark_processors_linux.parallel import (
+    Window,
+    split_ranges,
+    split_windows,
+)
+
+
+def test_split_windows_covers_region():
+    windows = split_windows(100, 1000, 4, overlap=10)
+    assert [window.index for window in windows] == [0, 1, 2, 3]
+    assert windows[0].offset == 100
+    assert windows[-1].end == 1100
+    for previous, window in zip(windows, windows[1:]):
+        assert previous.end == window.offset
+
+
+def test_split_windows_clips_last_overlap():
+    windows = split_windows(0, 1000, 4, overlap=10)
+    assert [window.overlap for window in windows] == [10, 10, 10, 0]
+    assert windows[-1].stop == 1000
+
+
+def test_split_windows_aligns_offsets():
+    windows = split_windows(0, 1000, 3, alignment=512)
+    assert [window.offset for window in windows] == [0, 512]
+    assert [window.length for window in windows] == [512, 488]
+
+
+def test_split_windows_fewer_windows_than_count():
+    assert split_windows(0, 3, 8) == [
+        Window(0, 0, 1, 0),
+        Window(1, 1, 1, 0),
+        Window(2, 2, 1, 0),
+    ]
+
+
+def test_split_windows_empty_region():
+    assert split_windows(0, 0, 4) == []
+
+
+def test_window_owns():
+    window = Window(0, 10, 5, 3)
+    assert window.end == 15
+    assert window.stop == 18
+    assert window.scan_length == 8
+    assert window.owns(10) and window.owns(14)
+    assert not window.owns(9) and not window.owns(15)
+
+
+def test_split_ranges_splits_each_range():
+    windows = split_ranges([(0, 250), (1000, 100)], 100, 0, 2000)
+    assert [(window.offset, window.length) for window in windows] == [
+        (0, 100),
+        (100, 100),
+        (200, 50),
+        (1000, 100),
+    ]
+    assert [window.index for window in windows] == [0, 1, 2, 3]
+
+
+def test_split_ranges_overlap_extends_past_range():
+    windows = split_ranges([(0, 100)], 100, 50, 120)
+    assert windows == [Window(0, 0, 100, 20)]
+
+
+def test_split_ranges_aligns_step():
+    windows = split_ranges([(0, 1024)], 300, 0, 1024, alignment=512)
+    assert [window.offset for window in windows] == [0, 512]
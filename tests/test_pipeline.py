@@ -0,0 +1,78 @@
+"""Plaso pipeline processor tests
+"""
+from json import loads
+from asyncio import run
+from pytest import raises
+from benchmarks.run import build_arguments
+from benchmarks.synthetic import log_tree
+from datashark_core.processor import ProcessorError
+from datashark_processors_linux.pipeline import PlasoPipelineProcessor
+from datashark_processors_linux.storage import read_manifest
+
+
+def _run(config, **values):
+    processor = PlasoPipelineProcessor(config)
+    run(processor._process(build_arguments(PlasoPipelineProcessor, values)))
+    return processor
+
+
+def _timestamps(filepath):
+    return [
+        loads(line)['timestamp'] for line in filepath.read_text().splitlines()
+    ]
+
+
+def test_stages_export_all_formats(make_config, tmp_path):
+    log_tree(tmp_path / 'logs', 3, 50)
+    output_directory = tmp_path / 'out'
+    processor = _run(
+        make_config(),
+        source=tmp_path / 'logs',
+        storage_file=tmp_path / 'l2t.plaso',
+        output_formats='l2tcsv,json_line',
+        output_directory=output_directory,
+    )
+    assert len(_timestamps(output_directory / 'l2t.json_line')) == 150
+    # header and events
+    assert len((output_directory / 'l2t.l2tcsv').read_text().splitlines()) == (
+        151
+    )
+    timings = loads((output_directory / 'l2t.timings.json').read_text())
+    assert [timing['stage'] for timing in timings] == ['log2timeline', 'psort']
+    assert [timing['processes'] for timing in timings] == [1, 2]
+    assert [timing._asdict() for timing in processor.stage_timings] == timings
+
+
+def test_incremental_runs_merge_exports(make_config, tmp_path):
+    logs = tmp_path / 'logs'
+    log_tree(logs, 2, 50)
+    values = {
+        'source': logs,
+        'storage_file': tmp_path / 'l2t.plaso',
+        'output_formats': 'json_line',
+        'output_directory': tmp_path / 'out',
+        'incremental': True,
+    }
+    _run(make_config(), **values)
+    assert len(_timestamps(tmp_path / 'out' / 'l2t.json_line')) == 100
+    # rewritten and new files go to a second storage file
+    log_tree(logs, 3, 50)
+    _run(make_config(), **values)
+    assert len(read_manifest(tmp_path / 'l2t.plaso')) == 2
+    timestamps = _timestamps(tmp_path / 'out' / 'l2t.json_line')
+    assert len(timestamps) == 250
+    assert timestamps == sorted(timestamps)
+
+
+def test_analysis_needs_a_single_storage_file(make_config, tmp_path):
+    log_tree(tmp_path / 'logs', 1, 10)
+    with raises(ProcessorError):
+        _run(
+            make_config(),
+            source=tmp_path / 'logs',
+            storage_file=tmp_path / 'l2t.plaso',
+            output_directory=tmp_path / 'out',
+            incremental=True,
+            analysis='tagging',
+        )
+    assert not (tmp_path / 'l2t.plaso').exists()
@@ -0,0 +1,79 @@
+"""Plaso fork server pool tests
+"""
+import sys
+from os import PRIO_PROCESS, getpriority, pathsep
+from asyncio import run
+from pytest import fixture
+from datashark_processors_linux.plaso_pool import PlasoPool
+
+PSORT = '''
+import os
+import sys
+
+
+def Main():
+    print(' '.join(sys.argv[1:]))
+    print(os.getcwd())
+    print(os.getpriority(os.PRIO_PROCESS, 0))
+    return sys.argv[1] != 'fail'
+'''
+
+
+@fixture(name='binary')
+def binary_fixture(tmp_path, monkeypatch):
+    """psort script of a fake plaso package"""
+    scripts = tmp_path / 'site' / 'plaso' / 'scripts'
+    scripts.mkdir(parents=True)
+    (scripts.parent / '__init__.py').write_text('')
+    (scripts / '__init__.py').write_text('')
+    (scripts / 'psort.py').write_text(PSORT)
+    monkeypatch.setenv(
+        'PYTHONPATH', pathsep.join([str(tmp_path / 'site'), *sys.path])
+    )
+    binary = tmp_path / 'psort.py'
+    binary.write_text(f'#!{sys.executable}\n')
+    return binary
+
+
+def _job(pool, binary, argv, limits=None):
+    async def _run():
+        proc = await pool.start('psort', binary, argv, limits=limits)
+        if proc is None:
+            return None
+        stdout = await proc.stdout.read()
+        return await proc.wait(), stdout.decode().splitlines()
+
+    return run(_run())
+
+
+def test_jobs_run_in_forks_of_the_server(binary, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pool = PlasoPool(['psort'], 30)
+    nice = min(19, getpriority(PRIO_PROCESS, 0) + 1)
+    try:
+        assert _job(pool, binary, ['-o', 'json_line']) == (
+            0,
+            ['-o json_line', str(tmp_path), str(getpriority(PRIO_PROCESS, 0))],
+        )
+        returncode, lines = _job(
+            pool,
+            binary,
+            ['fail'],
+            {'nice': nice, 'ionice': [], 'cgroup': None},
+        )
+        assert returncode == 1
+        assert lines[2] == str(nice)
+    finally:
+        pool.close()
+
+
+def test_unavailable_servers(binary, tmp_path):
+    pool = PlasoPool(['psort', 'log2timeline'], 30)
+    try:
+        # not served by the pool
+        assert _job(pool, binary, []) is not None
+        assert run(pool.start('pinfo', binary, [])) is None
+        # plaso.scripts.log2timeline cannot be imported
+        assert run(pool.start('log2timeline', binary, [])) is None
+    finally:
+        pool.close()
@@ -0,0 +1,76 @@
+"""Progress tracking tests
+"""
+from os import getpid
+from asyncio import StreamReader, run
+from datashark_processors_linux.progress import (
+    MAX_LINE_LENGTH,
+    ProgressTracker,
+    parse_plaso_status,
+    read_lines,
+)
+
+MAIN_STATUS = (
+    'log2timeline (PID: 42) status: running, '
+    'event data produced: 1234, events produced: 0'
+)
+WORKER_STATUS = (
+    'Worker_00 (PID: 43) status: extracting, '
+    'event data produced: 99, events produced: 0'
+)
+
+
+def test_parse_plaso_status():
+    assert parse_plaso_status(MAIN_STATUS, 42) == (1234, None, 'events')
+    assert parse_plaso_status(WORKER_STATUS, 42) is None
+    assert parse_plaso_status('Processing started.', 42) is None
+
+
+def test_read_lines_splits_carriage_returns():
+    async def _run():
+        stream = StreamReader()
+        stream.feed_data(b'10%\r20%\r30')
+        stream.feed_data(b'%\ndone\n\n' + b'x' * (MAX_LINE_LENGTH + 10))
+        stream.feed_eof()
+        lines = []
+        await read_lines(stream, lines.append)
+        return lines
+
+    assert run(_run()) == ['10%', '20%', '30%', 'done', 'x' * MAX_LINE_LENGTH]
+
+
+def test_tracker_parsed_progress():
+    events = []
+    tracker = ProgressTracker(
+        'log2timeline', 42, None, parse_plaso_status, events.append, 2
+    )
+    for line in ('starting', 'loading', MAIN_STATUS, 'error: boom'):
+        tracker.feed(line)
+    assert len(events) == 1
+    assert (events[0].done, events[0].unit) == (1234, 'events')
+    assert events[0].fraction is None
+    # progress lines are not kept as context
+    assert tracker.context == ['loading', 'error: boom']
+
+
+def test_tracker_samples_bytes_read():
+    events = []
+    tracker = ProgressTracker(
+        'binwalk', getpid(), 1 << 60, None, events.append
+    )
+    assert not tracker.sample(None)
+    assert events[-1].unit == 'bytes'
+    assert events[-1].done > 0
+    assert 0 < events[-1].fraction < 1
+
+
+def test_tracker_reports_stall_once():
+    events = []
+    tracker = ProgressTracker(
+        'psort', 42, None, parse_plaso_status, events.append
+    )
+    tracker.feed(MAIN_STATUS)
+    assert tracker.sample(-1.0)
+    assert events[-1].stalled
+    assert not tracker.sample(-1.0)
+    tracker.feed(MAIN_STATUS.replace('1234', '1300'))
+    assert not events[-1].stalled
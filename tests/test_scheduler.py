@@ -0,0 +1,82 @@
+"""Subprocess scheduler tests
+"""
+import sys
+from os import PRIO_PROCESS, getpriority
+from asyncio import create_subprocess_exec, run, wait_for
+from asyncio.subprocess import PIPE
+from pytest import raises
+from datashark_processors_linux.binwalk import BinwalkProcessor
+from datashark_processors_linux.scheduler import ResourceProfile, Scheduler
+
+# priority of a process started by the tool
+GRANDCHILD_PRIORITY = '''
+import sys
+from subprocess import check_output
+print(check_output([sys.executable, '-c', sys.argv[1]]).decode().strip())
+'''
+PRIORITY = 'import os; print(os.getpriority(os.PRIO_PROCESS, 0))'
+
+
+def test_limits_apply_to_processes_started_by_the_tool():
+    nice = min(19, getpriority(PRIO_PROCESS, 0) + 1)
+    scheduler = Scheduler({'profiles': {'cpu': {'nice': nice}}})
+
+    async def _run():
+        limits = scheduler.prepare('tool', ResourceProfile.CPU_BOUND)
+        assert limits.enabled
+        proc = await create_subprocess_exec(
+            sys.executable,
+            '-c',
+            GRANDCHILD_PRIORITY,
+            PRIORITY,
+            stdout=PIPE,
+            preexec_fn=limits.apply,
+        )
+        stdout, _ = await proc.communicate()
+        return int(stdout)
+
+    assert run(_run()) == nice
+
+
+def test_no_limits():
+    scheduler = Scheduler({})
+    limits = scheduler.prepare('tool', ResourceProfile.IO_BOUND)
+    assert not limits.enabled
+
+
+def test_slots_are_released_when_process_exits():
+    scheduler = Scheduler({'max_processes': 1})
+
+    async def _run():
+        for _ in range(2):
+            release = await wait_for(
+                scheduler.acquire('tool', ResourceProfile.CPU_BOUND, []), 5
+            )
+            limits = scheduler.prepare('tool', ResourceProfile.CPU_BOUND)
+            proc = await create_subprocess_exec(sys.executable, '-c', '')
+            scheduler.watch(proc, release, limits)
+        await proc.wait()
+
+    run(_run())
+
+
+def test_slots_are_released_when_start_fails(monkeypatch, make_config):
+    monkeypatch.setattr(
+        Scheduler, '_INSTANCE', Scheduler({'max_processes': 1})
+    )
+    processor = BinwalkProcessor(make_config())
+
+    async def _spawn(*_args, **_kwargs):
+        raise RuntimeError("spawn failed")
+
+    monkeypatch.setattr(processor, '_spawn', _spawn)
+
+    async def _run():
+        for _ in range(2):
+            with raises(RuntimeError):
+                await wait_for(
+                    processor._start_subprocess(processor.BIN_KEY, [], [], {}),
+                    5,
+                )
+
+    run(_run())
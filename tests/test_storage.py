@@ -0,0 +1,40 @@
+"""Plaso storage helpers tests
+"""
+from pathlib import Path
+from datashark_processors_linux.storage import (
+    range_expression,
+    shard_storage_file,
+    read_manifest,
+    write_manifest,
+    remove_manifest,
+)
+
+
+def test_range_expression():
+    assert range_expression('1,3..5') == [1, 3, 4, 5]
+    assert range_expression(' 2 , 2..3 ,') == [2, 3]
+
+
+def test_range_expression_all():
+    assert range_expression('all') is None
+    assert range_expression(' ALL ') is None
+
+
+def test_shard_storage_file():
+    assert shard_storage_file(Path('/case/l2t.plaso'), 'p1') == Path(
+        '/case/l2t.p1.plaso'
+    )
+
+
+def test_manifest_round_trip(tmp_path):
+    storage_file = tmp_path / 'l2t.plaso'
+    assert read_manifest(storage_file) == []
+    storage_files = [
+        shard_storage_file(storage_file, 'p1'),
+        shard_storage_file(storage_file, 'p2'),
+    ]
+    write_manifest(storage_file, storage_files)
+    assert read_manifest(storage_file) == storage_files
+    remove_manifest(storage_file)
+    remove_manifest(storage_file)
+    assert read_manifest(storage_file) == []
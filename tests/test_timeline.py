@@ -0,0 +1,96 @@
+"""Timeline export helpers tests
+"""
+from json import dumps
+from datetime import datetime
+from datashark_processors_linux.parallel import Window
+from datashark_processors_linux.psort import window_filter
+from datashark_processors_linux.timeline import (
+    event_timestamp,
+    merge_exports,
+    to_microseconds,
+)
+
+
+def _json_line(timestamp, message):
+    return dumps({'timestamp': timestamp, 'message': message}) + '\n'
+
+
+def _write(filepath, lines):
+    filepath.write_text(''.join(lines))
+    return filepath
+
+
+def test_event_timestamp():
+    assert event_timestamp(_json_line(42, 'a'), 'json_line') == 42
+    assert event_timestamp('not json\n', 'json_line') is None
+    assert event_timestamp(
+        '01/02/2020,03:04:05,UTC,...\n', 'l2tcsv'
+    ) == to_microseconds(datetime(2020, 1, 2, 3, 4, 5))
+    assert event_timestamp(
+        '2020-01-02T03:04:05+00:00,...\n', 'dynamic'
+    ) == to_microseconds(datetime(2020, 1, 2, 3, 4, 5))
+
+
+def test_merge_exports_json_line(tmp_path):
+    inputs = [
+        _write(tmp_path / 'a', [_json_line(1, 'a1'), _json_line(5, 'a5')]),
+        _write(tmp_path / 'b', [_json_line(2, 'b2'), _json_line(3, 'b3')]),
+    ]
+    output = tmp_path / 'merged'
+    assert merge_exports(inputs, output, 'json_line') == 4
+    assert output.read_text() == ''.join(
+        [
+            _json_line(1, 'a1'),
+            _json_line(2, 'b2'),
+            _json_line(3, 'b3'),
+            _json_line(5, 'a5'),
+        ]
+    )
+
+
+def test_merge_exports_keeps_single_header(tmp_path):
+    header = 'datetime,message\n'
+    inputs = [
+        _write(tmp_path / 'a', [header, '2020-01-02T00:00:00,a\n']),
+        _write(tmp_path / 'b', [header, '2020-01-01T00:00:00,b\n']),
+    ]
+    output = tmp_path / 'merged'
+    assert merge_exports(inputs, output, 'dynamic') == 2
+    assert output.read_text() == (
+        header + '2020-01-01T00:00:00,b\n' + '2020-01-02T00:00:00,a\n'
+    )
+
+
+def test_merge_exports_unique(tmp_path):
+    inputs = [
+        _write(tmp_path / 'a', [_json_line(1, 'x'), _json_line(2, 'y')]),
+        _write(tmp_path / 'b', [_json_line(1, 'x'), _json_line(3, 'y')]),
+    ]
+    output = tmp_path / 'merged'
+    assert merge_exports(inputs, output, 'json_line', unique=True) == 3
+    assert merge_exports(inputs, output, 'json_line') == 4
+
+
+def test_merge_exports_keeps_unparsable_rows_in_place(tmp_path):
+    inputs = [
+        _write(
+            tmp_path / 'a',
+            [_json_line(1, 'a1'), 'garbage\n', _json_line(4, 'a4')],
+        ),
+        _write(tmp_path / 'b', [_json_line(2, 'b2'), _json_line(3, 'b3')]),
+    ]
+    output = tmp_path / 'merged'
+    assert merge_exports(inputs, output, 'json_line') == 5
+    assert output.read_text().splitlines()[1] == 'garbage'
+
+
+def test_window_filter():
+    window = Window(0, 0, 86400 * 1000000, 0)
+    time_filter = (
+        "date >= DATETIME('1970-01-01T00:00:00') and "
+        "date < DATETIME('1970-01-02T00:00:00')"
+    )
+    assert window_filter(window, None) == time_filter
+    assert window_filter(window, "parser is 'syslog'") == (
+        f"(parser is 'syslog') and {time_filter}"
+    )
@@ -0,0 +1,49 @@
+"""Timeline index tests
+"""
+from datetime import datetime
+from datashark_processors_linux.timeline import to_microseconds
+from datashark_processors_linux.timeline_index import SimpleQuery, parse_filter
+
+DAY_1 = to_microseconds(datetime(2020, 1, 1))
+DAY_2 = to_microseconds(datetime(2020, 1, 2))
+
+
+def test_parse_filter_empty():
+    assert parse_filter(None, 'json_line') == SimpleQuery(None, None, {})
+    assert parse_filter('', 'l2tcsv') == SimpleQuery(None, None, {})
+
+
+def test_parse_filter_fields_and_dates():
+    query = parse_filter(
+        "(parser is 'syslog') and date >= DATETIME('2020-01-01T00:00:00') "
+        "AND date < DATETIME('2020-01-02T00:00:00')",
+        'json_line',
+    )
+    assert query == SimpleQuery(DAY_1, DAY_2, {'parser': 'syslog'})
+
+
+def test_parse_filter_maps_fields_per_format():
+    query = parse_filter("data_type == 'fs:stat'", 'json_line')
+    assert query.fields == {'source_type': 'fs:stat'}
+    assert parse_filter("data_type == 'fs:stat'", 'l2tcsv') is None
+
+
+def test_parse_filter_needs_psort():
+    assert parse_filter("parser is 'a' or parser is 'b'", 'json_line') is None
+    assert parse_filter("message contains 'x'", 'json_line') is None
+    assert parse_filter("parser is 'a' and parser is 'b'", 'dynamic') is None
+
+
+def test_parse_filter_keeps_narrowest_dates():
+    query = parse_filter(
+        "date >= DATETIME('2019-12-01T00:00:00') and "
+        "date >= DATETIME('2020-01-01T00:00:00') and "
+        "date < DATETIME('2020-01-02T00:00:00')",
+        'dynamic',
+    )
+    assert (query.start, query.end) == (DAY_1, DAY_2)
+
+
+def test_simple_query_restrict():
+    query = SimpleQuery(None, DAY_2, {})
+    assert query.restrict(DAY_1, DAY_2 + 1) == SimpleQuery(DAY_1, DAY_2, {})
@@ -0,0 +1,152 @@
+"""TSKAPE processors tests
+"""
+from re import search
+from pathlib import Path
+from json import loads
+from asyncio import run
+from pytest import raises
+from benchmarks.run import build_arguments
+from benchmarks.synthetic import file_tree
+from datashark_core.processor import ProcessorError
+from datashark_processors_linux.tskape import (
+    TSKAPEBatchProcessor,
+    PATTERNS_FILENAME,
+    compile_patterns,
+    log_names,
+    log_path,
+    tag_matches,
+)
+
+
+def _pattern_file(filepath, *patterns):
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    filepath.write_text(''.join(f'{pattern}\n' for pattern in patterns))
+    return filepath
+
+
+def test_log_path():
+    assert log_path('/dir1/a.exe\tallocated\n') == '/dir1/a.exe'
+    assert log_path('/dir1/a.exe\n') == '/dir1/a.exe'
+
+
+def test_compile_patterns(tmp_path):
+    executables = _pattern_file(tmp_path / 'executables.txt', r'\.exe$')
+    directories = _pattern_file(
+        tmp_path / 'directories.txt', '/dir1/', r'\.exe$'
+    )
+    empty = _pattern_file(tmp_path / 'empty.txt')
+    lines, matchers = compile_patterns([executables, directories, empty])
+    assert lines == [r'(?:\.exe$)|(?:/dir1/)']
+    assert [len(patterns) for patterns in matchers] == [1, 1, 0]
+    assert matchers[1][0].search('/dir1/a.txt')
+    assert not matchers[0][0].search('/dir1/a.txt')
+
+
+def test_compile_patterns_without_patterns(tmp_path):
+    with raises(ProcessorError):
+        compile_patterns([_pattern_file(tmp_path / 'empty.txt')])
+
+
+def test_tag_matches_by_path(tmp_path):
+    executables = _pattern_file(tmp_path / 'executables.txt', r'\.exe$')
+    directories = _pattern_file(tmp_path / 'directories.txt', '^/dir1/')
+    _, matchers = compile_patterns([executables, directories])
+    log = tmp_path / 'tskape.log'
+    # pattern files apply to paths, not to the rest of the line
+    log.write_text('/dir1/a.txt\tnote.exe\n/dir2/b.exe\t/dir1/\n')
+    tag_matches(
+        log,
+        tmp_path,
+        list(zip(['executables.log', 'directories.log'], matchers)),
+    )
+    assert (tmp_path / 'executables.log').read_text() == (
+        '/dir2/b.exe\t/dir1/\n'
+    )
+    assert (tmp_path / 'directories.log').read_text() == (
+        '/dir1/a.txt\tnote.exe\n'
+    )
+
+
+def test_log_names_are_unique():
+    pattern_files = [
+        Path('a/iocs.txt'),
+        Path('b/iocs.txt'),
+        Path('tskape.txt'),
+        Path('iocs-1.txt'),
+    ]
+    assert log_names(pattern_files, {'tskape'}) == [
+        'iocs.log',
+        'iocs-1.log',
+        'tskape-1.log',
+        'iocs-1-1.log',
+    ]
+
+
+def _run_batch(make_config, tmp_path, pattern_files):
+    tree = tmp_path / 'tree'
+    paths = ['/' + path.as_posix() for path in file_tree(tree, 200)]
+    listing = tmp_path / 'pattern_files.txt'
+    listing.write_text(''.join(f'{path}\n' for path in pattern_files))
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text(f'{tree}\n')
+    output_root = tmp_path / 'out'
+    run(
+        TSKAPEBatchProcessor(make_config())._run(
+            build_arguments(
+                TSKAPEBatchProcessor,
+                {
+                    'manifest': manifest,
+                    'output_root': output_root,
+                    'pattern_files': listing,
+                },
+            )
+        )
+    )
+    return paths, output_root
+
+
+def test_batch_with_two_pattern_files(make_config, tmp_path):
+    paths, output_root = _run_batch(
+        make_config,
+        tmp_path,
+        [
+            _pattern_file(tmp_path / 'executables.txt', r'\.exe$'),
+            _pattern_file(tmp_path / 'directories.txt', '^/dir1/'),
+        ],
+    )
+    results = [
+        loads(line)
+        for line in (output_root / 'results.jsonl').read_text().splitlines()
+    ]
+    assert [result['status'] for result in results] == ['ok']
+    item_dir = output_root / 'tree'
+
+    def _matches(name):
+        return set((item_dir / name).read_text().splitlines())
+
+    executables = {path for path in paths if path.endswith('.exe')}
+    directories = {path for path in paths if search('^/dir1/', path)}
+    assert executables and directories
+    assert _matches('executables.log') == executables
+    assert _matches('directories.log') == directories
+    assert _matches('tskape.log') == executables | directories
+    assert not (item_dir / 'extracted').exists()
+
+
+def test_batch_with_pattern_files_of_the_same_stem(make_config, tmp_path):
+    pattern_files = [
+        _pattern_file(tmp_path / 'a' / 'iocs.txt', r'\.exe$'),
+        _pattern_file(tmp_path / 'b' / 'iocs.txt', r'\.log$'),
+    ]
+    paths, output_root = _run_batch(make_config, tmp_path, pattern_files)
+    item_dir = output_root / 'tree'
+    executables = {path for path in paths if path.endswith('.exe')}
+    logs = {path for path in paths if path.endswith('.log')}
+    assert executables and logs
+    assert set((item_dir / 'iocs.log').read_text().splitlines()) == executables
+    assert set((item_dir / 'iocs-1.log').read_text().splitlines()) == logs
+    # combined patterns are not rewritten by the next batch
+    pattern_file = output_root / PATTERNS_FILENAME
+    mtime = pattern_file.stat().st_mtime_ns
+    _run_batch(make_config, tmp_path, pattern_files)
+    assert pattern_file.stat().st_mtime_ns == mtime